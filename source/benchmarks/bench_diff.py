@@ -0,0 +1,102 @@
+"""
+Compares the change detection of `Course` against the previous approach
+(creating every announcement and comparing the title and description of each one)
+
+Run from the `source` folder: python -m benchmarks.bench_diff
+"""
+
+import argparse
+import time
+
+from models.announcement import Announcement, AnnouncementActions
+from models.course import Course
+from models.fetcher import FeedResponse, FeedValidators
+from models.parser import iter_feed_items
+
+from .feeds import build_feed, churn_items, generate_items, get_course_link
+
+
+def legacy_diff(
+    old: list[Announcement], xml_data: bytes
+) -> set[tuple[str, AnnouncementActions]]:
+    """The previous change detection, returns the changes (the ID and action of each one)"""
+
+    new_announcements = {
+        announcement.id: announcement
+        for announcement in sorted(
+            [
+                Announcement(
+                    title=item.title,
+                    description=item.description,
+                    link=item.link,
+                    author=item.author,
+                    pub_date=item.pub_date,
+                )
+                for item in iter_feed_items(xml_data)
+            ],
+            key=lambda announcement: announcement.pub_date,
+        )
+    }
+    old_announcements = {announcement.id: announcement for announcement in old}
+
+    changes = set()
+    for id, announcement in new_announcements.items():
+        if id not in old_announcements:
+            changes.add((id, AnnouncementActions.ADDED))
+        elif not old_announcements[id].has_same_content(announcement):
+            changes.add((id, AnnouncementActions.UPDATED))
+    for id in old_announcements:
+        if id not in new_announcements:
+            changes.add((id, AnnouncementActions.DELETED))
+
+    return changes
+
+
+def measure(n_items: int, rate: float, repeat: int) -> tuple[float, float]:
+    """Returns the best time (in seconds) of the previous and current change detection (raises a `ValueError` if they found different changes)"""
+
+    items = generate_items(n_items)
+    old_feed = build_feed(items)
+    new_feed = build_feed(churn_items(items, rate=rate))
+
+    legacy_times, times = [], []
+    for _ in range(repeat):
+        course = Course(link=get_course_link())
+        course.process_feed(FeedResponse(old_feed, FeedValidators()))
+
+        start = time.perf_counter()
+        legacy_changes = legacy_diff(course.announcements, new_feed)
+        legacy_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        changes = course.process_feed(FeedResponse(new_feed, FeedValidators()))
+        times.append(time.perf_counter() - start)
+
+        # A faster detection is only worth it if it finds the same changes
+        changes = {(change["announcement"].id, change["action"]) for change in changes}
+        if changes != legacy_changes:
+            raise ValueError(
+                f"The change detections differ with {n_items} items: {len(legacy_changes)} changes before, {len(changes)} now "
+                f"({len(legacy_changes - changes)} missing, {len(changes - legacy_changes)} unexpected)"
+            )
+
+    return min(legacy_times), min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--churn", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'previous (ms)':>14} {'current (ms)':>13} {'speedup':>8}")
+    for n_items in args.sizes:
+        legacy_time, current_time = measure(n_items, args.churn, args.repeat)
+        print(
+            f"{n_items:>8} {legacy_time * 1000:>14.2f} {current_time * 1000:>13.2f} {legacy_time / current_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
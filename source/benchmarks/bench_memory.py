@@ -0,0 +1,132 @@
+"""
+Compares the memory used by the tracked announcements against the previous representation
+(a dataclass per announcement with the description converted to text and a datetime publication date)
+
+Each representation is measured in its own process, using the resident size before and after creating them.
+
+Run from the `source` folder: python -m benchmarks.bench_memory [--courses 10000] [--announcements 200] [--paragraphs 3]
+"""
+
+import argparse
+import html
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+from models.announcement import Announcement
+
+from .feeds import generate_items
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+""" Used to remove the HTML tags (much faster than BeautifulSoup, and only the size of the result matters here) """
+
+
+@dataclass
+class LegacyAnnouncement:
+    """The previous representation of an announcement"""
+
+    title: str
+    description: str
+    link: str
+    author: str
+    pub_date: str | datetime
+    id: str = None
+
+    def __post_init__(self):
+        self.id = self.pub_date
+        self.pub_date = datetime.strptime(self.pub_date, "%a, %d %b %Y %H:%M:%S %z")
+        self.author = self.author[self.author.find("(") + 1 : self.author.rfind(")")]
+        self.description = TAG_PATTERN.sub("", html.unescape(self.description))
+
+
+def get_resident_size() -> int:
+    """Returns the resident size of the process (in bytes)"""
+
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def measure(
+    representation: str, n_courses: int, n_announcements: int, paragraphs: int
+) -> int:
+    """Creates the announcements of every course and returns the memory they use (in bytes)"""
+
+    announcement_class = (
+        Announcement if representation == "compact" else LegacyAnnouncement
+    )
+
+    before = get_resident_size()
+
+    courses = []
+    for i in range(n_courses):
+        # Every course has different announcements, as in reality
+        courses.append(
+            [
+                announcement_class(
+                    title=item.title,
+                    description=item.description,
+                    link=item.link,
+                    author=item.author,
+                    pub_date=item.pub_date,
+                )
+                for item in generate_items(
+                    n_announcements, seed=i, paragraphs=paragraphs
+                )
+            ]
+        )
+
+    return get_resident_size() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--courses", type=int, default=10000)
+    parser.add_argument("--announcements", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument("--representation", choices=["compact", "legacy"])
+    args = parser.parse_args()
+
+    if args.representation is not None:
+        print(
+            measure(
+                args.representation,
+                args.courses,
+                args.announcements,
+                args.paragraphs,
+            )
+        )
+        return
+
+    sizes = {}
+    for representation in ("legacy", "compact"):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_memory",
+                f"--courses={args.courses}",
+                f"--announcements={args.announcements}",
+                f"--paragraphs={args.paragraphs}",
+                f"--representation={representation}",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        sizes[representation] = int(output)
+
+    n_total = args.courses * args.announcements
+    print(
+        f"{args.courses} courses x {args.announcements} announcements ({args.paragraphs} paragraphs each)"
+    )
+    for representation, size in sizes.items():
+        print(
+            f"{representation:>8}: {size / 2**20:>9.1f} MiB ({size / n_total:.0f} bytes per announcement)"
+        )
+    print(f"{'saved':>8}: {1 - sizes['compact'] / sizes['legacy']:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares rendering the alerts of an update once for every subscribed channel (previous approach)
+against rendering them once and sharing the messages between the channels
+
+Run from the `source` folder: python -m benchmarks.bench_render [--subscribers 1 10 100 1000] [--changes 20]
+"""
+
+import argparse
+import time
+
+from models.course import Course
+from models.fetcher import FeedResponse, FeedValidators
+from utils import get_alert_messages
+
+from .feeds import build_feed, generate_items, get_course_link
+
+
+def measure(
+    changes: list[dict], n_subscribers: int, repeat: int
+) -> tuple[float, float, int, int]:
+    """Returns the best time (in seconds) and the characters rendered by the previous and current approach"""
+
+    legacy_times, times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        legacy_messages = [get_alert_messages(changes) for _ in range(n_subscribers)]
+        legacy_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        messages = get_alert_messages(changes)
+        shared_messages = [messages for _ in range(n_subscribers)]
+        times.append(time.perf_counter() - start)
+
+    # Only distinct strings take memory
+    legacy_size = sum(len(m) for messages in legacy_messages for m in messages)
+    size = sum(len(m) for m in shared_messages[0])
+
+    return min(legacy_times), min(times), legacy_size, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--subscribers", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--changes", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    course = Course(link=get_course_link())
+    changes = course.process_feed(
+        FeedResponse(
+            build_feed(generate_items(args.changes, paragraphs=args.paragraphs)),
+            FeedValidators(),
+        )
+    )
+
+    # The descriptions are converted to text once before (they are cached in both approaches)
+    get_alert_messages(changes)
+
+    print(
+        f"{'subscribers':>11} {'previous (ms)':>14} {'current (ms)':>13} {'speedup':>8} {'previous (KB)':>14} {'current (KB)':>13}"
+    )
+    for n_subscribers in args.subscribers:
+        legacy_time, current_time, legacy_size, size = measure(
+            changes, n_subscribers, args.repeat
+        )
+        print(
+            f"{n_subscribers:>11} {legacy_time * 1000:>14.2f} {current_time * 1000:>13.2f} {legacy_time / current_time:>7.1f}x"
+            f" {legacy_size / 1024:>14.0f} {size / 1024:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+""" Generates synthetic Fenix-like announcements feeds (so the benchmarks don't need the network) """
+
+import html
+import random
+from datetime import datetime, timedelta
+
+from models.parser import FeedItem
+
+WORDS = (
+    "aula teste exame projeto entrega sala enunciado avaliação laboratório turno "
+    "inscrição horário prazo nota época recurso grupo relatório dúvidas semana "
+    "the class will be held in room on next with all students please check"
+).split()
+""" The words used in the descriptions """
+
+COURSE_LINK = "https://fenix.tecnico.ulisboa.pt/disciplinas/BENCH/{years}/1-semestre"
+""" The link of the course used by the benchmarks """
+
+
+def get_course_link() -> str:
+    """Returns a course link that is valid for the current school year"""
+
+    now = datetime.now()
+    first_year = now.year if now.month >= 9 else now.year - 1
+
+    return COURSE_LINK.format(years=f"{first_year}-{first_year + 1}")
+
+
+def generate_description(
+    rng: random.Random, paragraphs: int, rich: bool = False
+) -> str:
+    """Returns a HTML description with the number of `paragraphs` (0 for a single short sentence), `rich` adds lists, tables and formatting"""
+
+    if paragraphs == 0:
+        return f"<p>Content of the announcement: {rng.random()}</p>"
+
+    def sentence(n_min: int, n_max: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(n_min, n_max)))
+
+    parts = []
+    for _ in range(paragraphs):
+        parts.append(
+            "<p>"
+            + sentence(15, 40)
+            + f' <a href="https://fenix.tecnico.ulisboa.pt/downloadFile/{rng.randrange(10**12)}">link</a>'
+            + "</p>"
+        )
+
+        if rich:
+            parts.append(
+                f"<p><strong>{sentence(2, 5)}</strong> &amp; <em>{sentence(2, 5)}</em></p>"
+                + "<ul>"
+                + "".join(
+                    f"<li>{sentence(3, 8)}</li>" for _ in range(rng.randint(2, 5))
+                )
+                + "</ul>"
+                + "<table><tr><th>Turno</th><th>Sala</th></tr>"
+                + "".join(
+                    f"<tr><td>T{i}</td><td>{sentence(1, 2)}</td></tr>"
+                    for i in range(rng.randint(2, 4))
+                )
+                + "</table>"
+            )
+
+    return "".join(parts)
+
+
+def generate_items(
+    n_items: int, seed: int = 0, paragraphs: int = 0, rich: bool = False
+) -> list[FeedItem]:
+    """Returns `n_items` announcements sorted from the newest to the oldest (as in Fenix)"""
+
+    rng = random.Random(seed)
+    start = datetime(2024, 9, 15, 9, 0, 0)
+
+    items = []
+    for i in range(n_items):
+        pub_date = start + timedelta(minutes=37 * i, seconds=rng.randrange(60))
+        items.append(
+            FeedItem(
+                title=f"Announcement {i}",
+                description=generate_description(rng, paragraphs, rich=rich),
+                link=f"https://fenix.tecnico.ulisboa.pt/disciplinas/BENCH/anuncios/{i}",
+                author=f"ist{i % 50:05}@tecnico.ulisboa.pt (Professor {i % 50})",
+                pub_date=pub_date.strftime("%a, %d %b %Y %H:%M:%S +0100"),
+            )
+        )
+
+    return items[::-1]
+
+
+def churn_items(
+    items: list[FeedItem],
+    rate: float = 0.0,
+    seed: int = 0,
+    added: float = None,
+    updated: float = None,
+    deleted: float = None,
+) -> list[FeedItem]:
+    """Returns a copy of the items where about `rate` of them were updated, deleted and added (each, unless given separately)"""
+
+    rng = random.Random(seed)
+
+    def get_count(item_rate: float | None) -> int:
+        item_rate = rate if item_rate is None else item_rate
+        return max(1, int(len(items) * item_rate)) if items and item_rate > 0 else 0
+
+    churned = list(items)
+
+    for _ in range(get_count(updated)):
+        i = rng.randrange(len(churned))
+        churned[i] = churned[i]._replace(
+            description=churned[i].description + " (updated)"
+        )
+
+    for _ in range(min(get_count(deleted), len(churned))):
+        churned.pop(rng.randrange(len(churned)))
+
+    n_added = get_count(added)
+    newest = generate_items(len(items) + n_added, seed=seed)[:n_added]
+
+    return newest + churned
+
+
+def build_feed(items: list[FeedItem]) -> bytes:
+    """Returns the RSS feed with the items"""
+
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0"><channel><title>BENCH</title>'
+    ]
+
+    for item in items:
+        parts.append(
+            "<item>"
+            f"<title>{html.escape(item.title)}</title>"
+            f"<description>{html.escape(item.description)}</description>"
+            f"<link>{item.link}</link>"
+            f"<author>{html.escape(item.author)}</author>"
+            f"<pubDate>{item.pub_date}</pubDate>"
+            "</item>"
+        )
+
+    parts.append("</channel></rss>")
+
+    return "".join(parts).encode()
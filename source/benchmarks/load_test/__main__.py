@@ -0,0 +1,245 @@
+"""
+Runs the bot against a local stand-in of Fenix and a fake Discord, reporting how long each phase takes
+(start up, `$add` of every course, automatic updates and `$update`), the delivery latency of the alerts and the peak memory
+
+Run from the `source` folder: python -m benchmarks.load_test [--guilds 50] [--courses 200] [--courses-per-guild 4] [--duration 60]
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from collections import deque
+
+from ..feeds import get_course_link
+from .discord_stub import FakeContext, FakeDiscord
+from .fenix import FenixStandIn
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    """Returns the percentile (between 0 and 100) of the values (0 if there are none)"""
+
+    if len(values) == 0:
+        return 0.0
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    """Returns the percentiles of the values"""
+
+    return {
+        "count": len(values),
+        "p50": get_percentile(values, 50),
+        "p99": get_percentile(values, 99),
+        "max": max(values, default=0.0),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Runs every phase, returning the results"""
+
+    # Imported here, as the bot saves its files in the current folder when imported
+    import models.scheduler as scheduler_module
+    from discord_bot import bootstrap
+    from discord_bot import commands as bot_commands
+    from discord_bot import pipeline, tasks
+    from discord_bot.bot import bot, fetcher, metrics_server, outbox, watchdog
+    from models.metrics import metrics
+
+    # The endpoint is only started if asked, so the load test doesn't conflict with a running bot
+    bootstrap.METRICS_PORT = args.metrics_port
+
+    fenix = FenixStandIn(
+        n_items=args.items,
+        paragraphs=args.paragraphs,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        maintenance_rate=args.maintenance_rate,
+        churn=args.churn,
+        etag=args.etag,
+        seed=args.seed,
+    )
+    fetcher.redirect(await fenix.start())
+
+    # The guilds already have the bot installed, as after a restart
+    discord = FakeDiscord()
+    guilds = [discord.create_guild(installed=True) for _ in range(args.guilds)]
+    for guild in guilds:
+        bot._connection._guilds[guild.id] = guild
+
+    # Keeps every latency, instead of only the most recent ones
+    outbox.stats.latencies = deque()
+
+    results = {}
+
+    def record_phase(name: str, started_at: float, **extra):
+        results[name] = {"seconds": time.monotonic() - started_at, **extra}
+        print(f"{name}: {results[name]['seconds']:.1f} seconds")
+
+    def record_delivery(name: str):
+        results[name]["delivery_latency"] = summarize(list(outbox.stats.latencies))
+        outbox.stats.latencies.clear()
+
+    # Reports what blocks the event loop while the test runs
+    watchdog.start()
+
+    started_at = time.monotonic()
+    await bootstrap.start_up(started_at=started_at)
+    record_phase("startup", started_at)
+
+    # Every guild adds some of the courses (so most courses are tracked by several guilds)
+    rng = random.Random(args.seed)
+    links = [
+        get_course_link().replace("BENCH", f"C{i:05}") for i in range(args.courses)
+    ]
+
+    async def add_courses(guild):
+        for link in rng.sample(links, min(args.courses_per_guild, len(links))):
+            await bot_commands.add.callback(FakeContext(guild), link)
+
+    started_at = time.monotonic()
+    await asyncio.gather(*[add_courses(guild) for guild in guilds])
+    record_phase("add", started_at, commands=args.guilds * args.courses_per_guild)
+    await outbox.join()
+    record_phase("add_delivered", started_at)
+    record_delivery("add_delivered")
+
+    # The automatic updates, with every course updated every `--poll-interval` seconds
+    scheduler_module.MIN_POLL_INTERVAL = args.poll_interval / 60
+    scheduler_module.MAX_POLL_INTERVAL = args.poll_interval / 60
+    scheduler_module.POLL_BUDGET = float("inf")
+
+    tick_times = []
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < args.duration:
+        tick_started_at = time.monotonic()
+        await tasks.update_announcements.coro()
+        tick_times.append(time.monotonic() - tick_started_at)
+
+        await asyncio.sleep(max(0, args.tick - tick_times[-1]))
+
+    await outbox.join()
+    record_phase("scheduled", started_at, tick_time=summarize(tick_times))
+    record_delivery("scheduled")
+
+    started_at = time.monotonic()
+    await asyncio.gather(
+        *[bot_commands.update.callback(FakeContext(guild)) for guild in guilds]
+    )
+    record_phase("update", started_at, commands=args.guilds)
+    await outbox.join()
+    record_phase("update_delivered", started_at)
+    record_delivery("update_delivered")
+
+    for handle in pipeline.scheduled_retries.values():
+        handle.cancel()
+    await fetcher.close()
+    await fenix.stop()
+    await metrics_server.stop()
+    watchdog.stop()
+
+    results["fenix"] = {
+        "responses": dict(fenix.stats.responses),
+        "changes": fenix.stats.changes,
+    }
+    results["discord"] = {
+        "calls": dict(discord.stats.calls),
+        "rate_limited": discord.stats.rate_limited,
+        "average_message_length": sum(discord.stats.message_lengths)
+        / max(1, len(discord.stats.message_lengths)),
+    }
+    results["delivery"] = {
+        "alerts": outbox.stats.sent_alerts,
+        "messages": outbox.stats.sent_messages,
+        "failed_alerts": outbox.stats.failed_alerts,
+    }
+    results["stages"] = {
+        stage: metrics.get_histogram("update_stage_seconds", stage=stage).average
+        for stage in ("parse", "diff", "render")
+    }
+    loop_lag = metrics.get_histogram("event_loop_lag_seconds")
+    results["event_loop"] = {
+        "lag_p99": loop_lag.get_quantile(0.99),
+        "stalls": metrics.get_total("event_loop_stalls_total"),
+    }
+    # In KiB on Linux
+    results["peak_memory_mib"] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--courses-per-guild", type=int, default=4)
+    parser.add_argument("--items", type=int, default=20, help="Announcements per feed")
+    parser.add_argument("--paragraphs", type=int, default=2)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Average Fenix latency (seconds)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--maintenance-rate", type=float, default=0.01)
+    parser.add_argument(
+        "--churn",
+        type=float,
+        default=0.05,
+        help="Chance of a feed changing between requests",
+    )
+    parser.add_argument(
+        "--etag", action="store_true", help="Fenix answers conditional requests"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30,
+        help="Seconds between automatic updates of a course",
+    )
+    parser.add_argument(
+        "--tick", type=float, default=5, help="Seconds between runs of the update task"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=60, help="Seconds of automatic updates"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Exposes the metrics of the bot while the test runs (0 disables it)",
+    )
+    parser.add_argument("--output", help="Where to write the results (JSON)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output is not None else None
+
+    # The bot saves its database and backups in the current folder, and some of them when exiting
+    # (the folder is removed by the first function registered, which runs last)
+    folder = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, folder, ignore_errors=True)
+    os.chdir(folder)
+
+    results = asyncio.run(run(args))
+
+    print(json.dumps(results, indent=2))
+
+    if output is not None:
+        with open(output, "w") as output_file:
+            json.dump(
+                {"parameters": vars(args), "results": results}, output_file, indent=2
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+""" Contains a stand-in of the Discord guilds and channels, recording the calls the bot makes and simulating the rate limits """
+
+import asyncio
+import itertools
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from constants import CATEGORY_NAME, MANAGE_CHANNEL
+
+CHANNEL_LIMIT = (5, 5.0)
+""" The Discord limit of messages sent to a channel (messages, seconds) """
+
+GLOBAL_LIMIT = (50, 1.0)
+""" The Discord limit of requests done by a bot (requests, seconds) """
+
+
+class RateLimiter:
+    """Simulates a Discord rate limit, making the request wait (as discord.py does after a 429) when it is exceeded"""
+
+    def __init__(self, limit: tuple[int, float], stats: "DiscordStats") -> None:
+
+        self.__capacity, self.__period = limit
+        self.__requests: deque[float] = deque()
+        self.__stats = stats
+
+    async def wait(self):
+        """Registers a request, waiting if the limit was exceeded"""
+
+        limited = False
+
+        while True:
+            now = time.monotonic()
+
+            while (
+                len(self.__requests) > 0 and self.__requests[0] <= now - self.__period
+            ):
+                self.__requests.popleft()
+
+            if len(self.__requests) < self.__capacity:
+                self.__requests.append(now)
+                return
+
+            if not limited:
+                limited = True
+                self.__stats.rate_limited += 1
+
+            await asyncio.sleep(self.__requests[0] + self.__period - now)
+
+
+@dataclass
+class DiscordStats:
+    """Contains the calls made to the stand-in"""
+
+    calls: Counter = field(default_factory=Counter)
+    """ The number of calls of each method """
+
+    rate_limited: int = 0
+    """ The number of requests that exceeded a rate limit (each would be a 429 answer) """
+
+    message_lengths: list[int] = field(default_factory=list)
+    """ The length of each message sent """
+
+
+class FakeDiscord:
+    """Creates the guilds and keeps the state shared by every fake object"""
+
+    def __init__(self) -> None:
+
+        self.ids = itertools.count(1)
+        self.stats = DiscordStats()
+        self.global_limiter = RateLimiter(GLOBAL_LIMIT, self.stats)
+
+    async def request(self, name: str, channel_limiter: RateLimiter = None):
+        """Registers a call to the Discord API"""
+
+        self.stats.calls[name] += 1
+
+        if channel_limiter is not None:
+            await channel_limiter.wait()
+        await self.global_limiter.wait()
+
+    def create_guild(self, installed: bool) -> "FakeGuild":
+        """Returns a new guild (with the bot category and manage channel if `installed`)"""
+
+        guild = FakeGuild(self)
+
+        if installed:
+            category = FakeCategory(guild, CATEGORY_NAME)
+            FakeTextChannel(guild, MANAGE_CHANNEL, category)
+
+        return guild
+
+
+class FakeMessage:
+    """A message sent by the bot"""
+
+    def __init__(self, channel: "FakeTextChannel", content: str) -> None:
+
+        self.channel = channel
+        self.content = content
+
+
+class FakeCategory:
+    """A channel category"""
+
+    def __init__(self, guild: "FakeGuild", name: str) -> None:
+
+        self.id = next(guild.discord.ids)
+        self.guild = guild
+        self.name = name
+        self.channels: list[FakeTextChannel] = []
+
+        guild.channels[self.id] = self
+
+    async def delete(self):
+        await self.guild.discord.request("delete_category")
+        del self.guild.channels[self.id]
+
+
+class FakeTextChannel:
+    """A text channel"""
+
+    def __init__(self, guild: "FakeGuild", name: str, category: FakeCategory) -> None:
+
+        self.id = next(guild.discord.ids)
+        self.guild = guild
+        self.name = name
+        self.category = category
+        self.limiter = RateLimiter(CHANNEL_LIMIT, guild.discord.stats)
+
+        guild.channels[self.id] = self
+        category.channels.append(self)
+
+    async def send(self, content: str) -> FakeMessage:
+        await self.guild.discord.request("send", channel_limiter=self.limiter)
+        self.guild.discord.stats.message_lengths.append(len(content))
+
+        if len(content) > 2000:
+            raise ValueError("Message longer than 2000 characters")
+
+        return FakeMessage(self, content)
+
+    async def delete(self):
+        await self.guild.discord.request("delete_channel")
+        del self.guild.channels[self.id]
+        self.category.channels.remove(self)
+
+
+class FakeGuild:
+    """A guild (only what the bot uses)"""
+
+    def __init__(self, discord: FakeDiscord) -> None:
+
+        self.discord = discord
+        self.id = next(discord.ids)
+        self.name = f"guild-{self.id}"
+        self.default_role = "@everyone"
+        self.me = "bot"
+
+        # Indexed by the channel ID (categories included)
+        self.channels: dict[int, FakeCategory | FakeTextChannel] = {}
+
+    @property
+    def categories(self) -> list[FakeCategory]:
+        return [
+            channel
+            for channel in self.channels.values()
+            if isinstance(channel, FakeCategory)
+        ]
+
+    def get_channel(self, channel_id: int) -> FakeCategory | FakeTextChannel | None:
+        return self.channels.get(channel_id)
+
+    async def create_category(self, name: str) -> FakeCategory:
+        await self.discord.request("create_category")
+        return FakeCategory(self, name)
+
+    async def create_text_channel(
+        self, name: str, category: FakeCategory, overwrites: dict = None
+    ) -> FakeTextChannel:
+        await self.discord.request("create_text_channel")
+        return FakeTextChannel(self, name, category)
+
+
+class FakeContext:
+    """The context of a command sent in the manage channel of a guild"""
+
+    def __init__(self, guild: FakeGuild) -> None:
+
+        self.guild = guild
+        self.channel = next(
+            channel
+            for channel in guild.channels.values()
+            if isinstance(channel, FakeTextChannel) and channel.name == MANAGE_CHANNEL
+        )
+
+    async def send(self, content) -> FakeMessage:
+        return await self.channel.send(str(content))
@@ -0,0 +1,176 @@
+""" Contains a local stand-in of the Fenix server, serving synthetic announcements feeds """
+
+import asyncio
+import hashlib
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+from models.parser import FeedItem
+
+from ..feeds import build_feed, generate_items
+
+MAINTENANCE_PAGE = b"<!DOCTYPE html><html><head><title>Manuten\xc3\xa7\xc3\xa3o</title></head><body><h1>O sistema encontra-se em manuten\xc3\xa7\xc3\xa3o.</h1></body></html>"
+""" Returned instead of the feed while Fenix is in maintenance """
+
+
+@dataclass
+class FeedState:
+    """Contains the current version of a synthetic feed"""
+
+    items: list[FeedItem]
+    """ The announcements, from the newest to the oldest """
+
+    seed: int
+    """ Used to generate the announcements """
+
+    n_generated: int
+    """ The number of announcements generated so far (the next one is newer than all of them) """
+
+    version: int = 0
+    """ Increased whenever the feed changes """
+
+    body: bytes = None
+    """ The feed of the current version """
+
+
+@dataclass
+class FenixStats:
+    """Counts the requests answered by the stand-in"""
+
+    responses: Counter = field(default_factory=Counter)
+    """ The number of responses of each kind ("feed", "not_modified", "error", "maintenance") """
+
+    changes: int = 0
+    """ The number of times a feed changed """
+
+
+class FenixStandIn:
+    """
+    Serves `/disciplinas/<course>/<years>/<semester>/rss/announcement` for any course, each with its own
+    synthetic announcements, simulating the latency, the errors, the maintenance pages and the new announcements of Fenix
+    """
+
+    def __init__(
+        self,
+        n_items: int = 20,
+        paragraphs: int = 2,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        maintenance_rate: float = 0.0,
+        churn: float = 0.05,
+        etag: bool = False,
+        seed: int = 0,
+    ) -> None:
+
+        self.__n_items = n_items
+        self.__paragraphs = paragraphs
+        self.__latency = latency
+        self.__error_rate = error_rate
+        self.__maintenance_rate = maintenance_rate
+        self.__churn = churn
+        self.__etag = etag
+        self.__rng = random.Random(seed)
+
+        # Indexed by the request path
+        self.__feeds: dict[str, FeedState] = dict()
+
+        self.__runner: web.AppRunner = None
+        self.stats = FenixStats()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts the server, returning its address"""
+
+        app = web.Application()
+        app.router.add_get(
+            "/disciplinas/{course}/{years}/{semester}/rss/announcement", self.__serve
+        )
+
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+
+        site = web.TCPSite(self.__runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        """Stops the server"""
+
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+
+    def __get_feed(self, path: str) -> FeedState:
+        """Returns the feed of the path, generating it the first time"""
+
+        if path not in self.__feeds:
+            seed = int.from_bytes(
+                hashlib.blake2b(path.encode(), digest_size=4).digest(), "big"
+            )
+            self.__feeds[path] = FeedState(
+                items=generate_items(
+                    self.__n_items, seed=seed, paragraphs=self.__paragraphs
+                ),
+                seed=seed,
+                n_generated=self.__n_items,
+            )
+
+        return self.__feeds[path]
+
+    def __change_feed(self, feed: FeedState):
+        """Publishes a new announcement (and sometimes updates or deletes an older one)"""
+
+        feed.n_generated += 1
+        newest = generate_items(
+            feed.n_generated, seed=feed.seed, paragraphs=self.__paragraphs
+        )[0]
+        feed.items.insert(0, newest)
+
+        if len(feed.items) > 1 and self.__rng.random() < 0.2:
+            i = self.__rng.randrange(1, len(feed.items))
+            feed.items[i] = feed.items[i]._replace(
+                description=feed.items[i].description + " (updated)"
+            )
+        if len(feed.items) > 1 and self.__rng.random() < 0.1:
+            feed.items.pop(self.__rng.randrange(1, len(feed.items)))
+
+        feed.version += 1
+        feed.body = None
+        self.stats.changes += 1
+
+    async def __serve(self, request: web.Request) -> web.Response:
+        """Answers a feed request"""
+
+        await asyncio.sleep(self.__rng.uniform(0, 2 * self.__latency))
+
+        if self.__rng.random() < self.__error_rate:
+            self.stats.responses["error"] += 1
+            return web.Response(status=503, text="Service Unavailable")
+
+        # Same as Fenix, the maintenance page is answered with 200
+        if self.__rng.random() < self.__maintenance_rate:
+            self.stats.responses["maintenance"] += 1
+            return web.Response(body=MAINTENANCE_PAGE, content_type="text/html")
+
+        feed = self.__get_feed(request.path)
+
+        if self.__rng.random() < self.__churn:
+            self.__change_feed(feed)
+
+        etag = f'"{feed.version}"'
+        if self.__etag and request.headers.get("If-None-Match") == etag:
+            self.stats.responses["not_modified"] += 1
+            return web.Response(status=304)
+
+        if feed.body is None:
+            feed.body = build_feed(feed.items)
+
+        self.stats.responses["feed"] += 1
+        return web.Response(
+            body=feed.body,
+            content_type="application/rss+xml",
+            headers={"ETag": etag} if self.__etag else None,
+        )
@@ -0,0 +1,271 @@
+"""
+Replays a recording of the feed responses (see `FEED_RECORDING`) through the update pipeline, without the network
+or Discord: each response is processed by its course (as in `Course.async_update_announcements`, with the
+same full and incremental updates as the bot) and the changes are rendered as alerts
+
+The changes found are summarized by a digest, so two versions of the pipeline can be compared on the same
+recording with `--output` and `--compare` (the replay is deterministic, unlike the recorded updates)
+
+Run from the `source` folder: python -m benchmarks.replay feeds.rec [--realtime] [--speed 60] [--profile replay.prof] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import hashlib
+import json
+import platform
+import pstats
+import sys
+import time
+
+from constants import FULL_SCAN_EVERY
+from models.course import Course
+from models.fetcher import FeedResponse, FeedValidators, check_feed_response
+from models.metrics import metrics
+from models.recorder import RecordedResponse, read_recording
+from utils import get_alert_messages
+
+from .suite import get_commit
+
+RESULTS_VERSION = 1
+""" The version of the results format """
+
+FEED_SUFFIX = "/rss/announcement"
+""" The end of the feed links, removed to get the link of the course """
+
+
+class ReplayFetcher:
+    """
+    Answers the feed requests with recorded responses instead of the network (same interface as `FeedFetcher`),
+    so the courses process them exactly as they did when they were recorded
+    """
+
+    def __init__(self) -> None:
+
+        # The response to the next request of each feed (indexed by the feed link)
+        self.__responses: dict[str, RecordedResponse] = dict()
+
+        self.failures = 0
+        """ The number of responses that couldn't be processed """
+
+    def set_response(self, response: RecordedResponse):
+        """Sets the response to the next request of the feed"""
+
+        self.__responses[response.url] = response
+
+    async def fetch(
+        self, url: str, validators: FeedValidators = None
+    ) -> FeedResponse | None:
+        """Same as `FeedFetcher.fetch`, using the response set for the feed"""
+
+        response = self.__responses.pop(url)
+
+        if response.status == 0:
+            raise ValueError(
+                f"Failed to retrieve XML using: {url}\nError: {response.body.decode()}"
+            )
+
+        headers = {}
+        if response.etag is not None:
+            headers["ETag"] = response.etag
+        if response.last_modified is not None:
+            headers["Last-Modified"] = response.last_modified
+
+        return check_feed_response(
+            url=url,
+            status=response.status,
+            headers=headers,
+            body=response.body,
+            validators=validators,
+        )
+
+    def record_success(self, url: str):
+        """Nothing to do, the recording decides what happens next"""
+
+    def record_failure(self, url: str, error: Exception) -> float:
+        """Counts the failure (the next response of the feed is used right away)"""
+
+        self.failures += 1
+
+        return 0.0
+
+
+def get_course(courses: dict[str, Course], url: str) -> Course:
+    """Returns the course of the feed, creating it on its first response"""
+
+    if url not in courses:
+        # Created as from a backup, as the recording can be from a previous school year
+        courses[url] = Course.from_backup(
+            link=url.removesuffix(FEED_SUFFIX),
+            announcements=[],
+            fingerprints={},
+            validators=None,
+            full_scan_pending=False,
+        )
+
+    return courses[url]
+
+
+async def replay(
+    responses: list[RecordedResponse],
+    full_scan_every: int,
+    speed: float | None,
+) -> dict:
+    """Processes the responses in order (paced as they were recorded, `speed` times faster, unless `speed` is `None`)"""
+
+    fetcher = ReplayFetcher()
+    courses: dict[str, Course] = dict()
+    polls: dict[str, int] = dict()
+    changes_hash = hashlib.blake2b(digest_size=16)
+    n_changes = {"added": 0, "updated": 0, "deleted": 0}
+    n_messages = 0
+    max_lag = 0.0
+
+    started_at = time.perf_counter()
+    first_recorded_at = responses[0].recorded_at if responses else 0.0
+
+    for response in responses:
+        if speed is not None:
+            due = started_at + (response.recorded_at - first_recorded_at) / speed
+            wait = due - time.perf_counter()
+
+            if wait > 0:
+                await asyncio.sleep(wait)
+            else:
+                # How far behind the recording the replay is (the pipeline is slower than the real updates)
+                max_lag = max(max_lag, -wait)
+
+        course = get_course(courses, response.url)
+        fetcher.set_response(response)
+
+        # The same full and incremental updates as the automatic updates of the bot
+        n_polls = polls.get(response.url, 0)
+        polls[response.url] = n_polls + 1
+
+        changes = await course.async_update_announcements(
+            fetcher, incremental=n_polls % full_scan_every != 0
+        )
+
+        if len(changes) == 0:
+            continue
+
+        with metrics.measure("update_stage_seconds", stage="render"):
+            messages = get_alert_messages(changes)
+
+        n_messages += len(messages)
+        for change in changes:
+            n_changes[change["action"].name.lower()] += 1
+            changes_hash.update(
+                f"{response.url} {change['action'].name} {change['announcement'].id}\n".encode()
+            )
+        for message in messages:
+            changes_hash.update(message.encode())
+
+    return {
+        "seconds": time.perf_counter() - started_at,
+        "responses": len(responses),
+        "courses": len(courses),
+        "failures": fetcher.failures,
+        "changes": n_changes,
+        "messages": n_messages,
+        "changes_digest": changes_hash.hexdigest(),
+        "stages": {
+            stage: metrics.get_histogram("update_stage_seconds", stage=stage).sum
+            for stage in ("parse", "diff", "render")
+        },
+        "max_lag": max_lag,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("recording", help="The file recorded by the bot")
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Paces the responses as they were received (otherwise as fast as possible)",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="How many times faster than real time (with --realtime)",
+    )
+    parser.add_argument("--full-scan-every", type=int, default=FULL_SCAN_EVERY)
+    parser.add_argument(
+        "--profile", help="Where to write the profile of the replay (pstats)"
+    )
+    parser.add_argument("--output", help="Where to write the results (JSON)")
+    parser.add_argument(
+        "--compare", help="Results of a previous replay to compare with"
+    )
+    args = parser.parse_args()
+
+    # Read before replaying, so reading the file isn't measured
+    responses = list(read_recording(args.recording))
+    speed = args.speed if args.realtime else None
+
+    profiler = cProfile.Profile() if args.profile is not None else None
+    if profiler is not None:
+        profiler.enable()
+
+    results = asyncio.run(replay(responses, args.full_scan_every, speed))
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+    print(
+        f"Replayed {results['responses']} responses of {results['courses']} courses in {results['seconds']:.2f} seconds "
+        f"({results['failures']} failed)"
+    )
+    print(
+        "Changes: "
+        + ", ".join(f"{n} {action}" for action, n in results["changes"].items())
+        + f" ({results['messages']} alerts, digest {results['changes_digest']})"
+    )
+    print(
+        "Stages: "
+        + ", ".join(
+            f"{stage} {seconds * 1000:.1f} ms"
+            for stage, seconds in results["stages"].items()
+        )
+    )
+    if speed is not None:
+        print(f"At most {results['max_lag']:.2f} seconds behind the recording")
+
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "parameters": {
+            "recording": args.recording,
+            "full_scan_every": args.full_scan_every,
+        },
+        "results": results,
+    }
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+        if baseline["changes_digest"] != results["changes_digest"]:
+            print(
+                f"\nThe changes differ from the baseline: {baseline['changes']} before, {results['changes']} now"
+            )
+            sys.exit(1)
+
+        print(
+            f"\nSame changes as the baseline, {results['seconds'] / baseline['seconds']:.2f}x the time "
+            f"({baseline['seconds']:.2f} seconds before)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Times each stage of an update separately (parsing, creating the announcements, detecting the changes,
+rendering the alerts and saving them), using synthetic feeds so the network isn't needed
+
+The results are written as JSON, and can be compared with the results of another commit using `--compare`
+(exits with an error if any stage is slower than the tolerance).
+
+Run from the `source` folder: python -m benchmarks.suite [--items 500] [--churn 0.02] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from models import announcement as announcement_module
+from models.announcement import Announcement, AnnouncementActions
+from models.course import Course
+from models.database import Database
+from models.fetcher import FeedResponse, FeedValidators, check_feed_response
+from models.parse_pool import parse_feed
+from models.sqlite_database import SQLiteDatabase
+from utils import get_alert_message
+
+from .feeds import build_feed, churn_items, generate_items, get_course_link
+
+RESULTS_VERSION = 1
+""" The version of the results format """
+
+
+def measure(
+    func: Callable[[Any], Any], setup: Callable[[], Any], repeat: int
+) -> dict[str, float]:
+    """Returns the best and median time (in seconds) of `func`, which receives the result of `setup` (not timed)"""
+
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+
+        start = time.perf_counter()
+        func(argument)
+        times.append(time.perf_counter() - start)
+
+    return {"best": min(times), "median": statistics.median(times)}
+
+
+def get_commit() -> str | None:
+    """Returns the current git commit (if available)"""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_course(feed: bytes) -> Course:
+    """Returns a course with the announcements of the feed"""
+
+    course = Course(link=get_course_link())
+    course.process_feed(FeedResponse(feed, FeedValidators()))
+
+    return course
+
+
+def build_database(database: Database, feed: bytes, n_guilds: int) -> Course:
+    """Adds a course with the announcements of the feed to the guilds of the database, returning it"""
+
+    for guild_id in range(n_guilds):
+        course = database.add_course(
+            guild=SimpleNamespace(id=guild_id, name=str(guild_id)),
+            course_link=get_course_link(),
+        )
+
+    database.save_course(
+        course=course,
+        changes=course.process_feed(FeedResponse(feed, FeedValidators())),
+    )
+
+    return course
+
+
+def run_suite(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    """Runs every stage, returning the times indexed by the stage name"""
+
+    items = generate_items(args.items, paragraphs=args.paragraphs, rich=args.rich)
+    old_feed = build_feed(items)
+    new_feed = build_feed(
+        churn_items(
+            items,
+            rate=args.churn,
+            added=args.added,
+            updated=args.updated,
+            deleted=args.deleted,
+        )
+    )
+
+    results = {}
+
+    # Fetch (without the request): hashing the body to know if it changed
+    results["fetch_check"] = measure(
+        lambda _: check_feed_response(
+            url="bench", status=200, headers={}, body=new_feed, validators=None
+        ),
+        setup=lambda: None,
+        repeat=args.repeat,
+    )
+
+    results["parse"] = measure(
+        lambda _: parse_feed(new_feed), setup=lambda: None, repeat=args.repeat
+    )
+
+    results["announcement_construction"] = measure(
+        lambda _: [
+            Announcement(
+                title=item.title,
+                description=item.description,
+                link=item.link,
+                author=item.author,
+                pub_date=item.pub_date,
+            )
+            for item in items
+        ],
+        setup=lambda: None,
+        repeat=args.repeat,
+    )
+
+    # A full update of a course already tracking the previous version of the feed (parsing included)
+    results["diff_full"] = measure(
+        lambda course: course.process_feed(FeedResponse(new_feed, FeedValidators())),
+        setup=lambda: build_course(old_feed),
+        repeat=args.repeat,
+    )
+    results["diff_incremental"] = measure(
+        lambda course: course.process_feed(
+            FeedResponse(new_feed, FeedValidators()), incremental=True
+        ),
+        setup=lambda: build_course(old_feed),
+        repeat=args.repeat,
+    )
+
+    # Rendering every announcement (as when a course is added), without the converted descriptions cached
+    announcements = build_course(old_feed).announcements
+    results["render"] = measure(
+        lambda _: [
+            get_alert_message(announcement, AnnouncementActions.ADDED)
+            for announcement in announcements
+        ],
+        setup=announcement_module._text_cache.clear,
+        repeat=args.repeat,
+    )
+
+    # The persistence stages use a temporary folder, as the backups are saved in the current folder
+    initial_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+
+        try:
+            database = Database()
+            build_database(database, old_feed, args.guilds)
+            snapshots = database._Database__snapshots
+
+            def save_snapshot(_):
+                snapshots.mark_dirty()
+
+            results["snapshot_save"] = measure(
+                save_snapshot, setup=lambda: None, repeat=args.repeat
+            )
+            results["snapshot_load"] = measure(
+                lambda _: Database().try_load_backup(),
+                setup=lambda: None,
+                repeat=args.repeat,
+            )
+
+            def setup_sqlite() -> tuple[SQLiteDatabase, Course, list[dict]]:
+                path = os.path.join(folder, f"bench-{time.perf_counter_ns()}.sqlite")
+                # Not loaded, as that would import the snapshot saved above
+                database = SQLiteDatabase(path=path)
+                course = build_database(database, old_feed, args.guilds)
+                changes = course.process_feed(FeedResponse(new_feed, FeedValidators()))
+                return database, course, changes
+
+            results["sqlite_save_changes"] = measure(
+                lambda setup: setup[0].save_course(course=setup[1], changes=setup[2]),
+                setup=setup_sqlite,
+                repeat=args.repeat,
+            )
+            results["sqlite_load"] = measure(
+                lambda path: SQLiteDatabase(path=path).try_load_backup(),
+                setup=lambda: setup_sqlite()[0]._SQLiteDatabase__path,
+                repeat=args.repeat,
+            )
+        finally:
+            os.chdir(initial_folder)
+
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    """Prints the change of each stage against the baseline, returning the stages slower than the tolerance"""
+
+    regressions = []
+
+    print(f"\n{'stage':<26} {'baseline (ms)':>14} {'current (ms)':>13} {'change':>8}")
+    for stage, times in results.items():
+        if stage not in baseline:
+            continue
+
+        change = times["best"] / baseline[stage]["best"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(stage)
+            flag = "  <- slower"
+
+        print(
+            f"{stage:<26} {baseline[stage]['best'] * 1000:>14.2f} {times['best'] * 1000:>13.2f} {change:>+8.1%}{flag}"
+        )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--churn", type=float, default=0.02)
+    parser.add_argument("--added", type=float, help="Defaults to --churn")
+    parser.add_argument("--updated", type=float, help="Defaults to --churn")
+    parser.add_argument("--deleted", type=float, help="Defaults to --churn")
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument(
+        "--rich",
+        action="store_true",
+        help="Adds lists, tables and formatting to the descriptions",
+    )
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Where to write the results (JSON)")
+    parser.add_argument("--compare", help="Results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run_suite(args)
+
+    print(f"{'stage':<26} {'best (ms)':>10} {'median (ms)':>12}")
+    for stage, times in results.items():
+        print(
+            f"{stage:<26} {times['best'] * 1000:>10.2f} {times['median'] * 1000:>12.2f}"
+        )
+
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare", "tolerance")
+        },
+        "results": results,
+    }
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if baseline["parameters"] != report["parameters"]:
+            print("\nWarning: the baseline was run with different parameters.")
+
+        if compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,3 +8,90 @@ MANAGE_CHANNEL = "manage"
 
 UPDATE_INTERVAL = 30  # minutes
 """ The interval between each automatic update"""
+
+REPORT_QUIET_HOURS = range(2, 9)  # hours
+""" The hours when the automatic updates aren't reported in the manage channel (the changes are reported together afterwards) """
+
+FETCH_TIMEOUT = 30  # seconds
+""" The maximum time a single feed request can take """
+
+FETCH_CONCURRENCY = 10
+""" The maximum number of feed requests running at the same time """
+
+FULL_SCAN_EVERY = 4  # updates
+""" Automatic updates only read the new announcements, except every `FULL_SCAN_EVERY` updates which detect updated and deleted ones """
+
+TEXT_CACHE_SIZE = 1024  # descriptions
+""" The maximum number of announcement descriptions kept converted to text """
+
+DATABASE_BACKEND = "sqlite"
+""" Where the bot data is saved, either "sqlite" (saves only the changes) or "pickle" (saves everything at once) """
+
+SNAPSHOT_DELAY = 2  # seconds
+""" The time to wait for more changes before saving the bot data (in the background, with either backend) """
+
+RETRY_BASE_DELAY = 60  # seconds
+""" The time to wait before fetching a feed again after the first failure (doubled after each failure) """
+
+RETRY_MAX_DELAY = 60 * 60  # seconds
+""" The maximum time to wait before fetching a failing feed again """
+
+BREAKER_THRESHOLD = 3  # failures
+""" The number of failures in a row after which a feed is skipped until it is retried """
+
+HOST_BREAKER_THRESHOLD = 10  # failures
+""" The number of failures in a row (of any feed) after which every feed of the server is skipped until it is retried """
+
+MIN_POLL_INTERVAL = 10  # minutes
+""" The shortest interval between automatic updates of a course (for courses that post often) """
+
+MAX_POLL_INTERVAL = 6 * 60  # minutes
+""" The longest interval between automatic updates of a course (for courses that rarely post) """
+
+POLL_BUDGET = 600  # requests per hour
+""" The maximum number of feeds fetched per hour, the intervals of every course are increased to respect it """
+
+DELIVERY_CONCURRENCY = 20
+""" The maximum number of channels receiving changes at the same time """
+
+QUEUE_COMMANDS = True
+""" Whether a command sent while another one is running in the same server waits for it (otherwise it is rejected) """
+
+MESSAGE_LIMIT = 2000  # characters
+""" The maximum length of a Discord message, several alerts are sent in the same message while they fit """
+
+CHANNEL_RATE_LIMIT = 5  # messages per 5 seconds
+""" The maximum number of messages sent to a channel, below the Discord limit so the requests aren't rejected """
+
+GLOBAL_RATE_LIMIT = 40  # messages per second
+""" The maximum number of messages sent by the bot, below the Discord global limit """
+
+PARSE_WORKERS = 2
+""" The number of workers parsing the feeds outside the event loop (0 parses them in the event loop) """
+
+PARSE_EXECUTOR = "thread"
+""" The kind of workers parsing the feeds, "thread" (lxml parses without holding the GIL most of the time) or "process" (uses every core) """
+
+STARTUP_MODE = "reconcile"
+""" How the guilds are prepared at startup, "reconcile" (only creates the missing channels and deletes the ones not tracked) or "reset" (deletes and creates everything again when there is no backup) """
+
+STARTUP_CONCURRENCY = 5
+""" The maximum number of guilds prepared at the same time at startup """
+
+METRICS_HOST = "127.0.0.1"
+""" The address of the metrics endpoint (only reachable from the same machine by default) """
+
+METRICS_PORT = 9100  # 0 disables the endpoint
+""" The port of the metrics endpoint, read by Prometheus at `/metrics` """
+
+LOOP_LAG_THRESHOLD = 0.5  # seconds
+""" How late the event loop can run before the watchdog reports what blocked it """
+
+WATCHDOG_INTERVAL = 0.1  # seconds
+""" How often the watchdog measures the event loop lag (and samples the stack while it is blocked) """
+
+FEED_RECORDING = None  # for example "feeds.rec"
+""" Where every feed response is saved (`None` disables it), to reproduce the updates offline with `python -m benchmarks.replay` """
+
+SEARCH_RESULTS = 5  # announcements
+""" The number of announcements shown by `$search` """
@@ -0,0 +1,150 @@
+""" Contains the preparation of the guilds when the bot starts """
+
+import asyncio
+import time
+
+from constants import (
+    MANAGE_CHANNEL,
+    METRICS_HOST,
+    METRICS_PORT,
+    STARTUP_CONCURRENCY,
+    STARTUP_MODE,
+)
+from discord import Guild, TextChannel
+from utils import (
+    create_bot_category,
+    create_channel,
+    delete_bot_category,
+    find_channel,
+    format_channel_name,
+    get_bot_category,
+)
+
+from .bot import bot, db, metrics_server, watchdog
+
+# Set once the backup is loaded and the guilds are prepared, the commands that use the data wait for it
+startup_done = asyncio.Event()
+
+
+async def send_welcome(channel: TextChannel):
+    """Displays the hello message and the commands in the manage channel"""
+
+    ctx = await bot.get_context(
+        await channel.send("Hello! Ready to track the announcements...")
+    )
+    await bot.get_command("help").invoke(ctx)
+
+
+async def reset_guild(guild: Guild):
+    """Deletes the bot category and creates it again (with only the manage channel)"""
+
+    # Clean up
+    await delete_bot_category(guild)
+
+    print(f"Initializing guild '{guild.name}'")
+
+    # Create category and manage channel
+    await create_bot_category(guild)
+    channel = await create_channel(
+        guild=guild, channel_name=MANAGE_CHANNEL, allow_user_messages=True
+    )
+
+    await send_welcome(channel)
+
+
+async def reconcile_guild(guild: Guild):
+    """Creates the channels missing in the guild and deletes the ones of courses that aren't tracked, keeping the rest"""
+
+    manage_channel = find_channel(guild=guild, channel_name=MANAGE_CHANNEL)
+    is_new = manage_channel is None
+
+    # Also creates the category, if needed
+    if is_new:
+        print(f"Initializing guild '{guild.name}'")
+        manage_channel = await create_channel(
+            guild=guild, channel_name=MANAGE_CHANNEL, allow_user_messages=True
+        )
+
+    expected_ids = {manage_channel.id}
+
+    for course in db.get_courses_list(guild):
+        channel_id = db.get_channel_id(guild=guild, course=course)
+        channel = find_channel(
+            guild=guild,
+            channel_name=format_channel_name(course.name),
+            channel_id=channel_id,
+        )
+
+        if channel is None:
+            channel = await create_channel(guild=guild, channel_name=course.name)
+        if channel.id != channel_id:
+            db.set_channel_id(guild=guild, course=course, channel_id=channel.id)
+
+        expected_ids.add(channel.id)
+
+    # The channels of the courses removed while the bot was offline (or of a previous installation)
+    # (a category that was just created may not be in the guild cache yet, but then it has nothing to delete)
+    category = get_bot_category(guild)
+    orphans = [
+        channel
+        for channel in (category.channels if category is not None else [])
+        if channel.id not in expected_ids
+    ]
+    if len(orphans) > 0:
+        await asyncio.gather(*[channel.delete() for channel in orphans])
+        print(f"Deleted {len(orphans)} channels not tracked in guild '{guild.name}'")
+
+    if is_new:
+        await send_welcome(manage_channel)
+
+
+async def bootstrap_guilds(loaded_backup: bool) -> int:
+    """Prepares every guild at the same time (a few at once, to respect the rate limits), returning the number of guilds that failed"""
+
+    # Without a backup, the reset mode starts every guild from scratch
+    prepare = (
+        reset_guild
+        if STARTUP_MODE == "reset" and not loaded_backup
+        else reconcile_guild
+    )
+    slots = asyncio.Semaphore(STARTUP_CONCURRENCY)
+
+    async def run(guild: Guild) -> bool:
+        async with slots:
+            try:
+                with watchdog.step(f"preparing guild '{guild.name}'"):
+                    await prepare(guild)
+            except Exception as e:
+                # A guild where the bot lacks permissions doesn't stop the others
+                print(f"Failed to prepare guild '{guild.name}': {e!r}")
+                return False
+
+        return True
+
+    results = await asyncio.gather(*[run(guild) for guild in bot.guilds])
+
+    return results.count(False)
+
+
+async def start_up(started_at: float):
+    """Loads the backup and prepares the guilds, reporting the time it took"""
+
+    # Reading a big backup would stop the bot from answering Discord, so it is done in a worker thread
+    loaded_backup = await asyncio.to_thread(db.try_load_backup)
+    loaded_at = time.monotonic()
+
+    n_failed = await bootstrap_guilds(loaded_backup)
+    startup_done.set()
+
+    if METRICS_PORT != 0:
+        try:
+            await metrics_server.start(host=METRICS_HOST, port=METRICS_PORT)
+        except OSError as e:
+            # For example, the port is already in use, the bot works without the endpoint
+            print(f"Failed to start the metrics endpoint: {e!r}")
+
+    print(
+        f"Ready in {time.monotonic() - started_at:.1f} seconds "
+        f"(backup {'loaded' if loaded_backup else 'not found'} in {loaded_at - started_at:.1f} seconds, "
+        f"{len(bot.guilds) - n_failed} of {len(bot.guilds)} guilds prepared in {time.monotonic() - loaded_at:.1f} seconds)"
+    )
@@ -1,9 +1,28 @@
 import discord
+from constants import DATABASE_BACKEND
 from discord.ext import commands
 from models.database import Database
+from models.fetcher import FeedFetcher
+from models.metrics import MetricsServer, metrics
+from models.parse_pool import FeedParser
+from models.scheduler import PollScheduler
+from models.sqlite_database import SQLiteDatabase
+from models.watchdog import LoopWatchdog
+
+from .delivery import DeliveryQueue
 
 intents = discord.Intents.default()
 intents.message_content = True  # So the bot can read commands
 
 bot = commands.Bot(command_prefix="$", intents=intents, help_command=None)
-db = Database()
+db = SQLiteDatabase() if DATABASE_BACKEND == "sqlite" else Database()
+fetcher = FeedFetcher()
+parser = FeedParser()
+scheduler = PollScheduler()
+outbox = DeliveryQueue()
+metrics_server = MetricsServer()
+watchdog = LoopWatchdog()
+
+# Values kept by the objects above, read when the metrics are collected
+metrics.set_callback("delivery_queue_depth", outbox.get_depth)
+metrics.set_callback("tracked_courses", lambda: len(db.get_all_courses()))
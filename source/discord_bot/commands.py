@@ -1,40 +1,66 @@
 """ Contains the commands the bot answers to """
 
-from datetime import datetime
+import asyncio
+from collections import defaultdict
 from functools import wraps
 
-from constants import CATEGORY_NAME, MANAGE_CHANNEL, UPDATE_INTERVAL
+from constants import CATEGORY_NAME, MANAGE_CHANNEL, QUEUE_COMMANDS, UPDATE_INTERVAL
 from discord.ext import commands
+from models.announcement import AnnouncementActions
+from models.registry import FeedRegistry
 from utils import (
     create_channel,
     delete_channel,
     get_channel,
     get_init_message,
-    send_announcements_changes,
+    get_search_message,
+    get_stats_message,
+    get_update_message,
+    render_alert_messages,
 )
 
-from .bot import bot, db
+from .bootstrap import startup_done
+from .bot import bot, db, fetcher, outbox, parser, scheduler
+from .pipeline import deliver_changes, update_courses
 
-# Flag to avoid running multiple commands at the same time
-processing_command = False
+# Locks to avoid running multiple commands at the same time in a guild (indexed by the guild ID)
+guild_locks: dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
 
 
-def handle_processing_flag(func):
-    """Decorator to set/unset the flag while running a command"""
+def handle_guild_lock(func):
+    """Decorator to run a command holding the lock of the guild (see `QUEUE_COMMANDS`)"""
 
     @wraps(func)
     async def wrapper(ctx, *args, **kwargs):
-        global processing_command
+        lock = guild_locks[ctx.guild.id]
 
-        if processing_command:
-            await ctx.send("I'm already processing another command. Please wait.")
-            return
+        if lock.locked():
+            if not QUEUE_COMMANDS:
+                await ctx.send("I'm already processing another command. Please wait.")
+                return
 
-        processing_command = True
-        try:
+            await ctx.send(
+                "I'm already processing another command, this one will run after it."
+            )
+
+        async with lock:
             return await func(ctx, *args, **kwargs)
-        finally:
-            processing_command = False
+
+    return wrapper
+
+
+def wait_for_startup(func):
+    """Decorator to run a command only after the backup is loaded and the guilds are prepared (see `start_up`)"""
+
+    @wraps(func)
+    async def wrapper(ctx, *args, **kwargs):
+        if not startup_done.is_set():
+            await ctx.send(
+                "I'm still starting up, this command will run once I'm ready."
+            )
+            await startup_done.wait()
+
+        return await func(ctx, *args, **kwargs)
 
     return wrapper
 
@@ -51,7 +77,6 @@ def should_answer_command(ctx):
 
 @bot.command()
 @commands.check(should_answer_command)
-@handle_processing_flag
 async def help(ctx):
     """Displays bot commands"""
 
@@ -74,8 +99,14 @@ https://fenix.tecnico.ulisboa.pt/disciplinas/XXXX/XXXX-XXXX/X-semestre
 - *Stops tracking the announcements of the course with `course_name`.* 
 - *The name should be the same name used in the output of `$tracked`.*
 
+`$search <terms> [course_name]` 
+- *Searches the announcements of the courses being tracked (or only of `course_name`), showing the most relevant ones.*
+
 `$update` 
-- *Triggers a manual update of the announcements (they update automatically every {UPDATE_INTERVAL} minutes).*
+- *Triggers a manual update of the announcements (they update automatically, more often for the courses that post often, with a summary every {UPDATE_INTERVAL} minutes, except at night).*
+
+`$stats` 
+- *Displays how the bot is performing (the same metrics are available to Prometheus on the machine running the bot).*
 """
 
     await ctx.send(help_text)
@@ -83,7 +114,7 @@ https://fenix.tecnico.ulisboa.pt/disciplinas/XXXX/XXXX-XXXX/X-semestre
 
 @bot.command()
 @commands.check(should_answer_command)
-@handle_processing_flag
+@wait_for_startup
 async def tracked(ctx):
     """Display the current tracked courses"""
 
@@ -94,8 +125,13 @@ async def tracked(ctx):
             "Currently there aren't any courses being tracked. Add some using `$add`."
         )
     else:
+        intervals = scheduler.get_intervals(db.get_all_courses())
+
         text = "**Courses being tracked:**\n" + "\n".join(
-            [f"- {course.name}" for course in courses]
+            [
+                f"- {course.name} *(updated every {intervals[FeedRegistry.get_key(course)] / 60:.0f} min, {fetcher.get_breaker(course.feed_url).get_status()})*"
+                for course in courses
+            ]
         )
 
         await ctx.send(text)
@@ -103,7 +139,37 @@ async def tracked(ctx):
 
 @bot.command()
 @commands.check(should_answer_command)
-@handle_processing_flag
+@wait_for_startup
+async def search(ctx, *, query: str):
+    """Searches the announcements"""
+
+    # The last word can be the name of a course, to only search its announcements
+    words = query.split()
+    course_names = {course.name for course in db.get_courses_list(ctx.guild)}
+
+    course_name = None
+    if len(words) > 1 and words[-1] in course_names:
+        course_name = words.pop()
+
+    query = " ".join(words)
+    hits = db.search(guild=ctx.guild, query=query, course_name=course_name)
+
+    await ctx.send(get_search_message(query, hits))
+
+
+@bot.command()
+@commands.check(should_answer_command)
+@wait_for_startup
+async def stats(ctx):
+    """Displays the bot metrics"""
+
+    await ctx.send(get_stats_message())
+
+
+@bot.command()
+@commands.check(should_answer_command)
+@wait_for_startup
+@handle_guild_lock
 async def add(ctx, course_link: str):
     """Adds a course"""
 
@@ -113,13 +179,29 @@ async def add(ctx, course_link: str):
         course = db.add_course(guild=ctx.guild, course_link=course_link)
         await ctx.send("Adding course...")
         channel = await create_channel(guild=ctx.guild, channel_name=course.name)
+        db.set_channel_id(guild=ctx.guild, course=course, channel_id=channel.id)
 
         # Get the announcements changes and send the messages
-        changes = course.update_announcements()
+        changes = await course.async_update_announcements(fetcher, parser=parser)
+        db.save_course(course=course, changes=changes)
         await channel.send(
             get_init_message(course)
         )  # Done after the update (otherwise the length of the announcements list will be 0)
-        await send_announcements_changes(channel=channel, changes=changes)
+
+        # The course may already be tracked by other guilds, so the new channel gets every announcement
+        # while the other guilds only get what changed since their last update (both are sent in the background)
+        outbox.enqueue(
+            channel=channel,
+            messages=await render_alert_messages(
+                [
+                    {"announcement": announcement, "action": AnnouncementActions.ADDED}
+                    for announcement in course.announcements
+                ]
+            ),
+        )
+        await deliver_changes(
+            course=course, changes=changes, exclude_guild_ids={ctx.guild.id}
+        )
 
         await ctx.send("Course added. Check the new channel with the announcements.")
 
@@ -131,16 +213,28 @@ async def add(ctx, course_link: str):
 
 @bot.command()
 @commands.check(should_answer_command)
-@handle_processing_flag
+@wait_for_startup
+@handle_guild_lock
 async def remove(ctx, course_name: str):
     """Removes a course"""
 
     try:
 
+        # The channel is found by its ID, in case it was renamed
+        channel_ids = [
+            db.get_channel_id(guild=ctx.guild, course=course)
+            for course in db.get_courses_list(ctx.guild)
+            if course.name == course_name
+        ]
+
         # Removes a course and deletes course channel
         db.remove_course(guild=ctx.guild, course_name=course_name)
         await ctx.send("Removing course...")
-        await delete_channel(guild=ctx.guild, channel_name=course_name)
+        await delete_channel(
+            guild=ctx.guild,
+            channel_name=course_name,
+            channel_id=channel_ids[0] if channel_ids else None,
+        )
 
         await ctx.send("Course removed.")
 
@@ -154,22 +248,13 @@ async def remove(ctx, course_name: str):
 
 @bot.command()
 @commands.check(should_answer_command)
-@handle_processing_flag
+@wait_for_startup
+@handle_guild_lock
 async def update(ctx):
     """Updates the announcements of each course"""
 
-    n_changes = 0
-    for course in db.get_courses_list(guild=ctx.guild):
-
-        changes = course.update_announcements()
-        await send_announcements_changes(
-            channel=await get_channel(guild=ctx.guild, channel_name=course.name),
-            changes=changes,
-        )
-
-        n_changes += len(changes)
+    # The changes are also sent to the other guilds tracking the same courses
+    n_changes = await update_courses(db.get_courses_list(guild=ctx.guild))
 
     manage_channel = await get_channel(guild=ctx.guild, channel_name=MANAGE_CHANNEL)
-    await manage_channel.send(
-        f"Updated announcements @ {datetime.now().strftime('%H:%M of %d/%m/%Y')} **({n_changes} changes)**"
-    )
+    await manage_channel.send(get_update_message(n_changes[ctx.guild.id]))
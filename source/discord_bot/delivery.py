@@ -0,0 +1,212 @@
+""" Contains the queue that sends the messages to the channels, respecting the Discord rate limits """
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from constants import (
+    CHANNEL_RATE_LIMIT,
+    DELIVERY_CONCURRENCY,
+    GLOBAL_RATE_LIMIT,
+    MESSAGE_LIMIT,
+)
+from discord import TextChannel
+from models.metrics import metrics
+
+MESSAGE_SEPARATOR = "\n\n"
+""" Placed between the alerts sent in the same message """
+
+
+@dataclass(slots=True)
+class RateBucket:
+    """Limits how many messages are sent in any period of time (a sliding window, so the limit is never exceeded, even after a burst)"""
+
+    capacity: int
+    """ The number of messages allowed per period """
+
+    period: float
+    """ The period (in seconds) """
+
+    sent_at: deque[float] = field(default_factory=deque)
+    """ When the messages of the last period were sent """
+
+    def get_wait(self) -> float:
+        """Returns how long to wait until a message can be sent (0 if it can be sent now)"""
+
+        now = time.monotonic()
+
+        while len(self.sent_at) > 0 and self.sent_at[0] <= now - self.period:
+            self.sent_at.popleft()
+
+        if len(self.sent_at) < self.capacity:
+            return 0.0
+
+        return self.sent_at[0] + self.period - now
+
+    async def acquire(self):
+        """Waits until a message can be sent and registers it"""
+
+        while (wait := self.get_wait()) > 0:
+            await asyncio.sleep(wait)
+
+        self.sent_at.append(time.monotonic())
+
+
+@dataclass(slots=True)
+class DeliveryStats:
+    """Contains the statistics of the messages sent"""
+
+    sent_alerts: int = 0
+    """ The alerts sent """
+
+    sent_messages: int = 0
+    """ The Discord messages sent (several alerts can share one) """
+
+    failed_alerts: int = 0
+    """ The alerts that couldn't be sent """
+
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+    """ The time (in seconds) between queueing and sending the most recent alerts """
+
+    @property
+    def average_latency(self) -> float:
+        """The average of the recent latencies"""
+
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    @property
+    def max_latency(self) -> float:
+        """The maximum of the recent latencies"""
+
+        return max(self.latencies, default=0.0)
+
+
+class DeliveryQueue:
+    """
+    Queues the messages of each channel and sends them in the background, so the updates and commands don't wait for Discord
+
+    The alerts waiting in a channel are packed in as few messages as possible and the messages are paced
+    to stay below the rate limits of the channel and of the bot
+    """
+
+    def __init__(self, max_concurrency: int = DELIVERY_CONCURRENCY) -> None:
+
+        # Indexed by the channel ID, the queued alerts are (text, queued at)
+        self.__queues: dict[int, deque[tuple[str, float]]] = dict()
+        self.__channels: dict[int, TextChannel] = dict()
+        self.__workers: dict[int, asyncio.Task] = dict()
+        self.__buckets: dict[int, RateBucket] = dict()
+
+        self.__global_bucket = RateBucket(capacity=GLOBAL_RATE_LIMIT, period=1)
+
+        # Limits the channels sending at the same time
+        self.__slots = asyncio.Semaphore(max_concurrency)
+
+        self.stats = DeliveryStats()
+
+    def enqueue(self, channel: TextChannel, messages: Sequence[str]):
+        """Queues the messages to be sent to the channel (in order, the messages are shared and not copied)"""
+
+        if len(messages) == 0:
+            return
+
+        now = time.monotonic()
+
+        self.__queues.setdefault(channel.id, deque()).extend(
+            (message, now) for message in messages
+        )
+        self.__channels[channel.id] = channel
+
+        # Each channel has a single worker, so its messages are sent in order
+        worker = self.__workers.get(channel.id)
+        if worker is None or worker.done():
+            # Named so the watchdog can tell which channel it is (see `LoopWatchdog`)
+            self.__workers[channel.id] = asyncio.get_running_loop().create_task(
+                self.__deliver(channel.id), name=f"delivery to '{channel.name}'"
+            )
+
+    def get_depth(self, channel: TextChannel = None) -> int:
+        """Returns the number of alerts waiting to be sent (to the channel, or to every channel)"""
+
+        if channel is not None:
+            return len(self.__queues.get(channel.id, ()))
+
+        return sum(len(queue) for queue in self.__queues.values())
+
+    def get_status(self) -> str:
+        """Returns a summary of the queue (used in the logs)"""
+
+        return (
+            f"{self.get_depth()} alerts queued, {self.stats.sent_alerts} sent in {self.stats.sent_messages} messages "
+            f"(latency: {self.stats.average_latency:.1f}s average, {self.stats.max_latency:.1f}s max)"
+        )
+
+    async def join(self):
+        """Waits until every queued message is sent"""
+
+        while len(self.__workers) > 0:
+            await asyncio.gather(*self.__workers.values(), return_exceptions=True)
+
+    async def __deliver(self, channel_id: int):
+        """Sends the messages queued for the channel until there are none left"""
+
+        queue = self.__queues[channel_id]
+        channel = self.__channels[channel_id]
+        bucket = self.__buckets.setdefault(
+            channel_id, RateBucket(capacity=CHANNEL_RATE_LIMIT, period=5)
+        )
+
+        try:
+            while len(queue) > 0:
+                # Waiting for the rate limit lets more alerts be queued, so they are packed together
+                await bucket.acquire()
+
+                async with self.__slots:
+                    await self.__global_bucket.acquire()
+                    await self.__send(channel, self.__pop_batch(queue))
+        finally:
+            # Nothing is awaited between the queue being empty and the cleanup, so no alert is left behind
+            del self.__queues[channel_id]
+            del self.__channels[channel_id]
+            del self.__workers[channel_id]
+
+    def __pop_batch(self, queue: deque[tuple[str, float]]) -> list[tuple[str, float]]:
+        """Removes the first alerts of the queue that fit in a single message"""
+
+        batch = [queue.popleft()]
+        length = len(batch[0][0])
+
+        while (
+            len(queue) > 0
+            and length + len(MESSAGE_SEPARATOR) + len(queue[0][0]) <= MESSAGE_LIMIT
+        ):
+            length += len(MESSAGE_SEPARATOR) + len(queue[0][0])
+            batch.append(queue.popleft())
+
+        return batch
+
+    async def __send(self, channel: TextChannel, batch: list[tuple[str, float]]):
+        """Sends the alerts in a single message"""
+
+        try:
+            with metrics.measure("message_send_seconds"):
+                await channel.send(MESSAGE_SEPARATOR.join(text for text, _ in batch))
+        except Exception as e:
+            # For example, the channel was deleted, the bot lost its permissions or the connection failed
+            # (the worker keeps going, otherwise the alerts left in the queue would be dropped)
+            print(f"Failed to send {len(batch)} alerts to '{channel.name}': {e!r}")
+            self.stats.failed_alerts += len(batch)
+            metrics.inc("messages_sent_total", result="failed")
+            return
+
+        now = time.monotonic()
+
+        self.stats.sent_messages += 1
+        self.stats.sent_alerts += len(batch)
+        self.stats.latencies.extend(now - queued_at for _, queued_at in batch)
+
+        metrics.inc("messages_sent_total", result="sent")
+        for _, queued_at in batch:
+            metrics.observe("alert_delivery_seconds", now - queued_at)
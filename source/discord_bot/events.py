@@ -1,54 +1,64 @@
 """ Contains the methods corresponding to bot events """
 
+import asyncio
+import time
+
+from discord.abc import GuildChannel
 from discord.ext import commands
-from utils import create_bot_category, create_channel, delete_bot_category
+from utils import forget_channel_index
 
-from .bot import bot, db
+from .bootstrap import start_up
+from .bot import bot, scheduler, watchdog
 from .tasks import update_announcements
 
 # When the bot loses WIFI connection, it runs `on_ready` again after reconnecting
 # creating all the channels and etc, so use this flag to avoid that
 already_started_up = False
+startup_lock = asyncio.Lock()
+
+# Used to report how long the bot took to be ready (this module is imported when the bot starts)
+STARTED_AT = time.monotonic()
 
 
 @bot.event
 async def on_ready():
-    """Starts the bot and creates the channels"""
+    """Starts the bot and prepares the channels"""
 
     global already_started_up
 
-    if not already_started_up:
-        print(f"Logged in as {bot.user}, starting up...")
-
-        # Only create the channels and etc if there isn't a backup
-        # (for example in a power cut, the bot shouldn't recreate everything, just resume activity from the previous state)
-        if not db.try_load_backup():
-            for guild in bot.guilds:
+    # A reconnection while starting up waits for it, instead of starting up a second time
+    async with startup_lock:
+        if already_started_up:
+            return
 
-                # Clean up
-                await delete_bot_category(guild)
+        print(f"Logged in as {bot.user}, starting up...")
 
-                print(f"Initializing guild '{guild.name}'")
+        # Reports what blocks the event loop (which makes the gateway disconnect and `on_ready` run again)
+        watchdog.start()
+        watchdog.label_task("start up")
 
-                # Create category and manage channel
-                await create_bot_category(guild)
-                channel = await create_channel(
-                    guild=guild, channel_name="Manage", allow_user_messages=True
-                )
+        # Loads the backup and creates the channels missing (if there isn't a backup, every guild starts from scratch)
+        # (for example in a power cut, the bot shouldn't recreate everything, just resume activity from the previous state)
+        await start_up(started_at=STARTED_AT)
 
-                # Display hello message and commands
-                ctx = await bot.get_context(
-                    await channel.send("Hello! Ready to track the announcements...")
-                )
-                await bot.get_command("help").invoke(ctx)
+        # Resume the updates where they were, so they stay spread over time
+        scheduler.try_load_backup()
 
         # Start the update announcements task
         if not update_announcements.is_running():
             update_announcements.start()
 
+        # Only set once everything worked, so a failed start up is tried again on the next `on_ready`
         already_started_up = True
 
 
+@bot.before_invoke
+async def label_command(ctx):
+    """Registers the command being run, in case it blocks the event loop (see `LoopWatchdog`)"""
+
+    watchdog.label_task(f"command '{ctx.message.content}' in '{ctx.guild.name}'")
+
+
 @bot.event
 async def on_command_error(ctx, error):
     """Displays help message when there is an error"""
@@ -58,3 +68,27 @@ async def on_command_error(ctx, error):
     else:
         ctx = await bot.get_context(await ctx.send("Oops! Something wasn't right..."))
         await bot.get_command("help").invoke(ctx)
+
+
+# The channel index (see `get_channel_index`) is built again after any change to the channels of a guild
+
+
+@bot.event
+async def on_guild_channel_create(channel: GuildChannel):
+    """Keeps the channel index up to date when a channel is created"""
+
+    forget_channel_index(channel.guild)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: GuildChannel):
+    """Keeps the channel index up to date when a channel is deleted"""
+
+    forget_channel_index(channel.guild)
+
+
+@bot.event
+async def on_guild_channel_update(before: GuildChannel, after: GuildChannel):
+    """Keeps the channel index up to date when a channel is renamed or moved"""
+
+    forget_channel_index(after.guild)
@@ -0,0 +1,168 @@
+""" Contains the update pipeline: each feed is fetched once and the changes are delivered to every guild tracking it """
+
+import asyncio
+import time
+from collections import defaultdict
+
+from constants import RETRY_BASE_DELAY
+from models.announcement import Announcement, AnnouncementActions
+from models.course import Course
+from models.metrics import metrics
+from utils import get_channel, render_alert_messages
+
+from .bot import bot, db, fetcher, outbox, parser, watchdog
+
+# The retries of the feeds that failed (indexed by the feed link)
+scheduled_retries: dict[str, asyncio.TimerHandle] = {}
+
+# Keeps a reference to the retries running, otherwise they could be garbage collected
+running_retries: set[asyncio.Task] = set()
+
+# The number of changes since the last report (indexed by the guild ID), reported by `update_announcements`
+pending_changes: dict[int, int] = defaultdict(int)
+
+metrics.set_callback("scheduled_retries", lambda: len(scheduled_retries))
+
+
+async def refresh_course(
+    course: Course, incremental: bool = False
+) -> list[dict[str, Announcement | AnnouncementActions]]:
+    """Fetches the feed of the course and saves the changes"""
+
+    changes = await course.async_update_announcements(
+        fetcher, incremental=incremental, parser=parser
+    )
+
+    db.save_course(course=course, changes=changes)
+    schedule_retry(course)
+
+    return changes
+
+
+async def deliver_changes(
+    course: Course,
+    changes: list[dict[str, Announcement | AnnouncementActions]],
+    exclude_guild_ids: set[int] = frozenset(),
+) -> set[int]:
+    """Queues the changes of the course to be sent to every guild tracking it (see `DeliveryQueue`), returning the IDs of the guilds notified"""
+
+    notified = set()
+
+    # Rendered only once (and only if there is a guild to send them to), every channel gets the same messages
+    messages = None
+
+    for guild_id in db.get_subscribers(course) - exclude_guild_ids:
+        guild = bot.get_guild(guild_id)
+
+        # The bot was removed from the guild
+        if guild is None:
+            continue
+
+        channel_id = db.get_channel_id(guild=guild, course=course)
+
+        try:
+            channel = await get_channel(
+                guild=guild, channel_name=course.name, channel_id=channel_id
+            )
+        except ValueError as e:
+            # A guild with a missing channel doesn't stop the others
+            print(
+                f"Failed to deliver the changes of {course.name} to {guild.name}: {e!r}"
+            )
+            continue
+
+        # Courses from older backups (or whose channel was created again) are found by name, so the ID is stored
+        if channel.id != channel_id:
+            db.set_channel_id(guild=guild, course=course, channel_id=channel.id)
+
+        if messages is None:
+            with metrics.measure("update_stage_seconds", stage="render"):
+                messages = await render_alert_messages(changes)
+
+        outbox.enqueue(channel=channel, messages=messages)
+        notified.add(guild_id)
+
+    return notified
+
+
+async def update_courses(
+    courses: list[Course], incremental: bool = False
+) -> dict[int, int]:
+    """Updates the courses and delivers the changes, returning the number of changes sent to each guild (indexed by the guild ID)"""
+
+    n_changes = defaultdict(int)
+
+    if len(courses) == 0:
+        return n_changes
+
+    # Each course is delivered as soon as it is fetched, without waiting for the slower feeds
+    async def update(course: Course):
+        # Each course runs in its own task (see `asyncio.gather`), so the step is only registered in it
+        try:
+            with watchdog.step(f"updating '{course.name}'"):
+                await update_course(course)
+        except Exception as e:
+            # A course that fails in an unexpected way doesn't stop the others (nor the automatic updates)
+            print(f"Failed to update {course.name}: {e!r}")
+            metrics.inc("update_errors_total")
+
+    async def update_course(course: Course):
+        changes = await refresh_course(course, incremental=incremental)
+
+        if len(changes) == 0:
+            return
+
+        for change in changes:
+            metrics.inc(
+                "announcement_changes_total", action=change["action"].name.lower()
+            )
+
+        for guild_id in await deliver_changes(course=course, changes=changes):
+            n_changes[guild_id] += len(changes)
+
+    await asyncio.gather(*[update(course) for course in courses])
+
+    return n_changes
+
+
+def add_pending_changes(n_changes: dict[int, int]):
+    """Adds the number of changes sent to each guild (see `update_courses`) to the next report"""
+
+    for guild_id, n in n_changes.items():
+        pending_changes[guild_id] += n
+
+
+def schedule_retry(course: Course):
+    """Schedules the course to be updated again if it failed (when its circuit breaker allows it)"""
+
+    breaker = fetcher.get_breaker(course.feed_url)
+
+    if breaker.failures == 0 or course.feed_url in scheduled_retries:
+        return
+
+    # The feed may have been skipped because its server is failing, so it also waits for the server breaker
+    # (and never less than the shortest retry delay, otherwise a skipped feed would be retried right away, over and over)
+    retry_at = max(breaker.retry_at, fetcher.get_host_breaker(course.feed_url).retry_at)
+    delay = max(RETRY_BASE_DELAY / 2, retry_at - time.monotonic())
+
+    loop = asyncio.get_running_loop()
+
+    def start_retry():
+        task = loop.create_task(retry_course(course))
+        running_retries.add(task)
+        task.add_done_callback(running_retries.discard)
+
+    scheduled_retries[course.feed_url] = loop.call_later(delay, start_retry)
+
+
+async def retry_course(course: Course):
+    """Updates a course that failed before, delivering the changes to every guild tracking it"""
+
+    del scheduled_retries[course.feed_url]
+
+    # The course may have been removed in the meantime
+    if len(db.get_subscribers(course)) > 0:
+        add_pending_changes(await update_courses([course]))
+
+        with watchdog.step("saving the backup"):
+            db.save_backup()
@@ -1,44 +1,93 @@
 """ Contains the bot scheduled tasks """
 
+import asyncio
 import time
 from datetime import datetime
 
-from constants import MANAGE_CHANNEL, UPDATE_INTERVAL
+from constants import (
+    FULL_SCAN_EVERY,
+    MANAGE_CHANNEL,
+    REPORT_QUIET_HOURS,
+    UPDATE_INTERVAL,
+)
+from discord import Guild
 from discord.ext import tasks
-from utils import get_channel
+from models.fetcher import poll_stats
+from models.metrics import metrics
+from utils import get_channel, get_update_message
 
-from .bot import bot, db
+from .bot import bot, db, outbox, scheduler, watchdog
+from .pipeline import add_pending_changes, pending_changes, update_courses
 
-LAST_UPDATE = None
+LAST_REPORT = time.time()
 
 
-@tasks.loop(minutes=UPDATE_INTERVAL)
+@tasks.loop(seconds=30)
 async def update_announcements():
-    """Updates the announcements on every guild"""
+    """Updates the announcements of the courses that are due (each course has its own interval, see `PollScheduler`)"""
 
-    global LAST_UPDATE
+    global LAST_REPORT
 
-    current_hour = datetime.now().hour
+    watchdog.label_task("automatic update")
 
-    # Skip update during the night
-    if 1 < current_hour < 9:
-        return
+    courses = scheduler.get_due_courses(db.get_all_courses())
 
-    current_time = time.time()
+    if len(courses) > 0:
+        cycle_start = time.perf_counter()
+        changes_before = metrics.get_total("announcement_changes_total")
 
-    if LAST_UPDATE is not None and current_time - LAST_UPDATE < 60:  # s
-        # Since this bot is running as a service, when it is shutdown during the night it will try to "make up"
-        # for the missed checks after restarting, so if "too close" to the last check time just return
-        return
+        # Every `FULL_SCAN_EVERY` updates of a course also detect the updated and deleted announcements
+        full_scan, incremental = [], []
+        for course in courses:
+            if scheduler.get_polls(course) % FULL_SCAN_EVERY == 0:
+                full_scan.append(course)
+            else:
+                incremental.append(course)
 
-    LAST_UPDATE = current_time
+        for course in courses:
+            scheduler.record_poll(course)
 
-    for guild in bot.guilds:
-        if len(db.get_courses_list(guild)) > 0:  # Skip if no courses are being tracked
-            channel = await get_channel(guild=guild, channel_name=MANAGE_CHANNEL)
-            ctx = await bot.get_context(
-                await channel.send("Triggering automatic update...")
+        # Each course is fetched only once, even if it is tracked by multiple guilds
+        for n_changes in await asyncio.gather(
+            update_courses(full_scan, incremental=False),
+            update_courses(incremental, incremental=True),
+        ):
+            add_pending_changes(n_changes)
+
+        with watchdog.step("saving the backup"):
+            db.save_backup()
+
+        metrics.observe("update_cycle_seconds", time.perf_counter() - cycle_start)
+        metrics.observe("update_cycle_courses", len(courses))
+        metrics.observe(
+            "update_cycle_changes",
+            metrics.get_total("announcement_changes_total") - changes_before,
+        )
+
+    # The courses are updated at different times, so the changes are reported together every `UPDATE_INTERVAL` minutes
+    if time.time() - LAST_REPORT >= UPDATE_INTERVAL * 60:
+        LAST_REPORT = time.time()
+
+        # The courses are still updated during the night, but their changes are only reported in the morning
+        if datetime.now().hour not in REPORT_QUIET_HOURS:
+
+            async def report(guild: Guild):
+                channel = await get_channel(guild=guild, channel_name=MANAGE_CHANNEL)
+                await channel.send(get_update_message(pending_changes[guild.id]))
+
+            # Skip the guilds where no courses are being tracked
+            await asyncio.gather(
+                *[
+                    report(guild)
+                    for guild in bot.guilds
+                    if len(db.get_courses_list(guild)) > 0
+                ],
+                return_exceptions=True,
             )
-            await bot.get_command("update").invoke(ctx)
 
-    db.save_backup()
+            pending_changes.clear()
+
+        print(f"Delivery queue: {outbox.get_status()}")
+        print(
+            f"{poll_stats.short_circuited} of {poll_stats.polls} polls were skipped as the feed didn't change"
+        )
@@ -1,9 +1,52 @@
+import hashlib
 import html
+import sys
+import threading
+import zlib
+from collections import OrderedDict
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum, auto
 
 from bs4 import BeautifulSoup
+from constants import TEXT_CACHE_SIZE
+
+# The text of the most recently rendered descriptions (indexed by the hash of the HTML)
+_text_cache: OrderedDict[bytes, str] = OrderedDict()
+
+# The alerts are rendered in worker threads (see `render_alert_messages`), so the cache is only used holding this lock
+_text_cache_lock = threading.Lock()
+
+# Most announcements share a few time zones (indexed by the offset in minutes)
+_time_zones: dict[int, timezone] = {}
+
+
+def hash_description(description: str) -> bytes:
+    """Returns the hash identifying the content of a description"""
+
+    return hashlib.blake2b(description.encode(), digest_size=16).digest()
+
+
+def html_to_text(description: str, description_hash: bytes = None) -> str:
+    """Returns the text of a HTML description, reusing the ones already converted"""
+
+    if description_hash is None:
+        description_hash = hash_description(description)
+
+    with _text_cache_lock:
+        if description_hash in _text_cache:
+            _text_cache.move_to_end(description_hash)
+            return _text_cache[description_hash]
+
+    # Remove the HTML tags from the description (unescaping first as the initial contains encoded HTML tags)
+    text = BeautifulSoup(html.unescape(description), "lxml").get_text(separator="\n")
+
+    with _text_cache_lock:
+        _text_cache[description_hash] = text
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+
+    return text
 
 
 class AnnouncementActions(Enum):
@@ -14,43 +57,180 @@ class AnnouncementActions(Enum):
     UPDATED = auto()
 
 
-@dataclass
+@dataclass(slots=True, init=False)
 class Announcement:
-    """Contains the announcement information"""
+    """
+    Contains the announcement information
+
+    Every course keeps all of its announcements, so they are stored in a compact way
+    (see the properties for the fields as they were received)
+    """
+
+    id: str
+    """ The ID of the announcement """
 
     title: str
     """ The title of the announcement """
 
-    description: str
-    """ The announcement itself """
+    compressed_description: bytes | str
+    """ The announcement itself (as received, in HTML, compressed if that makes it smaller, see `description` and `text`) """
 
-    link: str
-    """ The link to see the announcement """
+    description_hash: bytes | None
+    """ The hash of the description (announcements from older backups don't have it as their description is already text) """
+
+    link_prefix: str
+    """ The start of the link to see the announcement (shared by the announcements of the course, see `link`) """
+
+    link_suffix: str
+    """ The rest of the link to see the announcement """
 
     author: str
     """ The author of the announcement """
 
-    pub_date: str | datetime  # A str is received and then converted to datetime
-    """ The publication date """
+    pub_date: int
+    """ The publication date (as a UNIX timestamp, see `published_at`) """
 
-    id: str = None
-    """ The ID of the announcement """
+    utc_offset: int
+    """ The time zone of the publication date (minutes from UTC) """
 
-    def __post_init__(self):
+    def __init__(
+        self, title: str, description: str, link: str, author: str, pub_date: str
+    ):
 
         # In Fenix the description and title can be updated but the publication date remains the same so
         # use the publication date as the ID for now.
         # Precision goes to the second so that should be enough to uniquely identify an announcement inside a course.
         # (An uuid isn't used because then it wouldn't be possible to use the ID to compare with the new announcements fetched)
-        self.id = self.pub_date
+        self.id = pub_date
+        self.title = title
 
-        # Convert to a datetime object. Received date example: Tue, 22 Jul 2014 20:32:41 +0100
-        self.pub_date = datetime.strptime(self.pub_date, "%a, %d %b %Y %H:%M:%S %z")
+        # Convert to a timestamp. Received date example: Tue, 22 Jul 2014 20:32:41 +0100
+        date = datetime.strptime(pub_date, "%a, %d %b %Y %H:%M:%S %z")
+        self.pub_date = int(date.timestamp())
+        self.utc_offset = int(date.utcoffset().total_seconds()) // 60
 
         # Remove the email, keeping only the author name. Received author example: XYZ@email.pt (XYZ)
-        self.author = self.author[self.author.find("(") + 1 : self.author.rfind(")")]
+        # There are only a few authors, so the same string is shared by all of their announcements
+        if "@" in author:
+            author = author[author.find("(") + 1 : author.rfind(")")]
+        self.author = sys.intern(author)
+
+        self.link = link
+        self.description = description
+
+        # Most announcements don't change between updates, so the description is only converted to text when displayed
+        self.description_hash = hash_description(description)
+
+    @classmethod
+    def from_backup(
+        cls,
+        id: str,
+        title: str,
+        description: str | bytes,
+        description_hash: bytes | None,
+        link: str,
+        author: str,
+        pub_date: int,
+        utc_offset: int,
+    ) -> "Announcement":
+        """Recreates an announcement saved in a backup (without converting the fields again, `description` can already be compressed)"""
+
+        announcement = cls.__new__(cls)
+
+        announcement.id = id
+        announcement.title = title
+        if isinstance(description, bytes):
+            announcement.compressed_description = description
+        else:
+            announcement.description = description
+        announcement.description_hash = description_hash
+        announcement.link = link
+        announcement.author = sys.intern(author)
+        announcement.pub_date = pub_date
+        announcement.utc_offset = utc_offset
+
+        return announcement
+
+    def __setstate__(self, state):
+        """Restores a pickled announcement (also supports the ones pickled before the announcements were compact)"""
+
+        dict_state, slots_state = state if isinstance(state, tuple) else (state, None)
+
+        if slots_state is not None:
+            for name, value in slots_state.items():
+                setattr(self, name, value)
+
+        if dict_state:
+            date: datetime = dict_state["pub_date"]
+
+            self.id = dict_state["id"]
+            self.title = dict_state["title"]
+            self.description = dict_state["description"]
+            self.description_hash = dict_state.get("description_hash")
+            self.link = dict_state["link"]
+            self.author = sys.intern(dict_state["author"])
+            self.pub_date = int(date.timestamp())
+            self.utc_offset = int(date.utcoffset().total_seconds()) // 60
+
+    @property
+    def description(self) -> str:
+        """The announcement itself (as received, in HTML, see `text`)"""
+
+        if isinstance(self.compressed_description, bytes):
+            return zlib.decompress(self.compressed_description).decode()
+
+        return self.compressed_description
+
+    @description.setter
+    def description(self, description: str):
+
+        compressed = zlib.compress(description.encode())
+
+        # Short descriptions get bigger when compressed
+        if len(compressed) < len(description):
+            self.compressed_description = compressed
+        else:
+            self.compressed_description = description
+
+    @property
+    def link(self) -> str:
+        """The link to see the announcement"""
+
+        return self.link_prefix + self.link_suffix
+
+    @link.setter
+    def link(self, link: str):
+
+        split_idx = link.rfind("/") + 1
+
+        self.link_prefix = sys.intern(link[:split_idx])
+        self.link_suffix = link[split_idx:]
+
+    @property
+    def published_at(self) -> datetime:
+        """The publication date (in the time zone it was published)"""
+
+        if self.utc_offset not in _time_zones:
+            _time_zones[self.utc_offset] = timezone(timedelta(minutes=self.utc_offset))
+
+        return datetime.fromtimestamp(self.pub_date, _time_zones[self.utc_offset])
+
+    @property
+    def text(self) -> str:
+        """The description without the HTML tags"""
+
+        if self.description_hash is None:
+            return self.description
+
+        return html_to_text(self.description, self.description_hash)
+
+    def has_same_content(self, other: "Announcement") -> bool:
+        """Checks if the title and description of both announcements are the same"""
+
+        if self.title != other.title:
+            return False
+
+        if self.description_hash is None or other.description_hash is None:
+            return self.text == other.text
 
-        # Remove the HTML tags from the description (unescaping first as the initial contains encoded HTML tags)
-        self.description = BeautifulSoup(
-            html.unescape(self.description), "lxml"
-        ).get_text(separator="\n")
+        return self.description_hash == other.description_hash
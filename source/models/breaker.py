@@ -0,0 +1,110 @@
+""" Contains the circuit breaker used to stop fetching feeds that keep failing """
+
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum, auto
+
+from constants import RETRY_BASE_DELAY, RETRY_MAX_DELAY
+
+
+class CircuitState(Enum):
+    """The possible states of a circuit breaker"""
+
+    # Working normally
+    CLOSED = auto()
+
+    # Failing, requests are skipped until the retry time
+    OPEN = auto()
+
+    # Retrying, only one request is allowed until its result is known
+    HALF_OPEN = auto()
+
+
+def get_retry_delay(failures: int) -> float:
+    """Returns the time to wait after a number of failures in a row (exponential, with jitter so retries don't happen all at once)"""
+
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (failures - 1))
+
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+@dataclass(slots=True)
+class CircuitBreaker:
+    """Keeps track of the failures of a feed (or server) to know when it should be fetched"""
+
+    name: str
+    """ What this breaker protects (used in the logs) """
+
+    threshold: int
+    """ The number of failures in a row that opens the breaker """
+
+    state: CircuitState = CircuitState.CLOSED
+    """ The current state """
+
+    failures: int = 0
+    """ The number of failures in a row """
+
+    retry_at: float = 0
+    """ When the next retry can be done (see `time.monotonic`) """
+
+    last_error: str = None
+    """ The last error that happened """
+
+    def allow(self) -> bool:
+        """Checks if a request can be done now"""
+
+        if self.state == CircuitState.CLOSED:
+            return True
+
+        now = time.monotonic()
+
+        # Also allows another retry if the result of the previous one never arrived
+        if now < self.retry_at:
+            return False
+
+        if self.state == CircuitState.OPEN:
+            print(f"Retrying '{self.name}' after {self.failures} failures")
+
+        self.state = CircuitState.HALF_OPEN
+        self.retry_at = now + RETRY_BASE_DELAY
+
+        return True
+
+    def record_success(self):
+        """Registers a successful request, closing the breaker"""
+
+        if self.state != CircuitState.CLOSED:
+            print(f"'{self.name}' is working again after {self.failures} failures")
+
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.last_error = None
+
+    def record_failure(self, error: Exception):
+        """Registers a failed request, opening the breaker if needed (returns the time to wait before retrying)"""
+
+        self.failures += 1
+        self.last_error = str(error).splitlines()[0] if str(error) else repr(error)
+
+        delay = get_retry_delay(self.failures)
+        self.retry_at = time.monotonic() + delay
+
+        if self.state == CircuitState.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != CircuitState.OPEN:
+                print(
+                    f"'{self.name}' failed {self.failures} times in a row, skipping it for {delay:.0f} seconds ({self.last_error})"
+                )
+            self.state = CircuitState.OPEN
+
+        return delay
+
+    def get_status(self) -> str:
+        """Returns a short description of the state (to be displayed to the user)"""
+
+        if self.state == CircuitState.CLOSED and self.failures == 0:
+            return "working"
+
+        retry_in = max(0, self.retry_at - time.monotonic())
+
+        return f"{self.state.name.lower().replace('_', '-')}, {self.failures} failures, retrying in {retry_in / 60:.0f} min ({self.last_error})"
@@ -1,14 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import MISSING, dataclass, fields
 from datetime import datetime
-from time import sleep
 
 import requests
-import xmltodict
+from constants import FETCH_TIMEOUT
 
 from .announcement import Announcement, AnnouncementActions
-
-
-@dataclass
+from .diff import diff_fingerprints
+from .fetcher import (
+    CircuitOpenError,
+    FeedFetcher,
+    FeedResponse,
+    FeedValidators,
+    check_feed_response,
+)
+from .metrics import metrics
+from .parse_pool import FeedParser, ParsedItem, parse_feed
+
+
+@dataclass(slots=True)
 class Course:
     """Defines a course"""
 
@@ -27,6 +36,15 @@ class Course:
     announcements: list[Announcement] = None
     """ The list of announcements """
 
+    validators: FeedValidators = None
+    """ The validators of the last feed processed (to skip the feed if it didn't change) """
+
+    full_scan_pending: bool = False
+    """ Whether a feed was only read incrementally since the last full scan """
+
+    fingerprints: dict[str, bytes] = None
+    """ The fingerprint of each announcement (indexed by the announcement ID, see `get_fingerprint`) """
+
     def __post_init__(self):
 
         if not self.__is_link_valid(self.link):
@@ -34,6 +52,47 @@ class Course:
                 "Invalid Fenix course link, please check that this course is from the current school year and that it follows the required format: https://fenix.tecnico.ulisboa.pt/disciplinas/XXXX/XXXX-XXXX/X-semestre"
             )
 
+        self.__set_link_parts()
+        self.announcements = []
+        self.fingerprints = {}
+
+    @classmethod
+    def from_backup(
+        cls,
+        link: str,
+        announcements: list[Announcement],
+        fingerprints: dict[str, bytes] | None,
+        validators: FeedValidators | None,
+        full_scan_pending: bool,
+    ) -> "Course":
+        """Recreates a course saved in a backup (the link isn't validated again, as it can be from a previous school year)"""
+
+        course = cls.__new__(cls)
+
+        course.link = link
+        course.__set_link_parts()
+        course.announcements = announcements
+        course.fingerprints = fingerprints
+        course.validators = validators
+        course.full_scan_pending = full_scan_pending
+
+        return course
+
+    def __setstate__(self, state):
+        """Restores a pickled course (the ones pickled by older versions don't have some of the fields)"""
+
+        dict_state, slots_state = state if isinstance(state, tuple) else (state, None)
+        state = {**(dict_state or {}), **(slots_state or {})}
+
+        for field in fields(self):
+            if field.name in state:
+                setattr(self, field.name, state[field.name])
+            elif field.default is not MISSING:
+                setattr(self, field.name, field.default)
+
+    def __set_link_parts(self):
+        """Sets the name, years and semester using the link"""
+
         # Link example:
         # https://fenix.tecnico.ulisboa.pt/disciplinas/XXXX/XXXX-XXXX/X-semestre
 
@@ -42,7 +101,6 @@ class Course:
         self.name = parts[4]
         self.years = parts[5]
         self.semester = parts[6]
-        self.announcements = []
 
     def __is_link_valid(self, link: str) -> bool:
         """Checks if a link is valid"""
@@ -107,58 +165,58 @@ class Course:
 
         return sorted(announcements, key=lambda announcement: announcement.pub_date)
 
-    def __fetch_announcements_list(self) -> list[Announcement]:
-        """Retrieves the announcements XML of a course and returns the list of announcements"""
+    @property
+    def feed_url(self) -> str:
+        """The link of the course announcements feed"""
 
         # Using Fenix API, see the example in https://fenixedu.org/dev/api/#get-coursesid
-        url = f"https://fenix.tecnico.ulisboa.pt/disciplinas/{self.name}/{self.years}/{self.semester}/rss/announcement"
-        sleep_time = 60 * 5
-
-        while True:
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                xml_data = response.text  # XML
-
-                # Convert to dict and remove unnecessary info present in the original XML
-                try:
-                    dict_data = xmltodict.parse(xml_data)
-                except Exception as e:
-                    # Sometimes the IST server is in maintenance, causing an error here
-                    print("The following XML resulted in: ", str(e))
-                    print(xml_data)
-                    raise ValueError
-
-                dict_data = dict_data["rss"]["channel"]
-                if "item" in dict_data:
-                    announcements_list = dict_data["item"]
-                else:
-                    # If item isn't on the dict, then it is because there aren't any announcements on the course
-                    announcements_list = []
-
-                # When there is only 1 announcement, the API returns just the announcement, instead of a list with just 1 element
-                if isinstance(announcements_list, dict):
-                    announcements_list = [announcements_list]
-
-                announcements = [
-                    Announcement(
-                        title=announcement["title"],
-                        description=announcement["description"],
-                        link=announcement["link"],
-                        author=announcement["author"],
-                        pub_date=announcement["pubDate"],
-                    )
-                    for announcement in announcements_list
-                ]
-
-                return announcements
+        return f"https://fenix.tecnico.ulisboa.pt/disciplinas/{self.name}/{self.years}/{self.semester}/rss/announcement"
 
-            else:
+    def __print_invalid_feed(self, xml_data: bytes, error: ValueError):
+        """Logs a feed that couldn't be parsed"""
 
-                print(
-                    f"Failed to retrieve XML using: {url}\nStatus code: {response.status_code}\nTrying again in {sleep_time} seconds."
-                )
-                sleep(sleep_time)
+        # Sometimes the IST server is in maintenance, causing an error here
+        print("The following XML resulted in: ", str(error))
+        print(xml_data)
+
+    def __build_announcement(self, record: ParsedItem) -> Announcement:
+        """Returns the announcement of a feed item (built by the parser, unless the course changed while it was parsed)"""
+
+        if record.announcement is not None:
+            return record.announcement
+
+        item = record.item
+
+        return Announcement(
+            title=item.title,
+            description=item.description,
+            link=item.link,
+            author=item.author,
+            pub_date=item.pub_date,
+        )
+
+    def __fetch_feed(self) -> FeedResponse | None:
+        """Retrieves the announcements XML of a course (returns `None` if it didn't change since the last update)"""
+
+        validators = self.__get_validators(incremental=False)
+        headers = validators.as_headers() if validators is not None else {}
+
+        try:
+            response = requests.get(
+                self.feed_url, headers=headers, timeout=FETCH_TIMEOUT
+            )
+        except requests.RequestException as e:
+            raise ValueError(
+                f"Failed to retrieve XML using: {self.feed_url}\nError: {e!r}"
+            ) from e
+
+        return check_feed_response(
+            url=self.feed_url,
+            status=response.status_code,
+            headers=response.headers,
+            body=response.content,
+            validators=validators,
+        )
 
     def update_announcements(
         self,
@@ -166,17 +224,263 @@ class Course:
         """Fetches the latest announcements list and returns a dict with the changes to be used by the bot (each "change" contains the announcement and the action type)"""
 
         try:
-            new_announcements = {
-                announcement.id: announcement
-                for announcement in self.__sort_announcements_by_date(
-                    self.__fetch_announcements_list()
-                )
-            }
+            return self.process_feed(self.__fetch_feed())
         except ValueError:
             # Sometimes the IST server is in maintenance, so if that's the case
             # consider that there are no new modifications (it will recover whenever the server is back up online)
             return []
 
+    async def async_update_announcements(
+        self,
+        fetcher: FeedFetcher,
+        incremental: bool = False,
+        parser: FeedParser = None,
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """
+        Same as `update_announcements` but fetches the feed using `fetcher` (and parses it using `parser`, if given),
+        without blocking the event loop
+
+        In `incremental` mode, only the announcements newer than the ones already known are read, which is
+        faster but only detects added announcements (a changed feed without new announcements is read entirely,
+        so the updated and deleted ones are found by the next update at the latest)
+        """
+
+        try:
+            feed = await fetcher.fetch(
+                self.feed_url, self.__get_validators(incremental=incremental)
+            )
+
+            if parser is None:
+                changes = self.process_feed(feed, incremental=incremental)
+            else:
+                changes = await self.async_process_feed(
+                    feed, parser, incremental=incremental
+                )
+        except CircuitOpenError:
+            # Keeps failing, it will be retried later
+            return []
+        except ValueError as e:
+            # Same as in `update_announcements`, the server is probably in maintenance so just wait for the next update
+            delay = fetcher.record_failure(self.feed_url, e)
+            print(f"{e}\nTrying again in {delay:.0f} seconds.")
+            return []
+
+        fetcher.record_success(self.feed_url)
+
+        return changes
+
+    def __get_validators(self, incremental: bool) -> FeedValidators | None:
+        """Returns the validators to use when fetching the feed"""
+
+        # An incremental read may have missed updated or deleted announcements of a feed that
+        # is now considered seen, so the full scan after it has to process the feed again
+        if not incremental and self.full_scan_pending:
+            return None
+
+        return self.validators
+
+    def process_feed(
+        self, feed: FeedResponse | None, incremental: bool = False
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """Parses and applies the feed, returning the changes (nothing is done if the feed didn't change)"""
+
+        if feed is None:
+            return []
+
+        newer_than = self.__get_newer_than(incremental)
+
+        try:
+            with metrics.measure("update_stage_seconds", stage="parse"):
+                records = parse_feed(
+                    feed.body, newer_than=newer_than, known=self.__get_known()
+                )
+
+                if self.__needs_full_read(records, newer_than):
+                    newer_than = None
+                    records = parse_feed(feed.body, known=self.__get_known())
+        except ValueError as e:
+            self.__print_invalid_feed(feed.body, e)
+            raise
+
+        with metrics.measure("update_stage_seconds", stage="diff"):
+            return self.__apply_feed(feed, records, incremental=newer_than is not None)
+
+    async def async_process_feed(
+        self, feed: FeedResponse | None, parser: FeedParser, incremental: bool = False
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """Same as `process_feed` but the feed is parsed by one of the workers of `parser`"""
+
+        if feed is None:
+            return []
+
+        newer_than = self.__get_newer_than(incremental)
+
+        try:
+            # Includes the time waiting for a free worker
+            with metrics.measure("update_stage_seconds", stage="parse"):
+                records = await parser.parse(
+                    feed.body, newer_than=newer_than, known=self.__get_known()
+                )
+
+                if self.__needs_full_read(records, newer_than):
+                    newer_than = None
+                    records = await parser.parse(feed.body, known=self.__get_known())
+        except ValueError as e:
+            self.__print_invalid_feed(feed.body, e)
+            raise
+
+        with metrics.measure("update_stage_seconds", stage="diff"):
+            return self.__apply_feed(feed, records, incremental=newer_than is not None)
+
+    def __get_newer_than(self, incremental: bool) -> int | None:
+        """Returns the publication date after which the feed is read (`None` reads the whole feed)"""
+
+        if incremental and len(self.announcements) > 0:
+            # The announcements are sorted, so the last one is the newest
+            return self.announcements[-1].pub_date
+
+        return None
+
+    def __get_known(self) -> dict[str, bytes]:
+        """Returns the fingerprints of the announcements known, so the parser also builds the ones that changed"""
+
+        # Courses from older backups don't have fingerprints yet, so every announcement is built
+        return self.fingerprints if self.fingerprints is not None else {}
+
+    def __needs_full_read(
+        self, records: list[ParsedItem], newer_than: int | None
+    ) -> bool:
+        """Checks if an incremental read has to be done again reading the whole feed"""
+
+        # The feed changed but has no new announcements, so some were updated or deleted
+        return newer_than is not None and len(records) == 0
+
+    def __apply_feed(
+        self, feed: FeedResponse, records: list[ParsedItem], incremental: bool
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """Applies the parsed feed, returning the changes"""
+
+        if incremental:
+            changes = self.__add_items(records)
+            self.full_scan_pending = True
+
+            # The same feed may also have updated or deleted announcements, so the validators aren't stored
+            # and the next update (finding no new announcements in it) reads the whole feed
+            return changes
+
+        changes = self.__apply_items(records)
+        self.full_scan_pending = False
+
+        # Only stored after the feed is processed, so a feed that failed to parse is tried again
+        self.validators = feed.validators
+
+        return changes
+
+    def __add_items(
+        self, records: list[ParsedItem]
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """Adds the (new) feed items to the current announcements and returns the changes"""
+
+        # The course may have been updated while the feed was being parsed, so the items already added are skipped
+        known_ids = (
+            self.fingerprints.keys()
+            if self.fingerprints is not None
+            else {announcement.id for announcement in self.announcements}
+        )
+        records = [
+            record for record in records if record.item.pub_date not in known_ids
+        ]
+
+        added = self.__sort_announcements_by_date(
+            [self.__build_announcement(record) for record in records]
+        )
+
+        if self.fingerprints is not None:
+            for record in records:
+                self.fingerprints[record.item.pub_date] = record.fingerprint
+
+        self.announcements = self.__sort_announcements_by_date(
+            self.announcements + added
+        )
+
+        return [
+            {"announcement": announcement, "action": AnnouncementActions.ADDED}
+            for announcement in added
+        ]
+
+    def __apply_items(
+        self, records: list[ParsedItem]
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """Replaces the current announcements with the feed items and returns the changes between both"""
+
+        # The publication date is used as the ID (see `Announcement`)
+        new_fingerprints = {
+            record.item.pub_date: record.fingerprint for record in records
+        }
+
+        # Courses from older backups don't have fingerprints yet, so they are compared using the announcements
+        if self.fingerprints is None:
+            changes = self.__apply_announcements(
+                [self.__build_announcement(record) for record in records]
+            )
+            self.fingerprints = new_fingerprints
+            return changes
+
+        added, updated, deleted = diff_fingerprints(
+            old=self.fingerprints, new=new_fingerprints
+        )
+        self.fingerprints = new_fingerprints
+
+        if not (added or updated or deleted):
+            return []
+
+        # Only the announcements that changed are created
+        changed_announcements = {
+            record.item.pub_date: self.__build_announcement(record)
+            for record in records
+            if record.item.pub_date in added or record.item.pub_date in updated
+        }
+
+        changes = [
+            {
+                "announcement": announcement,
+                "action": (
+                    AnnouncementActions.ADDED
+                    if id in added
+                    else AnnouncementActions.UPDATED
+                ),
+            }
+            for id, announcement in changed_announcements.items()
+        ]
+        changes.sort(key=lambda change: change["announcement"].pub_date)
+
+        changes += [
+            {"announcement": announcement, "action": AnnouncementActions.DELETED}
+            for announcement in self.announcements
+            if announcement.id in deleted
+        ]
+
+        self.announcements = self.__sort_announcements_by_date(
+            [
+                announcement
+                for announcement in self.announcements
+                if announcement.id not in deleted and announcement.id not in updated
+            ]
+            + list(changed_announcements.values())
+        )
+
+        return changes
+
+    def __apply_announcements(
+        self, announcements: list[Announcement]
+    ) -> list[dict[str, Announcement | AnnouncementActions]]:
+        """Replaces the current announcements with `announcements` and returns the changes between both"""
+
+        new_announcements = {
+            announcement.id: announcement
+            for announcement in self.__sort_announcements_by_date(announcements)
+        }
+
         old_announcements = {
             announcement.id: announcement for announcement in self.announcements
         }
@@ -191,11 +495,7 @@ class Course:
         # Search for added and updated announcements
         for id, announcement in new_announcements.items():
             if id in old_announcements:
-                if (
-                    old_announcements[id].title != new_announcements[id].title
-                    or old_announcements[id].description
-                    != new_announcements[id].description
-                ):
+                if not old_announcements[id].has_same_content(announcement):
                     # The id is the same, but the title or description changed, so the announcement was updated
                     changed.append(get_dict(announcement, AnnouncementActions.UPDATED))
                 else:
@@ -1,9 +1,19 @@
 import os
 import pickle
 
+from constants import SEARCH_RESULTS
 from discord import Guild
 
+from .announcement import Announcement, AnnouncementActions
 from .course import Course
+from .registry import FeedRegistry
+from .search import SearchHit, SearchIndex
+from .snapshot import (
+    SnapshotManager,
+    capture_snapshot,
+    decode_snapshot,
+    encode_snapshot,
+)
 
 
 class Database:
@@ -12,7 +22,8 @@ class Database:
     and acts as an interface in case it is upgraded to an actual database in the future
     """
 
-    __BACKUP_FILE = "db.pkl"
+    __BACKUP_FILE = "db.snapshot"
+    __LEGACY_BACKUP_FILE = "db.pkl"
 
     def __init__(self) -> None:
 
@@ -20,18 +31,32 @@ class Database:
         # (The dict is indexed using the guild ID)
         self.__data: dict[int, list[Course]] = dict()
 
+        # The same course object is shared by every guild tracking it
+        self.__registry = FeedRegistry()
+
+        # The announcements of every course, to search them (not saved, it is built again from the backup)
+        self.__search = SearchIndex()
+
+        self.__snapshots = SnapshotManager(
+            path=self.__BACKUP_FILE,
+            capture=lambda: capture_snapshot(self.__data, self.__registry),
+            encode=encode_snapshot,
+        )
+
     def add_course(self, guild: Guild, course_link: str) -> Course:
         """Adds a course to a guild"""
 
         if guild.id not in self.__data:
             self.__data[guild.id] = []
 
+        course = Course(link=course_link)
+
         # Check if this course already exists
-        for course in self.__data[guild.id]:
-            if course.link == course_link:
+        for existing_course in self.__data[guild.id]:
+            if FeedRegistry.get_key(existing_course) == FeedRegistry.get_key(course):
                 raise ValueError("This course is already being tracked.")
 
-        course = Course(link=course_link)
+        course = self.__registry.subscribe(guild_id=guild.id, course=course)
         self.__data[guild.id].append(course)
 
         return course
@@ -50,6 +75,13 @@ class Database:
         if len(temp) == len(self.__data[guild.id]):
             raise ValueError("This course doesn't exist.")
         else:
+            for course in self.__data[guild.id]:
+                if course.name == course_name:
+                    self.__registry.unsubscribe(guild_id=guild.id, course=course)
+
+                    if len(self.__registry.get_subscribers(course)) == 0:
+                        self.__search.remove_course(course)
+
             self.__data[guild.id] = temp
 
     def get_courses_list(self, guild: Guild) -> list[Course]:
@@ -57,18 +89,104 @@ class Database:
 
         return self.__data[guild.id] if guild.id in self.__data else []
 
+    def get_all_courses(self) -> list[Course]:
+        """Returns the list of every course being tracked, without repetitions between guilds"""
+
+        return self.__registry.get_courses()
+
+    def get_subscribers(self, course: Course) -> set[int]:
+        """Returns the IDs of the guilds tracking `course`"""
+
+        return self.__registry.get_subscribers(course)
+
+    def get_channel_id(self, guild: Guild, course: Course) -> int | None:
+        """Returns the ID of the channel of `course` in the guild (or `None` if it isn't known, for example in older backups)"""
+
+        return self.__registry.get_channel_id(guild_id=guild.id, course=course)
+
+    def set_channel_id(self, guild: Guild, course: Course, channel_id: int):
+        """Stores the ID of the channel of `course` in the guild, so it is found even if renamed"""
+
+        self.__registry.set_channel_id(
+            guild_id=guild.id, course=course, channel_id=channel_id
+        )
+
+    def save_course(
+        self,
+        course: Course,
+        changes: list[dict[str, Announcement | AnnouncementActions]],
+    ):
+        """Saves the changes of a course after it is updated (only the search index is updated here, as `save_backup` saves everything)"""
+
+        self.__search.apply_changes(course=course, changes=changes)
+
+    def search(
+        self,
+        guild: Guild,
+        query: str,
+        course_name: str = None,
+        limit: int = SEARCH_RESULTS,
+    ) -> list[tuple[Course, SearchHit]]:
+        """Returns the announcements of the courses of the guild (or only of the course with `course_name`) that best match the query, with their course"""
+
+        courses = {
+            FeedRegistry.get_key(course): course
+            for course in self.get_courses_list(guild)
+            if course_name is None or course.name == course_name
+        }
+
+        return [
+            (courses[hit.course_key], hit)
+            for hit in self.__search.search(
+                query=query, course_keys=courses.keys(), limit=limit
+            )
+        ]
+
     def save_backup(self):
-        """Saves a backup of the database in a file"""
+        """Saves a backup of the database in a file (a moment later, in the background, together with the next changes)"""
 
-        with open(self.__BACKUP_FILE, "wb") as backup_file:
-            pickle.dump(self.__data, backup_file)
+        self.__snapshots.mark_dirty()
 
     def try_load_backup(self):
         """Tries to load a backup of the database (returns a boolean representing whether it was successful or not)"""
 
-        if os.path.exists(self.__BACKUP_FILE):
-            with open(self.__BACKUP_FILE, "rb") as backup_file:
-                self.__data = pickle.load(backup_file)
-                return True
+        snapshot = self.__snapshots.read()
+
+        if snapshot is not None:
+            self._restore(*decode_snapshot(snapshot))
+            return True
+        elif os.path.exists(self.__LEGACY_BACKUP_FILE):
+            # Backups from older versions
+            with open(self.__LEGACY_BACKUP_FILE, "rb") as backup_file:
+                self._restore(pickle.load(backup_file))
+            return True
         else:
             return False
+
+    def _restore(
+        self,
+        data: dict[int, list[Course]],
+        channel_ids: dict[tuple[int, str], int] = None,
+    ):
+        """Replaces the data with the one loaded from a backup (the channel IDs are indexed by the guild ID and feed key)"""
+
+        self.__data = data
+        channel_ids = channel_ids or {}
+
+        # Older backups have a different course object per guild, so merge them into the shared ones
+        self.__registry = FeedRegistry()
+        for guild_id, courses in self.__data.items():
+            self.__data[guild_id] = [
+                self.__registry.subscribe(
+                    guild_id=guild_id,
+                    course=course,
+                    channel_id=channel_ids.get(
+                        (guild_id, FeedRegistry.get_key(course))
+                    ),
+                )
+                for course in courses
+            ]
+
+        # Built again (in the thread loading the backup), so searching never goes through the announcements
+        self.__search = SearchIndex()
+        self.__search.index_courses(self.__registry.get_courses())
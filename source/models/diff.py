@@ -0,0 +1,30 @@
+""" Contains the change detection between two versions of a feed """
+
+import hashlib
+
+from .parser import FeedItem
+
+
+def get_fingerprint(item: FeedItem) -> bytes:
+    """Returns a compact hash of the content of the announcement that can be updated (the title and description)"""
+
+    return hashlib.blake2b(
+        item.title.encode() + b"\0" + item.description.encode(), digest_size=8
+    ).digest()
+
+
+def diff_fingerprints(
+    old: dict[str, bytes], new: dict[str, bytes]
+) -> tuple[set[str], set[str], set[str]]:
+    """
+    Compares the fingerprints of two versions of a feed (indexed by the announcement ID)
+    and returns the IDs of the added, updated and deleted announcements
+    """
+
+    added = new.keys() - old.keys()
+    deleted = old.keys() - new.keys()
+
+    # The pairs that only exist in the new version are either added or updated announcements
+    updated = {id for id, _ in new.items() - old.items()} - added
+
+    return added, updated, deleted
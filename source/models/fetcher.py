@@ -0,0 +1,278 @@
+""" Contains the asynchronous fetcher of the Fenix feeds """
+
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import aiohttp
+from constants import (
+    BREAKER_THRESHOLD,
+    FEED_RECORDING,
+    FETCH_CONCURRENCY,
+    FETCH_TIMEOUT,
+    HOST_BREAKER_THRESHOLD,
+)
+
+from .breaker import CircuitBreaker
+from .metrics import metrics
+from .recorder import FeedRecorder
+
+
+class CircuitOpenError(ValueError):
+    """Raised when a feed isn't fetched because it (or its server) keeps failing"""
+
+
+@dataclass(slots=True)
+class FeedValidators:
+    """Contains what is needed to know if a feed changed since the last time it was fetched"""
+
+    etag: str = None
+    """ The ETag header sent by the server """
+
+    last_modified: str = None
+    """ The Last-Modified header sent by the server """
+
+    body_hash: bytes = None
+    """ The hash of the body (used when the server doesn't send the headers above) """
+
+    def as_headers(self) -> dict[str, str]:
+        """Returns the headers of a conditional request"""
+
+        headers = {}
+
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+
+@dataclass
+class FeedResponse:
+    """Contains a feed that changed since the last time it was fetched"""
+
+    body: bytes
+    """ The raw feed """
+
+    validators: FeedValidators
+    """ The validators to store once the feed is processed """
+
+
+@dataclass
+class PollStats:
+    """Counts how many polls could skip parsing the feed"""
+
+    polls: int = 0
+    """ The number of feeds fetched """
+
+    not_modified: int = 0
+    """ The number of polls answered with 304 Not Modified """
+
+    same_body: int = 0
+    """ The number of polls whose body had the same hash as before """
+
+    @property
+    def short_circuited(self) -> int:
+        """The number of polls that skipped parsing"""
+
+        return self.not_modified + self.same_body
+
+
+poll_stats = PollStats()
+""" The statistics of every poll done by the bot """
+
+
+def check_feed_response(
+    url: str,
+    status: int,
+    headers,
+    body: bytes,
+    validators: FeedValidators | None,
+) -> FeedResponse | None:
+    """
+    Checks the response of a (conditional) feed request, returning `None` if the feed didn't change
+    (raises a `ValueError` if the server didn't answer properly)
+    """
+
+    poll_stats.polls += 1
+
+    host = urlsplit(url).netloc
+    metrics.inc("feed_responses_total", host=host, feed=url, status=status)
+    metrics.inc("feed_downloaded_bytes_total", len(body), host=host)
+
+    if status == 304:
+        poll_stats.not_modified += 1
+        return None
+
+    if status != 200:
+        raise ValueError(f"Failed to retrieve XML using: {url}\nStatus code: {status}")
+
+    body_hash = hashlib.blake2b(body, digest_size=16).digest()
+
+    if validators is not None and validators.body_hash == body_hash:
+        poll_stats.same_body += 1
+        return None
+
+    return FeedResponse(
+        body=body,
+        validators=FeedValidators(
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            body_hash=body_hash,
+        ),
+    )
+
+
+class FeedFetcher:
+    """
+    Fetches the courses feeds without blocking the event loop,
+    sharing a single keep-alive connection pool between every request
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = FETCH_CONCURRENCY,
+        timeout: float = FETCH_TIMEOUT,
+        recording: str | None = FEED_RECORDING,
+    ) -> None:
+
+        self.__max_concurrency = max_concurrency
+        self.__timeout = aiohttp.ClientTimeout(total=timeout)
+
+        # Both need a running event loop, so they are only created on the first fetch
+        self.__session: aiohttp.ClientSession = None
+        self.__semaphore: asyncio.Semaphore = None
+
+        # Indexed by the feed link and by the server name, respectively
+        self.__breakers: dict[str, CircuitBreaker] = dict()
+        self.__host_breakers: dict[str, CircuitBreaker] = dict()
+
+        # The server that receives the requests instead of Fenix (see `redirect`)
+        self.__base_url: str = None
+
+        # Saves every response, to reproduce the updates offline (see `benchmarks/replay.py`)
+        self.__recorder = FeedRecorder(recording) if recording is not None else None
+
+    def redirect(self, base_url: str):
+        """Sends every request to another server (for example `http://localhost:8080`), keeping the path (used by the load test)"""
+
+        self.__base_url = base_url.rstrip("/")
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared session, creating it if needed"""
+
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.__max_concurrency, keepalive_timeout=60
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector, timeout=self.__timeout
+            )
+            self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+
+        return self.__session
+
+    def get_breaker(self, url: str) -> CircuitBreaker:
+        """Returns the circuit breaker of the feed"""
+
+        if url not in self.__breakers:
+            self.__breakers[url] = CircuitBreaker(name=url, threshold=BREAKER_THRESHOLD)
+
+        return self.__breakers[url]
+
+    def get_host_breaker(self, url: str) -> CircuitBreaker:
+        """Returns the circuit breaker of the server of the feed"""
+
+        host = urlsplit(url).netloc
+
+        if host not in self.__host_breakers:
+            self.__host_breakers[host] = CircuitBreaker(
+                name=host, threshold=HOST_BREAKER_THRESHOLD
+            )
+
+        return self.__host_breakers[host]
+
+    def record_success(self, url: str):
+        """Registers that the feed was fetched and processed"""
+
+        self.get_breaker(url).record_success()
+        self.get_host_breaker(url).record_success()
+
+    def record_failure(self, url: str, error: Exception) -> float:
+        """Registers that the feed couldn't be fetched or processed (returns the time to wait before retrying it)"""
+
+        self.get_host_breaker(url).record_failure(error)
+
+        return self.get_breaker(url).record_failure(error)
+
+    async def fetch(
+        self, url: str, validators: FeedValidators = None
+    ) -> FeedResponse | None:
+        """
+        Retrieves `url` if it changed since it was fetched with `validators`, otherwise returns `None`
+        (raises a `ValueError` if it wasn't possible and a `CircuitOpenError` if it is failing and shouldn't be retried yet)
+
+        The result should be registered with `record_success` or `record_failure`
+        """
+
+        if not (self.get_breaker(url).allow() and self.get_host_breaker(url).allow()):
+            raise CircuitOpenError(f"Skipping '{url}' as it keeps failing")
+
+        session = self.__get_session()
+        headers = validators.as_headers() if validators is not None else {}
+
+        request_url = url
+        if self.__base_url is not None:
+            parts = urlsplit(url)
+            request_url = self.__base_url + parts.path
+
+        host = urlsplit(url).netloc
+
+        async with self.__semaphore:
+            start = time.perf_counter()
+
+            try:
+                async with session.get(request_url, headers=headers) as response:
+                    body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.inc("feed_responses_total", host=host, feed=url, status="error")
+                self.__record(url, 0, {}, repr(e).encode())
+                raise ValueError(
+                    f"Failed to retrieve XML using: {url}\nError: {e!r}"
+                ) from e
+            finally:
+                # Measured without the time waiting for the semaphore, so it only depends on the server
+                duration = time.perf_counter() - start
+                metrics.observe("feed_fetch_seconds", duration, host=host)
+                metrics.set("feed_fetch_last_seconds", duration, host=host, feed=url)
+
+        self.__record(url, response.status, response.headers, body)
+
+        return check_feed_response(
+            url=url,
+            status=response.status,
+            headers=response.headers,
+            body=body,
+            validators=validators,
+        )
+
+    def __record(self, url: str, status: int, headers, body: bytes):
+        """Saves the response, if recording"""
+
+        if self.__recorder is not None:
+            self.__recorder.write(
+                recorded_at=time.time(),
+                url=url,
+                status=status,
+                headers=headers,
+                body=body,
+            )
+
+    async def close(self):
+        """Closes the connection pool"""
+
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
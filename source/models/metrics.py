@@ -0,0 +1,376 @@
+""" Contains the metrics of the update pipeline and the local HTTP endpoint that exposes them (in the Prometheus text format) """
+
+import bisect
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+""" The upper bounds (in seconds) of the histograms that measure durations """
+
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+""" The upper bounds of the histograms that measure how many things happened """
+
+
+@dataclass(slots=True)
+class Histogram:
+    """Counts the observed values that fall in each bucket (like a Prometheus histogram)"""
+
+    buckets: tuple[float, ...]
+    """ The upper bound of each bucket (the last bucket, +Inf, is implicit) """
+
+    counts: list[int] = None
+    """ The number of values in each bucket (not cumulative, the last one is +Inf) """
+
+    sum: float = 0.0
+    """ The sum of the observed values """
+
+    count: int = 0
+    """ The number of observed values """
+
+    def __post_init__(self):
+        if self.counts is None:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float):
+        """Registers a value"""
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def average(self) -> float:
+        """The average of the observed values"""
+
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    def get_quantile(self, q: float) -> float:
+        """Estimates the quantile `q` (between 0 and 1) of the observed values, interpolating inside the bucket (like Prometheus)"""
+
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count > 0:
+                # The values above the last bound can't be estimated, so the bound is used
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+
+            seen += count
+
+        return self.buckets[-1]
+
+
+@dataclass(slots=True)
+class Metric:
+    """A metric and its values (one for each combination of labels)"""
+
+    kind: str
+    """ Either "counter", "gauge" or "histogram" """
+
+    help: str
+    """ What is measured """
+
+    buckets: tuple[float, ...] = LATENCY_BUCKETS
+    """ The buckets of the histograms """
+
+    values: dict[tuple[tuple[str, str], ...], float | Histogram] = field(
+        default_factory=dict
+    )
+    """ The values, indexed by the labels (sorted pairs of name and value) """
+
+    callback: Callable[[], float] = None
+    """ Reads the value when the metrics are collected (for values already kept somewhere else, like the queue depth) """
+
+
+class MetricsRegistry:
+    """
+    Keeps the metrics of the bot in memory (every metric has to be declared first, see `declare`)
+
+    Updating a metric is only a dictionary access, so it can be done anywhere in the pipeline
+    """
+
+    def __init__(self) -> None:
+
+        # Indexed by the metric name
+        self.__metrics: dict[str, Metric] = dict()
+
+    def declare(
+        self,
+        name: str,
+        kind: str,
+        help: str,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        """Declares a metric"""
+
+        if kind not in ("counter", "gauge", "histogram"):
+            raise ValueError(f"Unknown metric kind '{kind}'.")
+
+        self.__metrics[name] = Metric(kind=kind, help=help, buckets=buckets)
+
+    def set_callback(self, name: str, callback: Callable[[], float]):
+        """Reads the value of the metric (without labels) from `callback` when the metrics are collected"""
+
+        self.__metrics[name].callback = callback
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """Increases a counter"""
+
+        values = self.__metrics[name].values
+        key = self.__get_key(labels)
+
+        values[key] = values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        """Sets the value of a gauge"""
+
+        self.__metrics[name].values[self.__get_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Registers a value in a histogram"""
+
+        metric = self.__metrics[name]
+        key = self.__get_key(labels)
+
+        if key not in metric.values:
+            metric.values[key] = Histogram(buckets=metric.buckets)
+
+        metric.values[key].observe(value)
+
+    @contextmanager
+    def measure(self, name: str, **labels: str):
+        """Registers how long the block took (in seconds) in a histogram"""
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_total(self, name: str, **labels: str) -> float:
+        """Returns the sum of the values of a counter or gauge that have the labels given (every value, if none is given)"""
+
+        metric = self.__metrics[name]
+
+        if metric.callback is not None:
+            return metric.callback()
+
+        wanted = set(self.__get_key(labels))
+
+        return sum(
+            value for key, value in metric.values.items() if wanted.issubset(key)
+        )
+
+    def get_histogram(self, name: str, **labels: str) -> Histogram:
+        """Returns the histogram with the labels (or every histogram of the metric merged, if no labels are given)"""
+
+        metric = self.__metrics[name]
+
+        if labels:
+            return metric.values.get(
+                self.__get_key(labels), Histogram(buckets=metric.buckets)
+            )
+
+        merged = Histogram(buckets=metric.buckets)
+        for histogram in metric.values.values():
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.sum += histogram.sum
+            merged.count += histogram.count
+
+        return merged
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text format"""
+
+        lines = []
+
+        for name, metric in self.__metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+
+            values = metric.values
+            if metric.callback is not None:
+                values = {(): metric.callback()}
+
+            for key, value in values.items():
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{self.__format_labels(key)} {value}")
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ("+Inf",), value.counts):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket{self.__format_labels(key + (('le', str(bound)),))} {cumulative}"
+                    )
+
+                lines.append(f"{name}_sum{self.__format_labels(key)} {value.sum}")
+                lines.append(f"{name}_count{self.__format_labels(key)} {value.count}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def __get_key(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+        """Returns the key of the values with the labels"""
+
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    @staticmethod
+    def __format_labels(key: tuple[tuple[str, str], ...]) -> str:
+        """Returns the labels in the Prometheus format"""
+
+        if len(key) == 0:
+            return ""
+
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in key) + "}"
+
+
+metrics = MetricsRegistry()
+""" The metrics of the bot """
+
+metrics.declare(
+    "feed_fetch_seconds",
+    "histogram",
+    "The time taken to fetch a feed (by server)",
+)
+metrics.declare(
+    "feed_fetch_last_seconds",
+    "gauge",
+    "The time taken by the last fetch of each feed",
+)
+metrics.declare(
+    "feed_responses_total",
+    "counter",
+    'The answers to the feed requests, by feed and HTTP status ("error" when the server didn\'t answer)',
+)
+metrics.declare(
+    "feed_downloaded_bytes_total",
+    "counter",
+    "The bytes of the feeds downloaded (by server)",
+)
+metrics.declare(
+    "update_stage_seconds",
+    "histogram",
+    'The time taken by each stage of the updates ("parse", "diff" or "render")',
+)
+metrics.declare(
+    "announcement_changes_total",
+    "counter",
+    "The announcements added, updated and deleted",
+)
+metrics.declare(
+    "update_errors_total",
+    "counter",
+    "The course updates that failed with an unexpected error (the other courses are still updated)",
+)
+metrics.declare(
+    "update_cycle_seconds",
+    "histogram",
+    "The time taken by each automatic update (fetching, processing and queueing the changes of the courses due)",
+)
+metrics.declare(
+    "update_cycle_changes",
+    "histogram",
+    "The number of changes found by each automatic update",
+    buckets=COUNT_BUCKETS,
+)
+metrics.declare(
+    "update_cycle_courses",
+    "histogram",
+    "The number of courses updated by each automatic update",
+    buckets=COUNT_BUCKETS,
+)
+metrics.declare(
+    "message_send_seconds",
+    "histogram",
+    "The time taken by Discord to accept a message",
+)
+metrics.declare(
+    "alert_delivery_seconds",
+    "histogram",
+    "The time between an alert being queued and sent",
+)
+metrics.declare(
+    "messages_sent_total",
+    "counter",
+    'The messages sent by the delivery queue (by result, "sent" or "failed")',
+)
+metrics.declare(
+    "delivery_queue_depth",
+    "gauge",
+    "The number of alerts waiting to be sent",
+)
+metrics.declare(
+    "scheduled_retries",
+    "gauge",
+    "The number of failed feeds waiting to be fetched again",
+)
+metrics.declare(
+    "tracked_courses",
+    "gauge",
+    "The number of different courses tracked (by any guild)",
+)
+metrics.declare(
+    "search_seconds",
+    "histogram",
+    "The time taken to search the announcements",
+)
+metrics.declare(
+    "event_loop_lag_seconds",
+    "histogram",
+    "How late the event loop ran the watchdog heartbeat (the time it was blocked)",
+)
+metrics.declare(
+    "event_loop_stalls_total",
+    "counter",
+    "The times the event loop was blocked for longer than the threshold",
+)
+
+
+class MetricsServer:
+    """Answers the requests of Prometheus (or `curl`) with the current metrics"""
+
+    def __init__(self, registry: MetricsRegistry = metrics) -> None:
+
+        self.__registry = registry
+        self.__runner: web.AppRunner = None
+
+    async def start(self, host: str, port: int):
+        """Starts listening on the address"""
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle)
+
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.__registry.render(),
+            content_type="text/plain",
+        )
+
+    async def stop(self):
+        """Stops listening"""
+
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
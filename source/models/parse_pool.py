@@ -0,0 +1,110 @@
+""" Contains the parsing stage of the updates, which can run in a pool of workers outside the event loop """
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from constants import PARSE_EXECUTOR, PARSE_WORKERS
+
+from .announcement import Announcement
+from .diff import get_fingerprint
+from .parser import FeedItem, iter_feed_items
+
+
+class ParsedItem(NamedTuple):
+    """Contains an announcement of the feed, its fingerprint (see `get_fingerprint`) and, if it changed, the announcement built from it"""
+
+    item: FeedItem
+    fingerprint: bytes
+    announcement: Announcement | None = None
+
+
+def parse_feed(
+    xml_data: bytes,
+    newer_than: int | None = None,
+    known: dict[str, bytes] | None = None,
+) -> list[ParsedItem]:
+    """
+    Parses the feed and fingerprints its announcements (see `iter_feed_items` for `newer_than`)
+
+    If the fingerprints of the `known` announcements are given (indexed by the announcement ID), the announcements
+    that aren't known or changed are also built, so the workers do that too (parsing the date, compressing the description...)
+    """
+
+    records = []
+
+    for item in iter_feed_items(xml_data, newer_than=newer_than):
+        fingerprint = get_fingerprint(item)
+        announcement = None
+
+        if known is not None and known.get(item.pub_date) != fingerprint:
+            announcement = Announcement(
+                title=item.title,
+                description=item.description,
+                link=item.link,
+                author=item.author,
+                pub_date=item.pub_date,
+            )
+
+        records.append(ParsedItem(item, fingerprint, announcement))
+
+    return records
+
+
+class FeedParser:
+    """
+    Parses the feeds in a pool of workers, so big updates don't stop the event loop from answering
+    Discord (the workers only receive the raw feed and return the parsed announcements, already built if they changed)
+    """
+
+    def __init__(
+        self, workers: int = PARSE_WORKERS, kind: str = PARSE_EXECUTOR
+    ) -> None:
+
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown parse executor '{kind}'.")
+
+        self.__workers = workers
+        self.__kind = kind
+
+        # Only created on the first parse
+        self.__executor: Executor = None
+
+    def __get_executor(self) -> Executor:
+        """Returns the pool of workers, creating it if needed"""
+
+        if self.__executor is None:
+            if self.__kind == "process":
+                self.__executor = ProcessPoolExecutor(max_workers=self.__workers)
+            else:
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=self.__workers, thread_name_prefix="parser"
+                )
+
+        return self.__executor
+
+    async def parse(
+        self,
+        xml_data: bytes,
+        newer_than: int | None = None,
+        known: dict[str, bytes] | None = None,
+    ) -> list[ParsedItem]:
+        """Same as `parse_feed`, but in one of the workers (raises a `ValueError` if the XML isn't a valid feed)"""
+
+        if self.__workers == 0:
+            return parse_feed(xml_data, newer_than, known)
+
+        # The fingerprints are copied, as the course can change while the feed is parsed
+        if known is not None:
+            known = dict(known)
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__get_executor(), parse_feed, xml_data, newer_than, known
+        )
+
+    def close(self):
+        """Stops the workers"""
+
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
@@ -0,0 +1,90 @@
+""" Contains the streaming parser of the Fenix announcements feeds """
+
+from datetime import datetime
+from io import BytesIO
+from typing import Iterator, NamedTuple
+
+from lxml import etree
+
+PUB_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S %z"
+""" The format of the publication dates in the feed. Example: Tue, 22 Jul 2014 20:32:41 +0100 """
+
+
+class FeedItem(NamedTuple):
+    """Contains the raw fields of an announcement in the feed"""
+
+    title: str
+    description: str
+    link: str
+    author: str
+    pub_date: str
+
+
+def check_feed_root(root: etree._Element | None):
+    """Raises a `ValueError` if the root of the XML isn't a RSS feed"""
+
+    # Sometimes the IST server is in maintenance and returns an HTML page instead
+    if root is None or root.tag != "rss":
+        raise ValueError(f"Expected a RSS feed but got '{getattr(root, 'tag', None)}'")
+
+
+def iter_feed_items(
+    xml_data: bytes, newer_than: int | None = None
+) -> Iterator[FeedItem]:
+    """
+    Yields the announcements of the feed one at a time, freeing each one after it is read
+    (raises a `ValueError` if the XML isn't a valid feed)
+
+    If `newer_than` (a UNIX timestamp) is given, stops at the first announcement that isn't newer than it. As Fenix lists
+    the newest announcements first, this skips reading the announcements that were already seen
+    (but then deleted or updated announcements can't be detected, so a full scan is needed once in a while)
+    """
+
+    context = etree.iterparse(
+        BytesIO(xml_data),
+        events=("start", "end"),
+        tag=("rss", "item"),
+        resolve_entities=False,
+    )
+
+    try:
+        for event, element in context:
+            # Checked at the first elements, before an incremental read can stop
+            if event == "start":
+                check_feed_root(element.getroottree().getroot())
+                continue
+
+            if element.tag != "item":
+                continue
+
+            # Reading the children at once is much faster than searching each one
+            fields = {child.tag: child.text or "" for child in element}
+
+            item = FeedItem(
+                title=fields.get("title", ""),
+                description=fields.get("description", ""),
+                link=fields.get("link", ""),
+                author=fields.get("author", ""),
+                pub_date=fields.get("pubDate", ""),
+            )
+
+            # Free the announcement, as it isn't needed anymore
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                parent.remove(element)
+
+            if (
+                newer_than is not None
+                and datetime.strptime(item.pub_date, PUB_DATE_FORMAT).timestamp()
+                <= newer_than
+            ):
+                return
+
+            yield item
+
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f"Invalid feed XML: {e}") from e
+
+    # A document without any RSS or announcement element (like most HTML pages) is only checked at the end
+    check_feed_root(context.root)
@@ -0,0 +1,173 @@
+""" Contains the recording of the feed responses, used to reproduce the updates offline (see `benchmarks/replay.py`) """
+
+import atexit
+import hashlib
+import marshal
+import os
+import queue
+import threading
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+RECORDING_HEADER = b"FEEDREC1"
+""" The start of every recording (the last character is the version of the format) """
+
+
+@dataclass(slots=True)
+class RecordedResponse:
+    """Contains a response of the server to a feed request"""
+
+    recorded_at: float
+    """ When the response was received (UNIX time) """
+
+    url: str
+    """ The link of the feed """
+
+    status: int
+    """ The HTTP status (0 if the server didn't answer) """
+
+    etag: str | None
+    """ The ETag header """
+
+    last_modified: str | None
+    """ The Last-Modified header """
+
+    body: bytes
+    """ The raw feed (or the error, if the server didn't answer) """
+
+
+class FeedRecorder:
+    """
+    Appends the feed responses to a file, each one compressed separately so a recording cut short can still be read
+
+    The body of a feed is only written when it changed since the previous response of the same feed
+    (most polls get the same feed), so recording for days takes little space
+
+    The responses are compressed and written by a background thread, so recording doesn't block the event loop
+    """
+
+    def __init__(self, path: str) -> None:
+
+        self.__path = path
+        self.__file = open(path, "ab")
+
+        if self.__file.tell() == 0:
+            self.__file.write(RECORDING_HEADER)
+
+        # The hash of the last body written of each feed (indexed by the feed link, only used by the writer)
+        self.__last_hashes: dict[str, bytes] = dict()
+
+        # The responses waiting to be written (`None` stops the writer)
+        self.__pending: queue.SimpleQueue[tuple | None] = queue.SimpleQueue()
+        self.__writer = threading.Thread(
+            target=self.__write_pending, name="recorder", daemon=True
+        )
+        self.__writer.start()
+
+        atexit.register(self.close)
+
+    def write(
+        self,
+        recorded_at: float,
+        url: str,
+        status: int,
+        headers,
+        body: bytes,
+    ):
+        """Queues a response to be appended (`headers` only needs a `get` method)"""
+
+        if self.__file.closed:
+            return
+
+        # Only the headers needed are kept, the response is freed once the request finishes
+        self.__pending.put(
+            (
+                recorded_at,
+                url,
+                status,
+                headers.get("ETag"),
+                headers.get("Last-Modified"),
+                body,
+            )
+        )
+
+    def __write_pending(self):
+        """Writes the queued responses until the recorder is closed (runs in a separate thread)"""
+
+        while (response := self.__pending.get()) is not None:
+            recorded_at, url, status, etag, last_modified, body = response
+
+            # Only the feeds are compared, the other responses (like 304 Not Modified) are written as they are
+            same_body = False
+            if status == 200:
+                body_hash = hashlib.blake2b(body, digest_size=16).digest()
+                same_body = self.__last_hashes.get(url) == body_hash
+                self.__last_hashes[url] = body_hash
+
+            entry = zlib.compress(
+                marshal.dumps(
+                    (
+                        recorded_at,
+                        url,
+                        status,
+                        etag,
+                        last_modified,
+                        None if same_body else body,
+                    )
+                )
+            )
+
+            # Written right away, so the responses are kept even if the bot is killed
+            self.__file.write(len(entry).to_bytes(4, "big") + entry)
+            self.__file.flush()
+
+    def close(self):
+        """Writes the responses still queued and closes the file"""
+
+        if not self.__file.closed:
+            self.__pending.put(None)
+            self.__writer.join()
+
+            self.__file.close()
+            print(f"Feed responses recorded in '{self.__path}'")
+
+
+def read_recording(path: str) -> Iterator[RecordedResponse]:
+    """Returns the responses of a recording in the order they were received (raises a `ValueError` if it isn't a recording)"""
+
+    with open(path, "rb") as file:
+        if file.read(len(RECORDING_HEADER)) != RECORDING_HEADER:
+            raise ValueError(f"'{path}' isn't a feed recording.")
+
+        # The last body of each feed (indexed by the feed link)
+        last_bodies: dict[str, bytes] = dict()
+
+        while len(size := file.read(4)) == 4:
+            data = file.read(int.from_bytes(size, "big"))
+
+            try:
+                recorded_at, url, status, etag, last_modified, body = marshal.loads(
+                    zlib.decompress(data)
+                )
+            except (zlib.error, EOFError, ValueError):
+                # The bot was stopped while writing the last response
+                print(f"Skipping a truncated response at the end of '{path}'")
+                return
+
+            if body is None:
+                body = last_bodies[url]
+            if status == 200:
+                last_bodies[url] = body
+
+            yield RecordedResponse(
+                recorded_at=recorded_at,
+                url=url,
+                status=status,
+                etag=etag,
+                last_modified=last_modified,
+                body=body,
+            )
+
+        if os.fstat(file.fileno()).st_size != file.tell():
+            print(f"Skipping a truncated response at the end of '{path}'")
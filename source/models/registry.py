@@ -0,0 +1,74 @@
+from .course import Course
+
+
+class FeedRegistry:
+    """
+    Keeps a single `Course` per feed, shared by every guild tracking it,
+    so each feed is only fetched and compared once per update
+    """
+
+    def __init__(self) -> None:
+
+        # Both dicts are indexed using the feed key (see `get_key`)
+        self.__courses: dict[str, Course] = dict()
+
+        # The subscribers of each feed are the guild IDs, each with the ID of its course channel (if known)
+        self.__subscribers: dict[str, dict[int, int | None]] = dict()
+
+    @staticmethod
+    def get_key(course: Course) -> str:
+        """Returns the key identifying the feed of the course (the same course can be added with slightly different links)"""
+
+        return f"{course.name}/{course.years}/{course.semester}"
+
+    def subscribe(
+        self, guild_id: int, course: Course, channel_id: int = None
+    ) -> Course:
+        """Subscribes the guild to the feed of `course`, returning the shared course of that feed"""
+
+        key = self.get_key(course)
+
+        if key not in self.__courses:
+            self.__courses[key] = course
+            self.__subscribers[key] = dict()
+
+        self.__subscribers[key][guild_id] = channel_id
+
+        return self.__courses[key]
+
+    def unsubscribe(self, guild_id: int, course: Course):
+        """Unsubscribes the guild from the feed of `course` (the feed is forgotten once there are no subscribers left)"""
+
+        key = self.get_key(course)
+
+        if key not in self.__subscribers:
+            return
+
+        self.__subscribers[key].pop(guild_id, None)
+
+        if len(self.__subscribers[key]) == 0:
+            del self.__subscribers[key]
+            del self.__courses[key]
+
+    def get_courses(self) -> list[Course]:
+        """Returns the list of every course being tracked (each one only once)"""
+
+        return list(self.__courses.values())
+
+    def get_subscribers(self, course: Course) -> set[int]:
+        """Returns the IDs of the guilds tracking `course`"""
+
+        return set(self.__subscribers.get(self.get_key(course), ()))
+
+    def get_channel_id(self, guild_id: int, course: Course) -> int | None:
+        """Returns the ID of the channel of `course` in the guild (or `None` if it isn't known)"""
+
+        return self.__subscribers.get(self.get_key(course), {}).get(guild_id)
+
+    def set_channel_id(self, guild_id: int, course: Course, channel_id: int):
+        """Stores the ID of the channel of `course` in the guild"""
+
+        key = self.get_key(course)
+
+        if key in self.__subscribers and guild_id in self.__subscribers[key]:
+            self.__subscribers[key][guild_id] = channel_id
@@ -0,0 +1,245 @@
+""" Contains the scheduler that decides how often (and when) each course is updated """
+
+import hashlib
+import heapq
+import marshal
+import time
+from dataclasses import dataclass
+
+from constants import MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, POLL_BUDGET
+
+from .course import Course
+from .registry import FeedRegistry
+from .snapshot import SnapshotManager
+
+HISTORY_DAYS = 28
+""" The announcements published in the last days used to estimate how often a course posts """
+
+PRIOR_POSTS_PER_DAY = 0.1
+""" The posting rate assumed without any history (so new and dormant courses are still updated once in a while) """
+
+UPDATES_PER_POST = 48
+""" How many updates to do per expected announcement (a course posting once per day is updated every 30 minutes) """
+
+CATCH_UP_WINDOW = 5 * 60  # seconds
+""" The courses whose update was missed (the bot was offline) are updated once, spread over this time """
+
+SCHEDULE_VERSION = 1
+""" The version of the schedule file format """
+
+
+def get_phase(key: str) -> float:
+    """Returns a fixed number between 0 and 1 for the feed, used to spread the updates of the courses over time"""
+
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+    return int.from_bytes(digest, "big") / 2**64
+
+
+@dataclass(slots=True)
+class PostingStats:
+    """Contains how often a course posts, estimated from its announcements"""
+
+    posts_per_day: float
+    """ The recent posting rate """
+
+    hour_weights: tuple[float, ...]
+    """ How much more (or less) than average the course posts in each hour of the day (the average is 1) """
+
+
+class PollScheduler:
+    """
+    Learns how often each course posts (and at what time of the day) to update the courses that post often
+    more frequently than the dormant ones, while keeping the total number of requests within a budget
+
+    The updates are spread over time (instead of updating every course at once) using a queue ordered by
+    when each course is due, which is saved so a restart keeps the same spread
+    """
+
+    __BACKUP_FILE = "schedule.snapshot"
+
+    def __init__(self) -> None:
+
+        # Indexed by the feed key (see `FeedRegistry`)
+        self.__next_due: dict[str, float] = dict()
+        self.__polls: dict[str, int] = dict()
+        self.__stats: dict[str, tuple[tuple[int, int, int], PostingStats]] = dict()
+
+        # Entries are (due time, feed key), the ones that don't match `__next_due` are outdated and ignored
+        self.__queue: list[tuple[float, str]] = []
+
+        # The factor that all the intervals are multiplied by to respect the budget (see `get_intervals`)
+        self.__budget_factor = 1.0
+
+        self.__snapshots = SnapshotManager(
+            path=self.__BACKUP_FILE,
+            capture=lambda: (
+                SCHEDULE_VERSION,
+                dict(self.__next_due),
+                dict(self.__polls),
+            ),
+            encode=marshal.dumps,
+        )
+
+    def get_stats(self, course: Course) -> PostingStats:
+        """Returns the posting statistics of the course (only computed again when the announcements change)"""
+
+        key = FeedRegistry.get_key(course)
+
+        # Also computed again every day, as the history moves
+        version = (
+            len(course.announcements),
+            course.announcements[-1].pub_date if course.announcements else 0,
+            int(time.time()) // (24 * 60 * 60),
+        )
+
+        if key in self.__stats and self.__stats[key][0] == version:
+            return self.__stats[key][1]
+
+        history_start = time.time() - HISTORY_DAYS * 24 * 60 * 60
+        n_recent = 0
+        hour_counts = [0] * 24
+
+        for announcement in course.announcements:
+            if announcement.pub_date >= history_start:
+                n_recent += 1
+
+            # In the time zone it was published, as that's when the professors are working
+            local_time = announcement.pub_date + announcement.utc_offset * 60
+            hour_counts[local_time // 3600 % 24] += 1
+
+        # Every hour counts as one extra post, so a course with few announcements isn't ignored at the other hours
+        total = len(course.announcements) + 24
+        stats = PostingStats(
+            posts_per_day=(n_recent + PRIOR_POSTS_PER_DAY * HISTORY_DAYS)
+            / HISTORY_DAYS,
+            hour_weights=tuple((count + 1) * 24 / total for count in hour_counts),
+        )
+
+        self.__stats[key] = (version, stats)
+
+        return stats
+
+    def get_base_interval(self, course: Course, now: float = None) -> float:
+        """Returns the interval (in seconds) between updates of the course at this time, ignoring the budget"""
+
+        if now is None:
+            now = time.time()
+
+        stats = self.get_stats(course)
+
+        # The local hour of the most recent announcement is used as the time zone of the course
+        utc_offset = course.announcements[-1].utc_offset if course.announcements else 0
+        hour = int(now + utc_offset * 60) // 3600 % 24
+
+        posts_per_hour = stats.posts_per_day / 24 * stats.hour_weights[hour]
+        interval = 60 * 60 / (posts_per_hour * UPDATES_PER_POST)
+
+        return min(MAX_POLL_INTERVAL * 60, max(MIN_POLL_INTERVAL * 60, interval))
+
+    def get_intervals(
+        self, courses: list[Course], now: float = None
+    ) -> dict[str, float]:
+        """Returns the interval (in seconds) between updates of each course (indexed by the feed key), respecting the budget"""
+
+        intervals = {
+            FeedRegistry.get_key(course): self.get_base_interval(course, now)
+            for course in courses
+        }
+
+        # If there are too many requests per hour, every interval is increased by the same factor
+        requests_per_hour = sum(60 * 60 / interval for interval in intervals.values())
+        self.__budget_factor = max(1.0, requests_per_hour / POLL_BUDGET)
+
+        return {
+            key: interval * self.__budget_factor for key, interval in intervals.items()
+        }
+
+    def get_due_courses(self, courses: list[Course], now: float = None) -> list[Course]:
+        """Returns the courses that should be updated now (each course is only returned once, even if multiple updates were missed)"""
+
+        if now is None:
+            now = time.time()
+
+        courses_by_key = {FeedRegistry.get_key(course): course for course in courses}
+        intervals = self.get_intervals(courses, now)
+
+        # Forget the courses that aren't tracked anymore
+        for key in self.__next_due.keys() - courses_by_key.keys():
+            del self.__next_due[key]
+            self.__polls.pop(key, None)
+
+        # New courses are spread over their interval, so they aren't all updated at the same time
+        for key in courses_by_key.keys() - self.__next_due.keys():
+            self.__schedule(key, now + get_phase(key) * intervals[key])
+
+        due = []
+        while len(self.__queue) > 0 and self.__queue[0][0] <= now:
+            due_time, key = heapq.heappop(self.__queue)
+
+            if self.__next_due.get(key) == due_time:
+                due.append(courses_by_key[key])
+
+        return due
+
+    def record_poll(self, course: Course, now: float = None) -> int:
+        """Registers that the course was updated, scheduling the next update (returns the number of times it was updated)"""
+
+        if now is None:
+            now = time.time()
+
+        key = FeedRegistry.get_key(course)
+
+        self.__schedule(
+            key, now + self.get_base_interval(course, now) * self.__budget_factor
+        )
+        self.__polls[key] = self.__polls.get(key, 0) + 1
+        self.__snapshots.mark_dirty()
+
+        return self.__polls[key]
+
+    def get_polls(self, course: Course) -> int:
+        """Returns the number of times the course was updated"""
+
+        return self.__polls.get(FeedRegistry.get_key(course), 0)
+
+    def get_next_due(self, course: Course) -> float | None:
+        """Returns when the course will be updated (or `None` if it isn't scheduled yet)"""
+
+        return self.__next_due.get(FeedRegistry.get_key(course))
+
+    def __schedule(self, key: str, due_time: float):
+        """Sets when the course is due"""
+
+        # Another entry with the same time would make the course due twice
+        if self.__next_due.get(key) == due_time:
+            return
+
+        self.__next_due[key] = due_time
+        heapq.heappush(self.__queue, (due_time, key))
+
+    def try_load_backup(self) -> bool:
+        """Tries to load the schedule saved before the bot stopped (returns a boolean representing whether it was successful or not)"""
+
+        snapshot = self.__snapshots.read()
+
+        if snapshot is None:
+            return False
+
+        version, next_due, polls = marshal.loads(snapshot)
+        if version != SCHEDULE_VERSION:
+            return False
+
+        now = time.time()
+        self.__polls = polls
+        self.__next_due = dict()
+        self.__queue = []
+
+        for key, due_time in next_due.items():
+            # The updates missed while the bot was offline are done once, spread over a short time
+            if due_time < now:
+                due_time = now + get_phase(key) * CATCH_UP_WINDOW
+
+            self.__schedule(key, due_time)
+
+        return True
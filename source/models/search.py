@@ -0,0 +1,242 @@
+""" Contains the full-text index of the announcements, used to search them without going through every announcement """
+
+import hashlib
+import html
+import json
+import re
+import sqlite3
+from collections.abc import Collection
+from dataclasses import dataclass
+
+from .announcement import Announcement, AnnouncementActions
+from .course import Course
+from .metrics import metrics
+from .registry import FeedRegistry
+
+SCHEMA = """
+CREATE VIRTUAL TABLE announcements USING fts5(
+    course_key UNINDEXED,
+    id UNINDEXED,
+    link UNINDEXED,
+    pub_date UNINDEXED,
+    course_tag,
+    title,
+    text,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+INSERT INTO announcements (announcements, rank) VALUES ('rank', 'bm25(0, 0, 0, 0, 0, 5.0, 1.0)');
+"""
+""" The index, ranked by relevance with the titles counting 5 times more (the tokenizer ignores the case and the accents, so "exame" also finds "Exâme") """
+
+MAX_TAGGED_COURSES = 100
+""" Up to this number of courses, the courses searched are part of the full-text query (see `SearchIndex.search`) """
+
+MIN_PREFIX_LENGTH = 3
+""" The terms with at least this length also find the words starting with them (like "exam" finding "exames") """
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+""" Matches the HTML tags of the descriptions """
+
+TERM_PATTERN = re.compile(r"\w+")
+""" Matches the terms of a query """
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """Contains an announcement found by a search"""
+
+    course_key: str
+    """ The feed key of the course (see `FeedRegistry`) """
+
+    title: str
+    """ The title of the announcement """
+
+    link: str
+    """ The link to see the announcement """
+
+    pub_date: int
+    """ The publication date (as a UNIX timestamp) """
+
+    snippet: str
+    """ The part of the announcement that matched, with the terms in bold """
+
+
+def get_searchable_text(announcement: Announcement) -> str:
+    """Returns the description without the HTML tags (a rougher but much faster conversion than `Announcement.text`, enough to search it)"""
+
+    if announcement.description_hash is None:
+        return announcement.description
+
+    # Unescaped twice, as the description contains encoded HTML tags (see `html_to_text`)
+    return html.unescape(TAG_PATTERN.sub(" ", html.unescape(announcement.description)))
+
+
+def get_course_tag(key: str) -> str:
+    """Returns the word that identifies the announcements of the course in the index"""
+
+    return "c" + hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def get_phrase(term: str) -> str:
+    """Returns the FTS5 query of a term (also matching the words starting with it and, for plurals, with the singular)"""
+
+    if len(term) < MIN_PREFIX_LENGTH:
+        return f'"{term}"'
+
+    # "exames" should also find "exame", and "avisos" still finds "avisos"
+    if len(term) > MIN_PREFIX_LENGTH and term.lower().endswith("s"):
+        term = term[:-1]
+
+    return f'"{term}"*'
+
+
+class SearchIndex:
+    """
+    Keeps the announcements of every course in an inverted index (SQLite FTS5, in memory), updated with the changes
+    of each update, so a search only reads the announcements that contain the terms
+
+    The results are ranked by relevance (BM25, the titles counting more)
+    """
+
+    def __init__(self) -> None:
+
+        # Used by the thread that loads the backup and then by the event loop
+        self.__connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self.__connection.executescript(SCHEMA)
+
+        # The row of each announcement in the index (indexed by the feed key and then by the announcement ID)
+        self.__rows: dict[str, dict[str, int]] = dict()
+
+    def index_courses(self, courses: list[Course]):
+        """Indexes every announcement of the courses (replacing the ones already indexed)"""
+
+        with self.__connection as connection:
+            for course in courses:
+                self.__remove_course(connection, course)
+
+                for announcement in course.announcements:
+                    self.__insert(connection, course, announcement)
+
+    def remove_course(self, course: Course):
+        """Removes the announcements of the course from the index"""
+
+        with self.__connection as connection:
+            self.__remove_course(connection, course)
+
+    def apply_changes(
+        self,
+        course: Course,
+        changes: list[dict[str, Announcement | AnnouncementActions]],
+    ):
+        """Updates the index with the changes of the course"""
+
+        if len(changes) == 0:
+            return
+
+        with self.__connection as connection:
+            for change in changes:
+                announcement = change["announcement"]
+
+                self.__delete(connection, course, announcement.id)
+
+                if change["action"] != AnnouncementActions.DELETED:
+                    self.__insert(connection, course, announcement)
+
+    def search(
+        self, query: str, course_keys: Collection[str], limit: int
+    ) -> list[SearchHit]:
+        """
+        Returns the announcements of the courses that best match the query (the ones with every term, or,
+        if there aren't any, with some of the terms)
+        """
+
+        terms = TERM_PATTERN.findall(query)
+
+        if len(terms) == 0 or len(course_keys) == 0:
+            return []
+
+        # Quoted so the terms are never read as FTS5 operators
+        phrases = [get_phrase(term) for term in terms]
+
+        with metrics.measure("search_seconds"):
+            hits = self.__search(" ".join(phrases), course_keys, limit)
+
+            if len(hits) == 0 and len(phrases) > 1:
+                hits = self.__search(" OR ".join(phrases), course_keys, limit)
+
+        return hits
+
+    def __search(
+        self, match: str, course_keys: Collection[str], limit: int
+    ) -> list[SearchHit]:
+        """Returns the announcements of the courses matching the FTS5 query"""
+
+        columns = "course_key, title, link, pub_date, snippet(announcements, 6, '**', '**', '...', 16)"
+
+        # A guild tracks a few courses, so only their announcements are read by matching the tag of each course
+        # (with too many courses that query gets slow, so the announcements found are filtered instead)
+        if len(course_keys) <= MAX_TAGGED_COURSES:
+            tags = " OR ".join(get_course_tag(key) for key in course_keys)
+
+            rows = self.__connection.execute(
+                f"SELECT {columns} FROM announcements WHERE announcements MATCH ? ORDER BY rank LIMIT ?",
+                (f"({match}) AND course_tag : ({tags})", limit),
+            )
+        else:
+            rows = self.__connection.execute(
+                f"SELECT {columns} FROM announcements WHERE announcements MATCH ? AND course_key IN (SELECT value FROM json_each(?)) ORDER BY rank LIMIT ?",
+                (match, json.dumps(list(course_keys)), limit),
+            )
+
+        return [
+            SearchHit(
+                course_key=course_key,
+                title=title,
+                link=link,
+                pub_date=pub_date,
+                snippet=snippet,
+            )
+            for course_key, title, link, pub_date, snippet in rows
+        ]
+
+    def __insert(
+        self, connection: sqlite3.Connection, course: Course, announcement: Announcement
+    ):
+        """Adds the announcement to the index"""
+
+        key = FeedRegistry.get_key(course)
+
+        cursor = connection.execute(
+            "INSERT INTO announcements (course_key, id, link, pub_date, course_tag, title, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                announcement.id,
+                announcement.link,
+                announcement.pub_date,
+                get_course_tag(key),
+                announcement.title,
+                get_searchable_text(announcement),
+            ),
+        )
+
+        self.__rows.setdefault(key, {})[announcement.id] = cursor.lastrowid
+
+    def __delete(self, connection: sqlite3.Connection, course: Course, id: str):
+        """Removes the announcement from the index (if it is there)"""
+
+        row = self.__rows.get(FeedRegistry.get_key(course), {}).pop(id, None)
+
+        # The other columns can't be searched without the terms, so the announcement is found by its row
+        if row is not None:
+            connection.execute("DELETE FROM announcements WHERE rowid = ?", (row,))
+
+    def __remove_course(self, connection: sqlite3.Connection, course: Course):
+        """Removes the announcements of the course from the index"""
+
+        rows = self.__rows.pop(FeedRegistry.get_key(course), {})
+
+        connection.executemany(
+            "DELETE FROM announcements WHERE rowid = ?",
+            [(row,) for row in rows.values()],
+        )
@@ -0,0 +1,253 @@
+""" Contains the snapshots of the bot data, saved in the background and in a compact format (only written by the "pickle" backend, see `DATABASE_BACKEND`) """
+
+import asyncio
+import atexit
+import marshal
+import os
+import zlib
+from typing import Any, Callable
+
+from constants import SNAPSHOT_DELAY
+
+from .announcement import Announcement
+from .course import Course
+from .fetcher import FeedValidators
+from .registry import FeedRegistry
+
+SNAPSHOT_MAGIC = b"ISTB"
+""" The first bytes of every snapshot file """
+
+SNAPSHOT_VERSION = 1
+""" The version of the snapshot format (increase it whenever `encode_snapshot` changes) """
+
+
+class SnapshotManager:
+    """
+    Saves the bot data a short time after it changes, so many changes in a row are saved at once.
+    The data is encoded and written in a worker thread and the file is replaced atomically.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capture: Callable[[], Any],
+        encode: Callable[[Any], bytes],
+        delay: float = SNAPSHOT_DELAY,
+    ) -> None:
+
+        self.__path = path
+        self.__capture = capture
+        self.__encode = encode
+        self.__delay = delay
+
+        self.__dirty = False
+        self.__task: asyncio.Task = None
+
+        # Save the changes still waiting for the delay when the bot stops
+        atexit.register(self.flush)
+
+    def mark_dirty(self):
+        """Schedules the data to be saved (outside the event loop the data is saved right away)"""
+
+        self.__dirty = True
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        if self.__task is None or self.__task.done():
+            self.__task = loop.create_task(self.__save_later())
+
+    async def __save_later(self):
+        """Saves the data after the delay, as long as there are changes"""
+
+        while self.__dirty:
+            await asyncio.sleep(self.__delay)
+
+            # Captured in the event loop (cheap) so the data doesn't change while being encoded
+            self.__dirty = False
+            captured = self.__capture()
+
+            try:
+                await asyncio.to_thread(self.__write, captured)
+            except OSError as e:
+                print(f"Failed to save the snapshot '{self.__path}': {e!r}")
+                self.__dirty = True
+
+    def flush(self):
+        """Saves the data right away if there are changes waiting to be saved"""
+
+        if self.__dirty:
+            self.__dirty = False
+            self.__write(self.__capture())
+
+    def __write(self, captured: Any):
+        """Encodes and writes the data to a temporary file, which then replaces the snapshot"""
+
+        data = self.__encode(captured)
+        temp_path = self.__path + ".tmp"
+
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.replace(temp_path, self.__path)
+
+    def read(self) -> bytes | None:
+        """Returns the content of the snapshot (or `None` if there isn't one)"""
+
+        if not os.path.exists(self.__path):
+            return None
+
+        with open(self.__path, "rb") as snapshot_file:
+            return snapshot_file.read()
+
+
+def capture_snapshot(data: dict[int, list[Course]], registry: FeedRegistry) -> tuple:
+    """Returns a copy of the data (and the channel of each course) that can be encoded while the courses keep changing"""
+
+    courses = {id(course): course for courses in data.values() for course in courses}
+
+    return (
+        [
+            (
+                guild_id,
+                [id(course) for course in courses],
+                [registry.get_channel_id(guild_id, course) for course in courses],
+            )
+            for guild_id, courses in data.items()
+        ],
+        [
+            (
+                key,
+                course.link,
+                course.validators,
+                course.full_scan_pending,
+                dict(course.fingerprints) if course.fingerprints is not None else None,
+                list(course.announcements),
+            )
+            for key, course in courses.items()
+        ],
+    )
+
+
+def encode_snapshot(captured: tuple) -> bytes:
+    """Encodes the data returned by `capture_snapshot`"""
+
+    guilds, courses = captured
+
+    encoded_courses = []
+    for (
+        key,
+        link,
+        validators,
+        full_scan_pending,
+        fingerprints,
+        announcements,
+    ) in courses:
+        validators = validators or FeedValidators()
+
+        encoded_courses.append(
+            (
+                key,
+                link,
+                validators.etag,
+                validators.last_modified,
+                validators.body_hash,
+                full_scan_pending,
+                fingerprints,
+                tuple(
+                    (
+                        announcement.id,
+                        announcement.title,
+                        announcement.compressed_description,
+                        announcement.description_hash,
+                        announcement.link,
+                        announcement.author,
+                        announcement.pub_date,
+                        announcement.utc_offset,
+                    )
+                    for announcement in announcements
+                ),
+            )
+        )
+
+    # Only builtin types are encoded, which marshal reads much faster than pickle reads objects
+    payload = marshal.dumps((tuple(guilds), tuple(encoded_courses)))
+
+    return SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) + zlib.compress(payload, 1)
+
+
+def decode_snapshot(
+    snapshot: bytes,
+) -> tuple[dict[int, list[Course]], dict[tuple[int, str], int]]:
+    """Decodes a snapshot created by `encode_snapshot`, returning the data and the channel IDs (indexed by the guild ID and feed key)"""
+
+    header_size = len(SNAPSHOT_MAGIC) + 1
+
+    if snapshot[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError("Invalid snapshot file.")
+
+    version = snapshot[len(SNAPSHOT_MAGIC)]
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+
+    guilds, encoded_courses = marshal.loads(zlib.decompress(snapshot[header_size:]))
+
+    courses = {}
+    for (
+        key,
+        link,
+        etag,
+        last_modified,
+        body_hash,
+        full_scan_pending,
+        fingerprints,
+        announcements,
+    ) in encoded_courses:
+
+        restored = [
+            Announcement.from_backup(
+                id=id,
+                title=title,
+                description=description,
+                description_hash=description_hash,
+                link=announcement_link,
+                author=author,
+                pub_date=pub_date,
+                utc_offset=utc_offset,
+            )
+            for (
+                id,
+                title,
+                description,
+                description_hash,
+                announcement_link,
+                author,
+                pub_date,
+                utc_offset,
+            ) in announcements
+        ]
+
+        courses[key] = Course.from_backup(
+            link=link,
+            announcements=restored,
+            fingerprints=fingerprints,
+            validators=FeedValidators(
+                etag=etag, last_modified=last_modified, body_hash=body_hash
+            ),
+            full_scan_pending=full_scan_pending,
+        )
+
+    data = {guild_id: [courses[key] for key in keys] for guild_id, keys, _ in guilds}
+    channel_ids = {
+        (guild_id, FeedRegistry.get_key(courses[key])): channel_id
+        for guild_id, keys, guild_channel_ids in guilds
+        for key, channel_id in zip(keys, guild_channel_ids)
+        if channel_id is not None
+    }
+
+    return data, channel_ids
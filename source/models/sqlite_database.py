@@ -0,0 +1,550 @@
+import asyncio
+import atexit
+import os
+import pickle
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable
+
+from constants import SNAPSHOT_DELAY
+from discord import Guild
+
+from .announcement import Announcement, AnnouncementActions
+from .course import Course
+from .database import Database
+from .fetcher import FeedValidators
+from .registry import FeedRegistry
+from .snapshot import decode_snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guilds (
+    id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS courses (
+    key TEXT PRIMARY KEY,
+    link TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash BLOB,
+    full_scan_pending INTEGER NOT NULL DEFAULT 0,
+    has_fingerprints INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    guild_id INTEGER NOT NULL REFERENCES guilds (id) ON DELETE CASCADE,
+    course_key TEXT NOT NULL REFERENCES courses (key) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    channel_id INTEGER,
+    PRIMARY KEY (guild_id, course_key)
+);
+
+CREATE INDEX IF NOT EXISTS subscriptions_course ON subscriptions (course_key);
+
+CREATE TABLE IF NOT EXISTS announcements (
+    course_key TEXT NOT NULL REFERENCES courses (key) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    fingerprint BLOB,
+    title TEXT NOT NULL,
+    description BLOB NOT NULL,
+    description_hash BLOB,
+    link TEXT NOT NULL,
+    author TEXT NOT NULL,
+    pub_date INTEGER NOT NULL,
+    utc_offset INTEGER NOT NULL,
+    PRIMARY KEY (course_key, id)
+);
+"""
+""" The tables of the database (the announcements are saved as they are kept in memory, with the description compressed, see `Announcement`) """
+
+
+class SQLiteDatabase(Database):
+    """
+    Same as `Database` but only the changes are saved, in a SQLite database, instead of rewriting the whole backup
+
+    The rows of each change are captured in the event loop and written by a background thread, which waits
+    `delay` seconds for more changes so they are saved together in a single transaction
+    """
+
+    __DATABASE_FILE = "db.sqlite"
+    __SNAPSHOT_BACKUP_FILE = "db.snapshot"
+    __PICKLE_BACKUP_FILE = "db.pkl"
+
+    def __init__(self, path: str = None, delay: float = SNAPSHOT_DELAY) -> None:
+
+        super().__init__()
+
+        self.__path = path if path is not None else self.__DATABASE_FILE
+        self.__delay = delay
+        self.__connection: sqlite3.Connection = None
+
+        # The changes waiting to be saved (an event is set once the changes before it are saved, `None` stops the writer)
+        self.__pending: queue.SimpleQueue[
+            Callable[[sqlite3.Connection], None] | threading.Event | None
+        ] = queue.SimpleQueue()
+        self.__writer: threading.Thread = None
+
+        # The courses from older backups, which only get fingerprints after their first update (indexed by the feed key)
+        self.__without_fingerprints: set[str] = set()
+
+    def __connect(self) -> sqlite3.Connection:
+        """Returns the connection to the database, opening it if needed"""
+
+        if self.__connection is None:
+            # Used by the thread that loads the backup at startup and then by the writer, never at the same time
+            self.__connection = sqlite3.connect(self.__path, check_same_thread=False)
+
+            # WAL mode so a crash in the middle of a write never corrupts the database
+            self.__connection.execute("PRAGMA journal_mode = WAL")
+            self.__connection.execute("PRAGMA synchronous = NORMAL")
+            self.__connection.execute("PRAGMA foreign_keys = ON")
+            self.__connection.executescript(SCHEMA)
+
+        return self.__connection
+
+    def add_course(self, guild: Guild, course_link: str) -> Course:
+        """Adds a course to a guild"""
+
+        course = super().add_course(guild=guild, course_link=course_link)
+
+        guild_id = guild.id
+        link = course.link
+        course_row = self.__get_course_row(course)
+        position = len(self.get_courses_list(guild))
+
+        def save(connection: sqlite3.Connection):
+            connection.execute(
+                "INSERT OR IGNORE INTO guilds (id) VALUES (?)", (guild_id,)
+            )
+            self.__insert_course(connection, link, course_row)
+            connection.execute(
+                "INSERT INTO subscriptions (guild_id, course_key, position) VALUES (?, ?, ?)",
+                (guild_id, course_row[-1], position),
+            )
+
+        self.__submit(save)
+
+        return course
+
+    def remove_course(self, guild: Guild, course_name: str):
+        """Removes a course from a guild"""
+
+        removed = [
+            course
+            for course in self.get_courses_list(guild)
+            if course.name == course_name
+        ]
+
+        super().remove_course(guild=guild, course_name=course_name)
+
+        guild_id = guild.id
+
+        # The course (and its announcements) is forgotten once there are no subscribers left
+        removed_keys = [
+            (FeedRegistry.get_key(course), len(self.get_subscribers(course)) == 0)
+            for course in removed
+        ]
+
+        def save(connection: sqlite3.Connection):
+            for key, forget in removed_keys:
+                connection.execute(
+                    "DELETE FROM subscriptions WHERE guild_id = ? AND course_key = ?",
+                    (guild_id, key),
+                )
+
+                if forget:
+                    connection.execute("DELETE FROM courses WHERE key = ?", (key,))
+
+        self.__submit(save)
+
+    def set_channel_id(self, guild: Guild, course: Course, channel_id: int):
+        """Stores the ID of the channel of `course` in the guild, so it is found even if renamed"""
+
+        super().set_channel_id(guild=guild, course=course, channel_id=channel_id)
+
+        row = (channel_id, guild.id, FeedRegistry.get_key(course))
+
+        self.__submit(
+            lambda connection: connection.execute(
+                "UPDATE subscriptions SET channel_id = ? WHERE guild_id = ? AND course_key = ?",
+                row,
+            )
+        )
+
+    def save_course(
+        self,
+        course: Course,
+        changes: list[dict[str, Announcement | AnnouncementActions]],
+    ):
+        """Saves the changes of a course after it is updated"""
+
+        super().save_course(course=course, changes=changes)
+
+        key = FeedRegistry.get_key(course)
+        course_row = self.__get_course_row(course)
+
+        # Courses from older backups only get fingerprints after their first update
+        fingerprint_rows = []
+        if key in self.__without_fingerprints and course.fingerprints is not None:
+            self.__without_fingerprints.discard(key)
+            fingerprint_rows = [(fp, key, id) for id, fp in course.fingerprints.items()]
+
+        deleted_rows = []
+        announcement_rows = []
+        for change in changes:
+            announcement = change["announcement"]
+
+            if change["action"] == AnnouncementActions.DELETED:
+                deleted_rows.append((key, announcement.id))
+            else:
+                announcement_rows.append(
+                    self.__get_announcement_row(course, announcement)
+                )
+
+        def save(connection: sqlite3.Connection):
+            connection.executemany(
+                "UPDATE announcements SET fingerprint = ? WHERE course_key = ? AND id = ?",
+                fingerprint_rows,
+            )
+            self.__update_course(connection, course_row)
+            connection.executemany(
+                "DELETE FROM announcements WHERE course_key = ? AND id = ?",
+                deleted_rows,
+            )
+            self.__insert_announcements(connection, announcement_rows)
+
+        self.__submit(save)
+
+    def save_backup(self):
+        """Nothing to do, as every change is already being saved"""
+
+    def __submit(self, save: Callable[[sqlite3.Connection], None]):
+        """Queues a change to be saved by the writer (outside the event loop the change is saved right away)"""
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            self.__save([save])
+            return
+
+        if self.__writer is None:
+            self.__writer = threading.Thread(
+                target=self.__write_pending, name="database", daemon=True
+            )
+            self.__writer.start()
+
+            # Save the changes still waiting for the delay when the bot stops
+            atexit.register(self.close)
+
+        self.__pending.put(save)
+
+    def __write_pending(self):
+        """Saves the queued changes until the database is closed (runs in a separate thread)"""
+
+        stopped = False
+
+        while not stopped:
+            changes = []
+            saved_events = []
+
+            change = self.__pending.get()
+            deadline = time.monotonic() + self.__delay
+
+            # Waits for more changes, unless the changes are needed right away (see `flush`)
+            while True:
+                if change is None:
+                    stopped = True
+                    break
+                if isinstance(change, threading.Event):
+                    saved_events.append(change)
+                    break
+
+                changes.append(change)
+
+                try:
+                    change = self.__pending.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+
+            self.__save(changes)
+
+            for event in saved_events:
+                event.set()
+
+    def __save(self, changes: list[Callable[[sqlite3.Connection], None]]):
+        """Saves the changes in a single transaction (or one at a time if that fails, so only the change that failed is lost)"""
+
+        if len(changes) == 0:
+            return
+
+        try:
+            with self.__connect() as connection:
+                for save in changes:
+                    save(connection)
+            return
+        except sqlite3.Error as e:
+            if len(changes) == 1:
+                print(f"Failed to save a change in '{self.__path}': {e!r}")
+                return
+
+        for save in changes:
+            self.__save([save])
+
+    def flush(self):
+        """Waits until the changes queued are saved"""
+
+        if self.__writer is None:
+            return
+
+        saved = threading.Event()
+        self.__pending.put(saved)
+        saved.wait()
+
+    def close(self):
+        """Saves the changes still queued and stops the writer"""
+
+        if self.__writer is None:
+            return
+
+        self.__pending.put(None)
+        self.__writer.join()
+        self.__writer = None
+
+    def try_load_backup(self):
+        """Tries to load the database, importing the backup of the "pickle" backend if there is one and the database doesn't exist yet (returns a boolean representing whether it was successful or not)"""
+
+        existed = os.path.exists(self.__path)
+
+        # The snapshot is newer than the pickle (only written by older versions)
+        if not existed and os.path.exists(self.__SNAPSHOT_BACKUP_FILE):
+            self.import_snapshot_backup(self.__SNAPSHOT_BACKUP_FILE)
+            existed = True
+        elif not existed and os.path.exists(self.__PICKLE_BACKUP_FILE):
+            self.import_pickle_backup(self.__PICKLE_BACKUP_FILE)
+            existed = True
+
+        # Connecting creates the database file, so the next startup resumes from it
+        self.__connect()
+
+        if not existed:
+            return False
+
+        self._restore(*self.__load())
+
+        return True
+
+    def import_pickle_backup(self, path: str):
+        """Imports the backup file of older versions of `Database` into the database (to be done only once)"""
+
+        with open(path, "rb") as backup_file:
+            data: dict[int, list[Course]] = pickle.load(backup_file)
+
+        self.__import(data, channel_ids={})
+
+        print(f"Imported '{path}' into '{self.__path}'")
+
+    def import_snapshot_backup(self, path: str):
+        """Imports the snapshot of `Database` into the database (to be done only once)"""
+
+        with open(path, "rb") as snapshot_file:
+            data, channel_ids = decode_snapshot(snapshot_file.read())
+
+        self.__import(data, channel_ids)
+
+        print(f"Imported '{path}' into '{self.__path}'")
+
+    def __import(
+        self,
+        data: dict[int, list[Course]],
+        channel_ids: dict[tuple[int, str], int],
+    ):
+        """Saves the courses of each guild (indexed by the guild ID) and their channel IDs (indexed by the guild ID and feed key)"""
+
+        with self.__connect() as connection:
+            for guild_id, courses in data.items():
+                connection.execute(
+                    "INSERT OR IGNORE INTO guilds (id) VALUES (?)", (guild_id,)
+                )
+
+                for position, course in enumerate(courses):
+                    key = FeedRegistry.get_key(course)
+
+                    # Older backups have a different course object per guild, so the first one is kept
+                    if self.__insert_course(
+                        connection, course.link, self.__get_course_row(course)
+                    ):
+                        self.__insert_announcements(
+                            connection,
+                            [
+                                self.__get_announcement_row(course, announcement)
+                                for announcement in course.announcements
+                            ],
+                        )
+
+                    connection.execute(
+                        "INSERT OR IGNORE INTO subscriptions (guild_id, course_key, position, channel_id) VALUES (?, ?, ?, ?)",
+                        (guild_id, key, position, channel_ids.get((guild_id, key))),
+                    )
+
+    def __load(
+        self,
+    ) -> tuple[dict[int, list[Course]], dict[tuple[int, str], int]]:
+        """Reads every course from the database (indexed by the guild ID) and the channel IDs (indexed by the guild ID and feed key)"""
+
+        connection = self.__connect()
+
+        courses: dict[str, Course] = {}
+        for (
+            key,
+            link,
+            etag,
+            last_modified,
+            body_hash,
+            full_scan_pending,
+            has_fingerprints,
+        ) in connection.execute(
+            "SELECT key, link, etag, last_modified, body_hash, full_scan_pending, has_fingerprints FROM courses"
+        ):
+            courses[key] = Course.from_backup(
+                link=link,
+                announcements=[],
+                fingerprints={} if has_fingerprints else None,
+                validators=FeedValidators(
+                    etag=etag, last_modified=last_modified, body_hash=body_hash
+                ),
+                full_scan_pending=bool(full_scan_pending),
+            )
+
+            if not has_fingerprints:
+                self.__without_fingerprints.add(key)
+
+        for (
+            key,
+            id,
+            fingerprint,
+            title,
+            description,
+            description_hash,
+            link,
+            author,
+            pub_date,
+            utc_offset,
+        ) in connection.execute(
+            "SELECT course_key, id, fingerprint, title, description, description_hash, link, author, pub_date, utc_offset FROM announcements"
+        ):
+            course = courses[key]
+
+            # Restored as saved, without parsing the date or compressing the description again
+            announcement = Announcement.from_backup(
+                id=id,
+                title=title,
+                description=description,
+                description_hash=description_hash,
+                link=link,
+                author=author,
+                pub_date=pub_date,
+                utc_offset=utc_offset,
+            )
+
+            course.announcements.append(announcement)
+            if course.fingerprints is not None and fingerprint is not None:
+                course.fingerprints[id] = fingerprint
+
+        for course in courses.values():
+            course.announcements.sort(key=lambda announcement: announcement.pub_date)
+
+        data: dict[int, list[Course]] = {}
+        channel_ids: dict[tuple[int, str], int] = {}
+        for guild_id, key, channel_id in connection.execute(
+            "SELECT guild_id, course_key, channel_id FROM subscriptions ORDER BY guild_id, position"
+        ):
+            data.setdefault(guild_id, []).append(courses[key])
+
+            if channel_id is not None:
+                channel_ids[(guild_id, key)] = channel_id
+
+        return data, channel_ids
+
+    def __get_course_row(self, course: Course) -> tuple:
+        """Returns the state of the course feed, as saved by `__update_course` (the feed key is the last column)"""
+
+        validators = course.validators or FeedValidators()
+
+        return (
+            validators.etag,
+            validators.last_modified,
+            validators.body_hash,
+            int(course.full_scan_pending),
+            int(course.fingerprints is not None),
+            FeedRegistry.get_key(course),
+        )
+
+    def __get_announcement_row(
+        self, course: Course, announcement: Announcement
+    ) -> tuple:
+        """Returns the announcement of the course, as saved by `__insert_announcements`"""
+
+        return (
+            FeedRegistry.get_key(course),
+            announcement.id,
+            (course.fingerprints or {}).get(announcement.id),
+            announcement.title,
+            announcement.compressed_description,
+            announcement.description_hash,
+            announcement.link,
+            announcement.author,
+            announcement.pub_date,
+            announcement.utc_offset,
+        )
+
+    def __insert_course(
+        self, connection: sqlite3.Connection, link: str, course_row: tuple
+    ) -> bool:
+        """Inserts the course if it doesn't exist yet (returns whether it was inserted)"""
+
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO courses (key, link) VALUES (?, ?)",
+            (course_row[-1], link),
+        )
+
+        if cursor.rowcount == 0:
+            return False
+
+        self.__update_course(connection, course_row)
+
+        return True
+
+    def __update_course(self, connection: sqlite3.Connection, course_row: tuple):
+        """Saves the state of the course feed (see `__get_course_row`)"""
+
+        connection.execute(
+            "UPDATE courses SET etag = ?, last_modified = ?, body_hash = ?, full_scan_pending = ?, has_fingerprints = ? WHERE key = ?",
+            course_row,
+        )
+
+    def __insert_announcements(
+        self, connection: sqlite3.Connection, announcement_rows: list[tuple]
+    ):
+        """Inserts or replaces the announcements (see `__get_announcement_row`)"""
+
+        connection.executemany(
+            "INSERT OR REPLACE INTO announcements (course_key, id, fingerprint, title, description, description_hash, link, author, pub_date, utc_offset) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            announcement_rows,
+        )
+
+
+if __name__ == "__main__":
+    # One-shot migration, run from the `source` folder: python -m models.sqlite_database [db.pkl | db.snapshot] [db.sqlite]
+    backup_path = sys.argv[1] if len(sys.argv) > 1 else "db.pkl"
+    database_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    if backup_path.endswith(".snapshot"):
+        SQLiteDatabase(path=database_path).import_snapshot_backup(backup_path)
+    else:
+        SQLiteDatabase(path=database_path).import_pickle_backup(backup_path)
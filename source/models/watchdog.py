@@ -0,0 +1,174 @@
+""" Contains the watchdog that detects when the event loop is blocked (and by what) """
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+
+from constants import LOOP_LAG_THRESHOLD, WATCHDOG_INTERVAL
+
+from .metrics import metrics
+
+STACK_LIMIT = 12
+""" The number of frames (the innermost ones) of the stacks reported """
+
+
+class LoopWatchdog:
+    """
+    Measures how late the event loop runs a heartbeat, which is how long it was blocked (by code that doesn't await)
+
+    While the loop is blocked, a thread samples the stack of the loop and the steps being done by the task
+    running (see `step`), so the report says what blocked it instead of only that the gateway disconnected
+    """
+
+    def __init__(
+        self, threshold: float = LOOP_LAG_THRESHOLD, interval: float = WATCHDOG_INTERVAL
+    ) -> None:
+
+        self.__threshold = threshold
+        self.__interval = interval
+
+        # Set when started, as they belong to the running loop
+        self.__loop: asyncio.AbstractEventLoop = None
+        self.__loop_thread_id: int = None
+        self.__heartbeat_task: asyncio.Task = None
+        self.__sampler: threading.Thread = None
+        self.__stopped = threading.Event()
+
+        # When the loop last ran the heartbeat (written by the loop, read by the sampler)
+        self.__last_beat = 0.0
+
+        # What each task is doing, the label (for example the command) and the steps inside it (see `step`)
+        self.__labels: weakref.WeakKeyDictionary[
+            asyncio.Task, str
+        ] = weakref.WeakKeyDictionary()
+        self.__steps: weakref.WeakKeyDictionary[
+            asyncio.Task, list[str]
+        ] = weakref.WeakKeyDictionary()
+
+        # The samples taken during the current stall, (steps, stack) to the number of times they were seen
+        self.__samples: Counter[tuple[str, str]] = Counter()
+        self.__samples_lock = threading.Lock()
+
+    def start(self):
+        """Starts watching the running event loop"""
+
+        if self.__heartbeat_task is not None:
+            return
+
+        self.__loop = asyncio.get_running_loop()
+        self.__loop_thread_id = threading.get_ident()
+        self.__last_beat = time.monotonic()
+        self.__stopped.clear()
+
+        self.__heartbeat_task = self.__loop.create_task(self.__heartbeat())
+        self.__sampler = threading.Thread(
+            target=self.__sample, name="watchdog", daemon=True
+        )
+        self.__sampler.start()
+
+    def stop(self):
+        """Stops watching the event loop"""
+
+        if self.__heartbeat_task is None:
+            return
+
+        self.__stopped.set()
+        self.__heartbeat_task.cancel()
+        self.__heartbeat_task = None
+
+    def label_task(self, label: str):
+        """Describes what the current task is doing (for example, the command it runs)"""
+
+        task = asyncio.current_task()
+
+        if task is not None:
+            self.__labels[task] = label
+
+    @contextmanager
+    def step(self, description: str):
+        """Registers that the current task is doing this step until the block ends (steps can be nested)"""
+
+        task = asyncio.current_task()
+
+        if task is None:
+            yield
+            return
+
+        steps = self.__steps.setdefault(task, [])
+        steps.append(description)
+
+        try:
+            yield
+        finally:
+            steps.pop()
+
+    def __describe(self, task: asyncio.Task | None) -> str:
+        """Returns what the task is doing"""
+
+        if task is None:
+            return "outside of a task"
+
+        # Copied, as the loop may change them while this runs in the sampler
+        parts = [self.__labels.get(task, task.get_name())]
+        parts += list(self.__steps.get(task, ()))
+
+        return " > ".join(parts)
+
+    async def __heartbeat(self):
+        """Wakes up every interval, measuring how late it was woken up"""
+
+        while True:
+            expected = time.monotonic() + self.__interval
+            await asyncio.sleep(self.__interval)
+
+            self.__last_beat = time.monotonic()
+            lag = max(0.0, self.__last_beat - expected)
+
+            metrics.observe("event_loop_lag_seconds", lag)
+
+            with self.__samples_lock:
+                samples = self.__samples
+                self.__samples = Counter()
+
+            if lag >= self.__threshold:
+                self.__report(lag, samples)
+
+    def __sample(self):
+        """Captures what the loop is doing while it is blocked (runs in a separate thread)"""
+
+        while not self.__stopped.wait(self.__interval):
+            # The heartbeat is only due after its interval
+            if time.monotonic() - self.__last_beat < self.__interval + self.__threshold:
+                continue
+
+            frame = sys._current_frames().get(self.__loop_thread_id)
+            if frame is None:
+                continue
+
+            stack = "".join(traceback.format_stack(frame)[-STACK_LIMIT:])
+            description = self.__describe(asyncio.current_task(self.__loop))
+
+            with self.__samples_lock:
+                self.__samples[(description, stack)] += 1
+
+    def __report(self, lag: float, samples: Counter[tuple[str, str]]):
+        """Logs that the loop was blocked, with the stack seen most often"""
+
+        metrics.inc("event_loop_stalls_total")
+
+        if len(samples) == 0:
+            # Blocked for less than a sampling interval longer than the threshold
+            print(f"Event loop blocked for {lag:.2f} seconds (no stack was captured)")
+            return
+
+        (description, stack), n_seen = samples.most_common(1)[0]
+
+        print(
+            f"Event loop blocked for {lag:.2f} seconds while running: {description}\n"
+            f"Stack seen in {n_seen} of {samples.total()} samples:\n{stack}"
+        )
@@ -0,0 +1,92 @@
+""" Shared helpers of the tests (run from the `source` folder: python -m pytest tests) """
+
+import hashlib
+import os
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# The bot runs from the `source` folder (see `main.py`), so its modules are imported the same way here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.course import Course
+from models.fetcher import FeedResponse, FeedValidators
+from models.parser import FeedItem
+
+FEED_TAGS = ("title", "description", "link", "author", "pubDate")
+""" The tag of each field of `FeedItem` in the feed """
+
+
+def get_course_link(name: str = "TEST") -> str:
+    """Returns the link of a course of the current school year (the only ones that can be added)"""
+
+    now = datetime.now()
+    start = now.year if now.month >= 9 else now.year - 1
+
+    return f"https://fenix.tecnico.ulisboa.pt/disciplinas/{name}/{start}-{start + 1}/1-semestre"
+
+
+def make_course(name: str = "TEST") -> Course:
+    """Returns a course without announcements"""
+
+    return Course(link=get_course_link(name))
+
+
+@asynccontextmanager
+async def serve(
+    handler: Callable[[web.Request], Awaitable[web.Response]]
+) -> AsyncIterator[str]:
+    """Answers the requests to a local server with `handler`, returning its link while it runs"""
+
+    app = web.Application()
+    app.router.add_get("/feed", handler)
+
+    async with TestServer(app) as server:
+        yield str(server.make_url("/feed"))
+
+
+def make_item(day: int, title: str = None, description: str = None) -> FeedItem:
+    """Returns a feed item published on the `day` of September 2024 (the day identifies the announcement)"""
+
+    return FeedItem(
+        title=title if title is not None else f"Announcement {day}",
+        description=(
+            description if description is not None else f"<p>Content {day}</p>"
+        ),
+        link=f"https://fenix.tecnico.ulisboa.pt/disciplinas/TEST/2024-2025/1-semestre/{day}",
+        author="someone@tecnico.ulisboa.pt (Someone)",
+        pub_date=f"Mon, {day:02d} Sep 2024 10:00:00 +0100",
+    )
+
+
+def build_feed(items: list[FeedItem]) -> bytes:
+    """Returns a feed with the items (newest first, like Fenix)"""
+
+    entries = "".join(
+        "<item>"
+        + "".join(
+            f"<{tag}>{escape(value)}</{tag}>" for tag, value in zip(FEED_TAGS, item)
+        )
+        + "</item>"
+        for item in items[::-1]
+    )
+
+    return f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>{entries}</channel></rss>'.encode()
+
+
+def make_feed(items: list[FeedItem]) -> FeedResponse:
+    """Returns the response of a feed with the items (as fetched for the first time)"""
+
+    body = build_feed(items)
+
+    return FeedResponse(
+        body=body,
+        validators=FeedValidators(
+            body_hash=hashlib.blake2b(body, digest_size=16).digest()
+        ),
+    )
@@ -0,0 +1,47 @@
+""" Tests the preparation of the guilds at startup """
+
+import asyncio
+from types import SimpleNamespace
+
+import discord_bot.bootstrap as bootstrap
+from constants import MANAGE_CHANNEL
+
+
+class NewGuild:
+    """A guild without the bot category, whose cache doesn't have the channels created yet (like before their events arrive)"""
+
+    def __init__(self) -> None:
+
+        self.id = 1
+        self.name = "New guild"
+        self.categories = []
+        self.default_role = object()
+        self.me = object()
+        self.created: list[str] = []
+
+    def get_channel(self, id: int):
+        return None
+
+    async def create_category(self, name: str):
+        self.created.append(name)
+        return SimpleNamespace(id=len(self.created), name=name, channels=[])
+
+    async def create_text_channel(self, name: str, category, overwrites):
+        self.created.append(name)
+        return SimpleNamespace(id=len(self.created), name=name)
+
+
+def test_reconcile_new_guild(monkeypatch):
+    guild = NewGuild()
+    welcomed = []
+
+    async def send_welcome(channel):
+        welcomed.append(channel.name)
+
+    monkeypatch.setattr(bootstrap, "send_welcome", send_welcome)
+    monkeypatch.setattr(bootstrap.db, "get_courses_list", lambda guild: [])
+
+    asyncio.run(bootstrap.reconcile_guild(guild))
+
+    assert guild.created[-1] == MANAGE_CHANNEL
+    assert welcomed == [MANAGE_CHANNEL]
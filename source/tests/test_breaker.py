@@ -0,0 +1,99 @@
+""" Tests the circuit breaker of the feeds """
+
+import time
+
+import pytest
+from constants import RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from models.breaker import CircuitBreaker, CircuitState, get_retry_delay
+
+
+def make_open_breaker() -> CircuitBreaker:
+    """Returns a breaker that was just opened"""
+
+    breaker = CircuitBreaker(name="test", threshold=3)
+
+    for _ in range(3):
+        breaker.record_failure(ValueError("Server error"))
+
+    return breaker
+
+
+def test_opens_at_the_threshold():
+    breaker = CircuitBreaker(name="test", threshold=3)
+
+    for _ in range(2):
+        breaker.record_failure(ValueError("Server error"))
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.allow()
+
+    breaker.record_failure(ValueError("Server error"))
+
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.failures == 3
+    assert breaker.last_error == "Server error"
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failures():
+    breaker = CircuitBreaker(name="test", threshold=3)
+
+    breaker.record_failure(ValueError("Server error"))
+    breaker.record_success()
+
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.failures == 0
+    assert breaker.last_error is None
+
+
+def test_half_open_allows_a_single_retry():
+    breaker = make_open_breaker()
+    breaker.retry_at = time.monotonic() - 1
+
+    assert breaker.allow()
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_failure_opens_again():
+    breaker = make_open_breaker()
+    breaker.retry_at = time.monotonic() - 1
+    breaker.allow()
+
+    delay = breaker.record_failure(ValueError("Still failing"))
+
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.failures == 4
+    assert breaker.retry_at == pytest.approx(time.monotonic() + delay, abs=1)
+    assert not breaker.allow()
+
+
+def test_half_open_success_closes():
+    breaker = make_open_breaker()
+    breaker.retry_at = time.monotonic() - 1
+    breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_lost_retry_is_allowed_again():
+    breaker = make_open_breaker()
+    breaker.retry_at = time.monotonic() - 1
+    breaker.allow()
+
+    # The result of the retry never arrived
+    breaker.retry_at = time.monotonic() - 1
+
+    assert breaker.allow()
+    assert breaker.state == CircuitState.HALF_OPEN
+
+
+@pytest.mark.parametrize("failures", [1, 2, 3, 5, 10, 100])
+def test_retry_delay(failures):
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (failures - 1))
+
+    for _ in range(100):
+        assert delay / 2 <= get_retry_delay(failures) <= delay
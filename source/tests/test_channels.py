@@ -0,0 +1,120 @@
+""" Tests the index of the bot channels of each guild """
+
+from types import SimpleNamespace
+
+from constants import CATEGORY_NAME
+from utils import find_channel, forget_channel_index, get_bot_category
+
+
+class FakeGuild:
+    """Contains the categories and channels of a guild, like the cache of discord.py"""
+
+    def __init__(self, id: int, channel_names: list[str]) -> None:
+
+        self.id = id
+        self.categories = []
+        self.channels: dict[int, SimpleNamespace] = dict()
+        self.lookups = 0
+
+        self.add_category(CATEGORY_NAME, channel_names)
+
+        # The indexes are kept between tests, as they are global
+        forget_channel_index(self)
+
+    def add_category(self, name: str, channel_names: list[str]) -> SimpleNamespace:
+        """Adds a category and its channels"""
+
+        category = SimpleNamespace(id=len(self.channels) + 1, name=name, channels=[])
+        self.channels[category.id] = category
+        self.categories.append(category)
+
+        for channel_name in channel_names:
+            self.add_channel(category, channel_name)
+
+        return category
+
+    def add_channel(self, category: SimpleNamespace, name: str) -> SimpleNamespace:
+        """Adds a channel to the category"""
+
+        channel = SimpleNamespace(id=len(self.channels) + 1, name=name)
+        self.channels[channel.id] = channel
+        category.channels.append(channel)
+
+        return channel
+
+    def delete(self, channel: SimpleNamespace):
+        """Deletes a channel or category"""
+
+        del self.channels[channel.id]
+
+        for category in self.categories:
+            if channel in category.channels:
+                category.channels.remove(channel)
+
+        if channel in self.categories:
+            self.categories.remove(channel)
+
+    def get_channel(self, id: int) -> SimpleNamespace | None:
+        self.lookups += 1
+        return self.channels.get(id)
+
+
+def test_channels_are_found():
+    guild = FakeGuild(1, ["manage", "course-a"])
+
+    assert get_bot_category(guild) is guild.categories[0]
+    assert find_channel(guild, "course-a").name == "course-a"
+    assert find_channel(guild, "course-b") is None
+
+
+def test_missing_category():
+    guild = FakeGuild(2, [])
+    guild.delete(guild.categories[0])
+
+    assert get_bot_category(guild) is None
+    assert find_channel(guild, "manage") is None
+
+
+def test_index_is_only_built_again_when_forgotten():
+    guild = FakeGuild(3, ["manage"])
+    category = get_bot_category(guild)
+
+    guild.add_channel(category, "course-a")
+
+    # The channel events forget the index, until then the new channel isn't known
+    assert find_channel(guild, "course-a") is None
+
+    forget_channel_index(guild)
+    assert find_channel(guild, "course-a").name == "course-a"
+
+
+def test_deleted_channels_are_noticed():
+    guild = FakeGuild(4, ["manage", "course-a"])
+    channel = find_channel(guild, "course-a")
+
+    # Deleted while the event was missed
+    guild.delete(channel)
+
+    assert find_channel(guild, "course-a") is None
+
+
+def test_recreated_category_is_found():
+    guild = FakeGuild(5, ["manage"])
+    get_bot_category(guild)
+
+    guild.delete(guild.categories[0])
+    category = guild.add_category(CATEGORY_NAME, ["manage"])
+
+    assert get_bot_category(guild) is category
+    assert find_channel(guild, "manage") is category.channels[0]
+
+
+def test_renamed_channel_is_found_by_id():
+    guild = FakeGuild(6, ["manage", "course-a"])
+    channel = find_channel(guild, "course-a")
+
+    channel.name = "renamed"
+    forget_channel_index(guild)
+
+    assert find_channel(guild, "course-a") is None
+    assert find_channel(guild, "course-a", channel_id=channel.id) is channel
@@ -0,0 +1,145 @@
+""" Tests the delivery queue of the messages """
+
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+import pytest
+from constants import MESSAGE_LIMIT
+from discord_bot.delivery import MESSAGE_SEPARATOR, DeliveryQueue, RateBucket
+
+
+class FakeChannel:
+    """Keeps the messages sent to it instead of sending them to Discord"""
+
+    def __init__(self, id: int, failures: int = 0, error: Exception = None) -> None:
+
+        self.id = id
+        self.name = f"channel-{id}"
+        self.messages: list[str] = []
+
+        # The number of messages that fail (with `error`) before the channel works
+        self.failures = failures
+        self.error = error or discord.HTTPException(
+            SimpleNamespace(status=403, reason="Forbidden"), "Missing Permissions"
+        )
+
+    async def send(self, content: str):
+        if self.failures > 0:
+            self.failures -= 1
+            raise self.error
+
+        self.messages.append(content)
+
+
+def deliver(*alerts_by_channel: tuple[FakeChannel, list[str]]) -> DeliveryQueue:
+    """Queues the alerts of each channel and waits until they are sent"""
+
+    queue = DeliveryQueue()
+
+    async def run():
+        for channel, alerts in alerts_by_channel:
+            queue.enqueue(channel, alerts)
+
+        assert queue.get_depth() == sum(len(alerts) for _, alerts in alerts_by_channel)
+        await queue.join()
+
+    asyncio.run(run())
+
+    return queue
+
+
+def test_alerts_are_packed():
+    channel = FakeChannel(1)
+    alerts = [str(i) * 900 for i in range(6)] + ["small"]
+
+    queue = deliver((channel, alerts))
+
+    assert [message.split(MESSAGE_SEPARATOR) for message in channel.messages] == [
+        alerts[0:2],
+        alerts[2:4],
+        alerts[4:7],
+    ]
+    assert all(len(message) <= MESSAGE_LIMIT for message in channel.messages)
+    assert queue.stats.sent_alerts == 7
+    assert queue.stats.sent_messages == 3
+    assert queue.get_depth() == 0
+
+
+def test_long_alert_is_sent_alone():
+    channel = FakeChannel(1)
+    alerts = ["before", "x" * (MESSAGE_LIMIT - 1), "after"]
+
+    deliver((channel, alerts))
+
+    assert channel.messages == alerts
+
+
+def test_channels_keep_their_order():
+    first, second = FakeChannel(1), FakeChannel(2)
+    first_alerts = [f"first {i}" for i in range(3)]
+    second_alerts = [f"second {i}" for i in range(3)]
+
+    deliver(
+        (first, first_alerts[:2]), (second, second_alerts), (first, first_alerts[2:])
+    )
+
+    assert MESSAGE_SEPARATOR.join(first.messages).split(MESSAGE_SEPARATOR) == (
+        first_alerts
+    )
+    assert MESSAGE_SEPARATOR.join(second.messages).split(MESSAGE_SEPARATOR) == (
+        second_alerts
+    )
+
+
+def test_failed_messages_dont_stop_the_channel():
+    channel = FakeChannel(1, failures=1)
+    alerts = [str(i) * 900 for i in range(4)]
+
+    queue = deliver((channel, alerts))
+
+    assert channel.messages == [MESSAGE_SEPARATOR.join(alerts[2:])]
+    assert queue.stats.failed_alerts == 2
+    assert queue.stats.sent_alerts == 2
+
+
+def test_connection_errors_dont_stop_the_channel():
+    channel = FakeChannel(
+        1, failures=1, error=aiohttp.ClientOSError(104, "Connection reset by peer")
+    )
+    alerts = [str(i) * 900 for i in range(4)]
+
+    queue = deliver((channel, alerts))
+
+    assert channel.messages == [MESSAGE_SEPARATOR.join(alerts[2:])]
+    assert queue.stats.failed_alerts == 2
+
+
+def test_bucket_allows_a_burst():
+    bucket = RateBucket(capacity=5, period=1)
+
+    async def send(n: int):
+        for _ in range(n):
+            await bucket.acquire()
+
+    asyncio.run(send(5))
+
+    # The next message waits until the first one leaves the window
+    assert 0.9 < bucket.get_wait() <= 1
+
+
+def test_bucket_never_exceeds_the_limit():
+    bucket = RateBucket(capacity=3, period=0.1)
+    sent_at = []
+
+    async def send(n: int):
+        for _ in range(n):
+            await bucket.acquire()
+            sent_at.append(bucket.sent_at[-1])
+
+    asyncio.run(send(9))
+
+    # Any `capacity` + 1 messages in a row span at least a period
+    for first, last in zip(sent_at, sent_at[3:]):
+        assert last - first >= 0.1
@@ -0,0 +1,115 @@
+""" Tests the change detection by fingerprints """
+
+from conftest import make_course, make_feed, make_item
+from models.announcement import AnnouncementActions
+from models.diff import diff_fingerprints, get_fingerprint
+
+
+def process(course, items, incremental=False):
+    """Processes a feed with the items, returning the (action, ID) of each change"""
+
+    return [
+        (change["action"], change["announcement"].id)
+        for change in course.process_feed(make_feed(items), incremental=incremental)
+    ]
+
+
+def test_fingerprint_only_depends_on_the_content():
+    item = make_item(1)
+
+    assert get_fingerprint(item) == get_fingerprint(item._replace(link="other"))
+    assert get_fingerprint(item) != get_fingerprint(item._replace(title="Edited"))
+    assert get_fingerprint(item) != get_fingerprint(item._replace(description="x"))
+
+
+def test_diff_fingerprints():
+    old = {"a": b"1", "b": b"2", "c": b"3"}
+    new = {"a": b"1", "b": b"changed", "d": b"4"}
+
+    assert diff_fingerprints(old=old, new=new) == ({"d"}, {"b"}, {"c"})
+
+
+def test_diff_fingerprints_without_changes():
+    fingerprints = {"a": b"1", "b": b"2"}
+
+    assert diff_fingerprints(old=fingerprints, new=dict(fingerprints)) == (
+        set(),
+        set(),
+        set(),
+    )
+
+
+def test_course_detects_added_updated_and_deleted():
+    course = make_course()
+    first, second, third = make_item(1), make_item(2), make_item(3)
+
+    assert process(course, [first, second]) == [
+        (AnnouncementActions.ADDED, first.pub_date),
+        (AnnouncementActions.ADDED, second.pub_date),
+    ]
+
+    changes = process(course, [first._replace(title="Edited"), third])
+
+    assert set(changes) == {
+        (AnnouncementActions.UPDATED, first.pub_date),
+        (AnnouncementActions.ADDED, third.pub_date),
+        (AnnouncementActions.DELETED, second.pub_date),
+    }
+    assert [announcement.title for announcement in course.announcements] == [
+        "Edited",
+        third.title,
+    ]
+
+
+def test_course_without_changes():
+    course = make_course()
+    items = [make_item(1), make_item(2)]
+
+    process(course, items)
+
+    # Same content but a different body (so the body hash doesn't skip it)
+    assert process(course, [item._replace(link="moved") for item in items]) == []
+
+
+def test_course_without_fingerprints():
+    course = make_course()
+    first, second = make_item(1), make_item(2)
+
+    process(course, [first, second])
+
+    # Courses from older backups are compared using their announcements
+    course.fingerprints = None
+
+    assert process(course, [first, second._replace(description="Edited")]) == [
+        (AnnouncementActions.UPDATED, second.pub_date)
+    ]
+    assert course.fingerprints == {
+        first.pub_date: get_fingerprint(first),
+        second.pub_date: get_fingerprint(second._replace(description="Edited")),
+    }
+
+
+def test_incremental_read_only_adds():
+    course = make_course()
+    first, second, third = make_item(1), make_item(2), make_item(3)
+
+    process(course, [first, second])
+
+    assert process(course, [first, second, third], incremental=True) == [
+        (AnnouncementActions.ADDED, third.pub_date)
+    ]
+    assert course.full_scan_pending
+
+
+def test_incremental_read_finds_updates_when_nothing_is_new():
+    course = make_course()
+    first, second = make_item(1), make_item(2)
+
+    process(course, [first, second])
+
+    assert process(course, [first._replace(title="Edited"), second], True) == [
+        (AnnouncementActions.UPDATED, first.pub_date)
+    ]
+    assert process(course, [second], True) == [
+        (AnnouncementActions.DELETED, first.pub_date)
+    ]
@@ -0,0 +1,143 @@
+""" Tests the asynchronous fetcher of the feeds """
+
+import asyncio
+import hashlib
+
+import pytest
+from aiohttp import web
+from conftest import serve
+from models.fetcher import (
+    FeedFetcher,
+    FeedResponse,
+    FeedValidators,
+    check_feed_response,
+    poll_stats,
+)
+
+ETAG = '"v1"'
+""" The ETag of the feed answered by `conditional_handler` """
+
+
+async def conditional_handler(request):
+    """Answers with 304 Not Modified when the request has the current ETag"""
+
+    if request.headers.get("If-None-Match") == ETAG:
+        return web.Response(status=304)
+
+    return web.Response(body=b"<rss/>", headers={"ETag": ETAG})
+
+
+def fetch(handler, validators: FeedValidators = None, **options) -> FeedResponse:
+    """Fetches the feed answered by `handler` with a new fetcher"""
+
+    async def run():
+        async with serve(handler) as url:
+            fetcher = FeedFetcher(**options)
+            try:
+                return await fetcher.fetch(url, validators)
+            finally:
+                await fetcher.close()
+
+    return asyncio.run(run())
+
+
+def test_fetch():
+    response = fetch(conditional_handler)
+
+    assert response.body == b"<rss/>"
+    assert response.validators == FeedValidators(
+        etag=ETAG, body_hash=hashlib.blake2b(b"<rss/>", digest_size=16).digest()
+    )
+
+
+def test_not_modified():
+    not_modified = poll_stats.not_modified
+
+    assert fetch(conditional_handler, fetch(conditional_handler).validators) is None
+    assert poll_stats.not_modified == not_modified + 1
+
+
+def test_changed_feed_is_fetched_again():
+    assert fetch(conditional_handler, FeedValidators(etag='"v0"')) is not None
+
+
+def test_same_body_is_skipped():
+    async def handler(request):
+        # Without validators, so only the body can tell the feed didn't change
+        return web.Response(body=b"<rss/>")
+
+    validators = fetch(handler).validators
+    same_body = poll_stats.same_body
+
+    assert validators.etag is None and validators.last_modified is None
+    assert fetch(handler, validators) is None
+    assert poll_stats.same_body == same_body + 1
+
+
+def test_check_feed_response():
+    validators = FeedValidators(
+        body_hash=hashlib.blake2b(b"old", digest_size=16).digest()
+    )
+    headers = {"Last-Modified": "Mon, 02 Sep 2024 10:00:00 GMT"}
+
+    assert check_feed_response("url", 304, {}, b"", validators) is None
+    assert check_feed_response("url", 200, headers, b"old", validators) is None
+
+    response = check_feed_response("url", 200, headers, b"new", validators)
+    assert response.body == b"new"
+    assert response.validators.last_modified == headers["Last-Modified"]
+    assert response.validators.as_headers() == {
+        "If-Modified-Since": headers["Last-Modified"]
+    }
+
+    with pytest.raises(ValueError):
+        check_feed_response("url", 500, {}, b"", validators)
+
+
+def test_concurrent_requests_are_limited():
+    running = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal running, peak
+
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+        return web.Response(body=request.query["course"].encode())
+
+    async def fetch_all():
+        async with serve(handler) as url:
+            fetcher = FeedFetcher(max_concurrency=2)
+            try:
+                return await asyncio.gather(
+                    *(fetcher.fetch(f"{url}?course={i}") for i in range(8))
+                )
+            finally:
+                await fetcher.close()
+
+    responses = asyncio.run(fetch_all())
+
+    assert [response.body for response in responses] == [
+        str(i).encode() for i in range(8)
+    ]
+    assert peak == 2
+
+
+def test_server_error():
+    async def handler(request):
+        return web.Response(status=503, text="Maintenance")
+
+    with pytest.raises(ValueError, match="503"):
+        fetch(handler)
+
+
+def test_timeout():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return web.Response(body=b"<rss/>")
+
+    with pytest.raises(ValueError, match="TimeoutError"):
+        fetch(handler, timeout=0.1)
@@ -0,0 +1,51 @@
+""" Tests the streaming parser of the feeds """
+
+from datetime import datetime
+
+import pytest
+from conftest import build_feed, make_item
+from models.parser import PUB_DATE_FORMAT, iter_feed_items
+
+ITEM = b"<item><title>Not in a feed</title><pubDate>Mon, 02 Sep 2024 10:00:00 +0100</pubDate></item>"
+""" An announcement outside of a feed """
+
+
+def test_items_are_read_in_order():
+    items = [make_item(1), make_item(2, title="Exame & notas"), make_item(3)]
+
+    # Newest first, like in the feed
+    assert list(iter_feed_items(build_feed(items))) == items[::-1]
+
+
+def test_empty_feed():
+    assert list(iter_feed_items(build_feed([]))) == []
+
+
+def test_missing_fields_are_empty():
+    feed = b"<rss><channel><item><title>Only a title</title></item></channel></rss>"
+
+    assert list(iter_feed_items(feed)) == [("Only a title", "", "", "", "")]
+
+
+def test_incremental_read_stops_at_known_items():
+    items = [make_item(day) for day in range(1, 6)]
+    newer_than = int(datetime.strptime(items[2].pub_date, PUB_DATE_FORMAT).timestamp())
+
+    assert list(iter_feed_items(build_feed(items), newer_than)) == [items[4], items[3]]
+
+
+@pytest.mark.parametrize(
+    "xml_data",
+    [
+        b"<html><body>Under maintenance</body></html>",
+        b"<rss><channel><item><title>Cut",
+        b"",
+        ITEM,
+        b"<html><body>" + ITEM + b"</body></html>",
+    ],
+)
+@pytest.mark.parametrize("newer_than", [None, 2**31])
+def test_invalid_feeds(xml_data, newer_than):
+    # Also when an incremental read stops at the first announcement (already known)
+    with pytest.raises(ValueError):
+        list(iter_feed_items(xml_data, newer_than))
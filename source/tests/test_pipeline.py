@@ -0,0 +1,53 @@
+""" Tests the update pipeline """
+
+import asyncio
+from collections import defaultdict
+
+import discord_bot.pipeline as pipeline
+from conftest import make_course
+from models.announcement import AnnouncementActions
+from models.metrics import metrics
+
+CHANGES = [{"action": AnnouncementActions.ADDED, "announcement": None}] * 2
+""" The changes found by every update that doesn't fail """
+
+
+def test_failing_course_does_not_stop_the_others(monkeypatch):
+    broken, first, second = make_course("BROKEN"), make_course("A"), make_course("B")
+
+    async def refresh_course(course, incremental=False):
+        if course is broken:
+            raise RuntimeError("Unexpected")
+
+        return CHANGES
+
+    async def deliver_changes(course, changes):
+        return {1} if course is first else {1, 2}
+
+    monkeypatch.setattr(pipeline, "refresh_course", refresh_course)
+    monkeypatch.setattr(pipeline, "deliver_changes", deliver_changes)
+    errors = metrics.get_total("update_errors_total")
+
+    n_changes = asyncio.run(pipeline.update_courses([broken, first, second]))
+
+    assert n_changes == {1: 4, 2: 2}
+    assert metrics.get_total("update_errors_total") == errors + 1
+
+
+def test_retry_changes_are_reported(monkeypatch):
+    course = make_course()
+    saved = []
+
+    async def update_courses(courses, incremental=False):
+        return {1: 2}
+
+    monkeypatch.setattr(pipeline, "update_courses", update_courses)
+    monkeypatch.setattr(pipeline.db, "get_subscribers", lambda course: {1})
+    monkeypatch.setattr(pipeline.db, "save_backup", lambda: saved.append(True))
+    monkeypatch.setattr(pipeline, "pending_changes", defaultdict(int))
+    pipeline.scheduled_retries[course.feed_url] = None
+
+    asyncio.run(pipeline.retry_course(course))
+
+    assert pipeline.pending_changes == {1: 2}
+    assert saved == [True]
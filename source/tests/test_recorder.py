@@ -0,0 +1,103 @@
+""" Tests the recording of the feed responses and its replay """
+
+import asyncio
+import os
+
+import pytest
+from benchmarks.replay import FEED_SUFFIX, replay
+from conftest import build_feed, get_course_link, make_item
+from models.recorder import FeedRecorder, RecordedResponse, read_recording
+
+FEED_URL = get_course_link() + FEED_SUFFIX
+""" The link of the feed recorded """
+
+
+def record(path: str, *responses: tuple[int, dict, bytes]):
+    """Records the responses (status, headers and body) of the feed"""
+
+    recorder = FeedRecorder(path)
+
+    for i, (status, headers, body) in enumerate(responses):
+        recorder.write(
+            recorded_at=float(i),
+            url=FEED_URL,
+            status=status,
+            headers=headers,
+            body=body,
+        )
+
+    recorder.close()
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "feeds.rec")
+    feed = build_feed([make_item(1)])
+
+    record(
+        path,
+        (200, {"ETag": '"v1"', "Last-Modified": "Mon, 02 Sep 2024"}, feed),
+        (304, {"ETag": '"v1"'}, b""),
+        (0, {}, b"TimeoutError()"),
+    )
+
+    assert list(read_recording(path)) == [
+        RecordedResponse(0.0, FEED_URL, 200, '"v1"', "Mon, 02 Sep 2024", feed),
+        RecordedResponse(1.0, FEED_URL, 304, '"v1"', None, b""),
+        RecordedResponse(2.0, FEED_URL, 0, None, None, b"TimeoutError()"),
+    ]
+
+
+def test_unchanged_body_is_written_once(tmp_path):
+    path = str(tmp_path / "feeds.rec")
+
+    # Random, so it can't be compressed
+    body = os.urandom(10_000)
+    record(path, (200, {}, body), (200, {}, body))
+
+    assert os.path.getsize(path) < 1.5 * len(body)
+    assert [response.body for response in read_recording(path)] == [body, body]
+
+
+def test_truncated_recording(tmp_path):
+    path = str(tmp_path / "feeds.rec")
+    record(path, (200, {}, b"first"), (200, {}, b"second"))
+
+    # The bot was killed while writing the last response
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 3)
+
+    assert [response.body for response in read_recording(path)] == [b"first"]
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "feeds.rec"
+    path.write_bytes(b"<rss/>")
+
+    with pytest.raises(ValueError):
+        list(read_recording(str(path)))
+
+
+def test_replay(tmp_path):
+    path = str(tmp_path / "feeds.rec")
+    first = build_feed([make_item(1), make_item(2)])
+    second = build_feed([make_item(2, title="Changed"), make_item(3)])
+
+    record(
+        path,
+        (200, {"ETag": '"v1"'}, first),
+        (304, {"ETag": '"v1"'}, b""),
+        (200, {"ETag": '"v2"'}, second),
+        (0, {}, b"TimeoutError()"),
+    )
+    responses = list(read_recording(path))
+
+    results = asyncio.run(replay(responses, full_scan_every=1, speed=None))
+
+    assert results["responses"] == 4
+    assert results["courses"] == 1
+    assert results["failures"] == 1
+    assert results["changes"] == {"added": 3, "updated": 1, "deleted": 1}
+
+    # The same recording always finds the same changes
+    again = asyncio.run(replay(responses, full_scan_every=1, speed=None))
+    assert again["changes_digest"] == results["changes_digest"]
@@ -0,0 +1,186 @@
+""" Tests the scheduler of the updates """
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import models.scheduler
+import pytest
+from conftest import make_course
+from constants import MAX_POLL_INTERVAL, MIN_POLL_INTERVAL
+from models.announcement import Announcement
+from models.course import Course
+from models.parser import PUB_DATE_FORMAT
+from models.registry import FeedRegistry
+from models.scheduler import (
+    CATCH_UP_WINDOW,
+    PRIOR_POSTS_PER_DAY,
+    UPDATES_PER_POST,
+    PollScheduler,
+    get_phase,
+)
+
+NOW = 1_727_776_800
+""" A fixed time for the tests (1 Oct 2024, 10:00 UTC) """
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch) -> PollScheduler:
+    """Returns a scheduler that saves its schedule in a temporary folder"""
+
+    monkeypatch.chdir(tmp_path)
+
+    return PollScheduler()
+
+
+def make_active_course(name: str = "ACTIVE") -> Course:
+    """Returns a course that posted every hour for the last week"""
+
+    course = make_course(name)
+    start = datetime.now(timezone(timedelta(hours=1))) - timedelta(days=7)
+
+    course.announcements = [
+        Announcement(
+            title=f"Announcement {i}",
+            description="",
+            link="",
+            author="Someone",
+            pub_date=(start + timedelta(hours=i)).strftime(PUB_DATE_FORMAT),
+        )
+        for i in range(7 * 24)
+    ]
+
+    return course
+
+
+def make_courses(n: int) -> list[Course]:
+    """Returns `n` different courses without announcements"""
+
+    return [make_course(f"C{i}") for i in range(n)]
+
+
+def test_interval_without_history(scheduler):
+    course = make_course()
+
+    # Only the prior rate, spread evenly over the day
+    expected = 24 * 60 * 60 / (PRIOR_POSTS_PER_DAY * UPDATES_PER_POST)
+
+    assert scheduler.get_base_interval(course, NOW) == pytest.approx(expected)
+    assert MIN_POLL_INTERVAL * 60 < expected < MAX_POLL_INTERVAL * 60
+
+
+def test_interval_is_clamped(scheduler):
+    assert scheduler.get_base_interval(make_active_course(), NOW) == (
+        MIN_POLL_INTERVAL * 60
+    )
+
+
+def test_active_courses_are_updated_more_often(scheduler):
+    assert scheduler.get_base_interval(
+        make_active_course(), NOW
+    ) < scheduler.get_base_interval(make_course(), NOW)
+
+
+def test_budget_scales_the_intervals(scheduler, monkeypatch):
+    courses = make_courses(10)
+    base = {
+        FeedRegistry.get_key(course): scheduler.get_base_interval(course, NOW)
+        for course in courses
+    }
+    requests_per_hour = sum(60 * 60 / interval for interval in base.values())
+
+    # Within the budget, the intervals don't change
+    assert scheduler.get_intervals(courses, NOW) == base
+
+    monkeypatch.setattr(models.scheduler, "POLL_BUDGET", requests_per_hour / 4)
+    intervals = scheduler.get_intervals(courses, NOW)
+
+    for key, interval in intervals.items():
+        assert interval == pytest.approx(base[key] * 4)
+
+    assert sum(60 * 60 / interval for interval in intervals.values()) == (
+        pytest.approx(requests_per_hour / 4)
+    )
+
+
+def test_courses_are_spread_over_their_interval(scheduler):
+    courses = make_courses(5)
+
+    scheduler.get_due_courses(courses, NOW)
+
+    for course in courses:
+        interval = scheduler.get_base_interval(course, NOW)
+        key = FeedRegistry.get_key(course)
+
+        assert scheduler.get_next_due(course) == pytest.approx(
+            NOW + get_phase(key) * interval
+        )
+
+
+def test_due_courses_are_returned_once(scheduler):
+    courses = make_courses(5)
+
+    assert scheduler.get_due_courses(courses, NOW) == []
+
+    # Many intervals later (every update was missed), each course is due once
+    later = NOW + 10 * MAX_POLL_INTERVAL * 60
+    due = scheduler.get_due_courses(courses, later)
+
+    assert sorted(map(FeedRegistry.get_key, due)) == sorted(
+        map(FeedRegistry.get_key, courses)
+    )
+    assert scheduler.get_due_courses(courses, later) == []
+
+
+def test_record_poll_schedules_the_next_update(scheduler):
+    course = make_course()
+    scheduler.get_due_courses([course], NOW)
+
+    assert scheduler.record_poll(course, NOW) == 1
+    assert scheduler.get_polls(course) == 1
+
+    # Updated again right away (like `$update` after the automatic update)
+    assert scheduler.record_poll(course, NOW) == 2
+    assert scheduler.get_polls(course) == 2
+
+    interval = scheduler.get_base_interval(course, NOW)
+    assert scheduler.get_next_due(course) == pytest.approx(NOW + interval)
+
+    assert scheduler.get_due_courses([course], NOW + interval - 1) == []
+    assert scheduler.get_due_courses([course], NOW + interval) == [course]
+
+
+def test_untracked_courses_are_forgotten(scheduler):
+    first, second = make_courses(2)
+
+    scheduler.get_due_courses([first, second], NOW)
+    scheduler.record_poll(second, NOW)
+    scheduler.get_due_courses([first], NOW)
+
+    assert scheduler.get_next_due(second) is None
+    assert scheduler.get_polls(second) == 0
+
+
+def test_schedule_is_restored(scheduler):
+    course = make_course()
+    scheduler.get_due_courses([course], time.time())
+    scheduler.record_poll(course)
+
+    restored = PollScheduler()
+
+    assert restored.try_load_backup()
+    assert restored.get_polls(course) == 1
+    assert restored.get_next_due(course) == scheduler.get_next_due(course)
+
+
+def test_missed_updates_are_caught_up(scheduler):
+    course = make_course()
+    scheduler.get_due_courses([course], NOW)
+    scheduler.record_poll(course, NOW)
+
+    # The bot was offline for a long time
+    restored = PollScheduler()
+    restored.try_load_backup()
+
+    assert (
+        time.time() <= restored.get_next_due(course) <= (time.time() + CATCH_UP_WINDOW)
+    )
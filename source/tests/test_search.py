@@ -0,0 +1,92 @@
+""" Tests the full-text index of the announcements """
+
+import models.search
+import pytest
+from conftest import make_course, make_feed, make_item
+from models.course import Course
+from models.registry import FeedRegistry
+from models.search import SearchIndex
+
+ITEMS = [
+    make_item(1, title="Exame final", description="<p>Sala a anunciar</p>"),
+    make_item(2, title="Aviso", description="<p>O enunciado do exame</p>"),
+    make_item(3, title="Horário das aulas", description="<p>Sem alterações</p>"),
+]
+""" The announcements of the first course """
+
+
+def make_index() -> tuple[SearchIndex, Course, Course]:
+    """Returns an index with two courses (the second has a single announcement about the exam)"""
+
+    first = make_course("FIRST")
+    first.process_feed(make_feed(ITEMS))
+
+    second = make_course("SECOND")
+    second.process_feed(make_feed([make_item(4, title="Exame de recurso")]))
+
+    index = SearchIndex()
+    index.index_courses([first, second])
+
+    return index, first, second
+
+
+def search(index: SearchIndex, query: str, *courses: Course) -> list[str]:
+    """Returns the titles of the announcements of the courses found by the query"""
+
+    keys = [FeedRegistry.get_key(course) for course in courses]
+
+    return [hit.title for hit in index.search(query, keys, limit=10)]
+
+
+def test_titles_rank_first():
+    index, first, _ = make_index()
+
+    assert search(index, "exame", first) == ["Exame final", "Aviso"]
+
+
+def test_accents_prefixes_and_plurals():
+    index, first, _ = make_index()
+
+    assert search(index, "HORARIO", first) == ["Horário das aulas"]
+    assert search(index, "exâmes", first) == ["Exame final", "Aviso"]
+    assert search(index, "enunc", first) == ["Aviso"]
+    assert search(index, "xyz", first) == []
+
+
+def test_any_term_when_none_has_every_term():
+    index, first, _ = make_index()
+
+    assert search(index, "exame sala", first) == ["Exame final"]
+    assert sorted(search(index, "enunciado sala", first)) == ["Aviso", "Exame final"]
+
+
+@pytest.mark.parametrize("max_tagged_courses", [100, 0])
+def test_only_the_courses_given_are_searched(monkeypatch, max_tagged_courses):
+    # With no tagged courses, the announcements found are filtered by course instead
+    monkeypatch.setattr(models.search, "MAX_TAGGED_COURSES", max_tagged_courses)
+    index, first, second = make_index()
+
+    assert search(index, "recurso", first) == []
+    assert search(index, "recurso", second) == ["Exame de recurso"]
+    assert sorted(search(index, "exame", first, second)) == [
+        "Aviso",
+        "Exame de recurso",
+        "Exame final",
+    ]
+    assert search(index, "exame") == []
+
+
+def test_changes_are_applied():
+    index, first, second = make_index()
+
+    changes = first.process_feed(
+        make_feed([make_item(1, title="Exame adiado"), ITEMS[2], make_item(5)])
+    )
+    index.apply_changes(first, changes)
+
+    assert search(index, "exame", first) == ["Exame adiado"]
+    assert search(index, "announcement", first) == ["Announcement 5"]
+
+    index.remove_course(second)
+
+    assert search(index, "recurso", second) == []
@@ -0,0 +1,140 @@
+""" Tests the snapshots of the bot data """
+
+import asyncio
+
+import pytest
+from conftest import make_course, make_feed, make_item
+from models.fetcher import FeedValidators
+from models.registry import FeedRegistry
+from models.snapshot import (
+    SNAPSHOT_MAGIC,
+    SnapshotManager,
+    capture_snapshot,
+    decode_snapshot,
+    encode_snapshot,
+)
+
+
+def make_data() -> tuple[dict, FeedRegistry]:
+    """Returns the data of two guilds sharing a course (only one has a channel for the other course) and their registry"""
+
+    course = make_course()
+    feed = make_feed([make_item(1), make_item(2, description="<b>Exame</b>")])
+    feed.validators.etag = '"abc"'
+    feed.validators.last_modified = "Mon, 02 Sep 2024 10:00:00 GMT"
+    course.process_feed(feed)
+
+    other = make_course("OTHER")
+
+    registry = FeedRegistry()
+    registry.subscribe(1, course, channel_id=100)
+    registry.subscribe(1, other)
+    registry.subscribe(2, course, channel_id=200)
+
+    return {1: [course, other], 2: [course]}, registry
+
+
+def test_round_trip():
+    data, registry = make_data()
+
+    restored, channel_ids = decode_snapshot(
+        encode_snapshot(capture_snapshot(data, registry))
+    )
+
+    assert restored.keys() == data.keys()
+
+    for guild_id, courses in data.items():
+        for course, restored_course in zip(courses, restored[guild_id], strict=True):
+            assert restored_course.link == course.link
+            assert restored_course.fingerprints == course.fingerprints
+            assert restored_course.full_scan_pending == course.full_scan_pending
+            assert (restored_course.validators or FeedValidators()) == (
+                course.validators or FeedValidators()
+            )
+
+            for announcement, restored_announcement in zip(
+                course.announcements, restored_course.announcements, strict=True
+            ):
+                for field in (
+                    "id",
+                    "title",
+                    "description",
+                    "description_hash",
+                    "link",
+                    "author",
+                    "pub_date",
+                    "utc_offset",
+                    "text",
+                ):
+                    assert getattr(restored_announcement, field) == getattr(
+                        announcement, field
+                    )
+
+    # The course shared by both guilds is restored once
+    assert restored[1][0] is restored[2][0]
+
+    key = FeedRegistry.get_key(data[1][0])
+    assert channel_ids == {(1, key): 100, (2, key): 200}
+
+
+def test_invalid_snapshots():
+    snapshot = encode_snapshot(capture_snapshot(*make_data()))
+
+    with pytest.raises(ValueError):
+        decode_snapshot(b"XXXX" + snapshot[len(SNAPSHOT_MAGIC) :])
+
+    with pytest.raises(ValueError):
+        version = snapshot[len(SNAPSHOT_MAGIC)] + 1
+        decode_snapshot(
+            SNAPSHOT_MAGIC + bytes([version]) + snapshot[len(SNAPSHOT_MAGIC) + 1 :]
+        )
+
+
+def test_manager_writes_the_snapshot(tmp_path):
+    path = str(tmp_path / "data.snapshot")
+    values = [b"first"]
+
+    manager = SnapshotManager(
+        path=path, capture=lambda: values[-1], encode=lambda captured: captured
+    )
+
+    assert manager.read() is None
+
+    # Outside the event loop the data is saved right away
+    manager.mark_dirty()
+    assert manager.read() == b"first"
+
+    # Nothing is written without changes
+    values.append(b"second")
+    manager.flush()
+    assert manager.read() == b"first"
+
+    manager.mark_dirty()
+    assert manager.read() == b"second"
+    assert not (tmp_path / "data.snapshot.tmp").exists()
+
+
+def test_manager_waits_for_more_changes(tmp_path):
+    path = str(tmp_path / "data.snapshot")
+    writes = []
+
+    def encode(captured):
+        writes.append(captured)
+        return captured
+
+    manager = SnapshotManager(
+        path=path, capture=lambda: b"data", encode=encode, delay=0.05
+    )
+
+    async def change_many_times():
+        for _ in range(10):
+            manager.mark_dirty()
+            await asyncio.sleep(0)
+
+        assert manager.read() is None
+        await asyncio.sleep(0.2)
+
+    asyncio.run(change_many_times())
+
+    assert manager.read() == b"data"
+    assert len(writes) == 1
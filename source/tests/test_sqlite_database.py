@@ -0,0 +1,186 @@
+""" Tests the SQLite storage backend """
+
+import asyncio
+import pickle
+from types import SimpleNamespace
+
+import pytest
+from conftest import get_course_link, make_feed, make_item
+from models.announcement import AnnouncementActions
+from models.database import Database
+from models.fetcher import FeedValidators
+from models.registry import FeedRegistry
+from models.sqlite_database import SQLiteDatabase
+
+FIRST_GUILD = SimpleNamespace(id=1, name="First")
+""" A guild tracking two courses """
+
+SECOND_GUILD = SimpleNamespace(id=2, name="Second")
+""" A guild tracking one of the courses of `FIRST_GUILD` """
+
+
+@pytest.fixture(autouse=True)
+def in_temporary_folder(tmp_path, monkeypatch):
+    """Runs the test in an empty folder, as the backups are read from the current folder"""
+
+    monkeypatch.chdir(tmp_path)
+
+
+def fill(database: Database):
+    """Adds the courses of the guilds and processes their first feed"""
+
+    course = database.add_course(FIRST_GUILD, get_course_link("FIRST"))
+    database.add_course(FIRST_GUILD, get_course_link("OTHER"))
+    database.add_course(SECOND_GUILD, get_course_link("FIRST"))
+
+    changes = course.process_feed(make_feed([make_item(1), make_item(2)]))
+    database.save_course(course, changes)
+
+
+def get_contents(database: SQLiteDatabase) -> dict:
+    """Returns what is saved of each guild (the courses and their announcements)"""
+
+    # A course never updated has no validators, which are saved as empty ones
+
+    return {
+        guild.id: [
+            (
+                FeedRegistry.get_key(course),
+                course.validators or FeedValidators(),
+                course.fingerprints,
+                [
+                    (
+                        announcement.id,
+                        announcement.title,
+                        announcement.description,
+                        announcement.link,
+                        announcement.author,
+                    )
+                    for announcement in course.announcements
+                ],
+            )
+            for course in database.get_courses_list(guild)
+        ]
+        for guild in (FIRST_GUILD, SECOND_GUILD)
+    }
+
+
+def reload(database: SQLiteDatabase) -> SQLiteDatabase:
+    """Returns a new database with the data saved by `database`"""
+
+    restored = SQLiteDatabase()
+    assert restored.try_load_backup()
+
+    return restored
+
+
+def test_first_startup():
+    assert not SQLiteDatabase().try_load_backup()
+
+
+def test_changes_are_saved():
+    database = SQLiteDatabase()
+    database.try_load_backup()
+    fill(database)
+
+    restored = reload(database)
+
+    assert get_contents(restored) == get_contents(database)
+    assert len(get_contents(restored)[FIRST_GUILD.id][0][3]) == 2
+
+    # The course is still shared between the guilds
+    assert (
+        restored.get_courses_list(FIRST_GUILD)[0]
+        is restored.get_courses_list(SECOND_GUILD)[0]
+    )
+
+
+def test_updates_and_deletions_are_saved():
+    database = SQLiteDatabase()
+    database.try_load_backup()
+    fill(database)
+
+    course = database.get_courses_list(FIRST_GUILD)[0]
+    changes = course.process_feed(
+        make_feed([make_item(2, title="Edited"), make_item(3)])
+    )
+    database.save_course(course, changes)
+
+    assert {change["action"] for change in changes} == set(AnnouncementActions)
+    assert get_contents(reload(database)) == get_contents(database)
+
+
+def test_removed_courses_are_forgotten():
+    database = SQLiteDatabase()
+    database.try_load_backup()
+    fill(database)
+
+    database.remove_course(FIRST_GUILD, "FIRST")
+    database.remove_course(FIRST_GUILD, "OTHER")
+
+    restored = reload(database)
+
+    assert restored.get_courses_list(FIRST_GUILD) == []
+    assert [course.name for course in restored.get_all_courses()] == ["FIRST"]
+
+
+def test_pickle_backup_is_imported():
+    reference = SQLiteDatabase(path="reference.sqlite")
+    reference.try_load_backup()
+    fill(reference)
+
+    # The backup of the pickle backend (a list of courses per guild)
+    with open("db.pkl", "wb") as backup_file:
+        pickle.dump(
+            {
+                guild.id: reference.get_courses_list(guild)
+                for guild in (FIRST_GUILD, SECOND_GUILD)
+            },
+            backup_file,
+        )
+
+    database = SQLiteDatabase()
+
+    assert database.try_load_backup()
+    assert get_contents(database) == get_contents(reference)
+
+
+def test_snapshot_backup_is_imported():
+    # The backup of the pickle backend, saved right away outside the event loop
+    reference = Database()
+    fill(reference)
+    course = reference.get_courses_list(SECOND_GUILD)[0]
+    reference.set_channel_id(SECOND_GUILD, course, 200)
+    reference.save_backup()
+
+    database = SQLiteDatabase()
+
+    assert database.try_load_backup()
+    assert get_contents(database) == get_contents(reference)
+    assert database.get_channel_id(SECOND_GUILD, course) == 200
+    assert get_contents(reload(database)) == get_contents(reference)
+
+
+def test_changes_are_saved_in_the_background():
+    database = SQLiteDatabase(delay=0.1)
+    database.try_load_backup()
+
+    async def run():
+        fill(database)
+
+        # Still waiting for more changes
+        assert get_contents(reload(database)) == {
+            FIRST_GUILD.id: [],
+            SECOND_GUILD.id: [],
+        }
+
+        await asyncio.sleep(0.3)
+        assert get_contents(reload(database)) == get_contents(database)
+
+        database.remove_course(FIRST_GUILD, "OTHER")
+
+    asyncio.run(run())
+
+    # The changes still waiting are saved when the bot stops
+    database.close()
+    assert get_contents(reload(database)) == get_contents(database)
@@ -1,10 +1,17 @@
 """ Contains async utility functions """
 
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+
 import discord
 from constants import CATEGORY_NAME
 from discord import CategoryChannel, Guild, TextChannel
 from models.announcement import Announcement, AnnouncementActions
 from models.course import Course
+from models.fetcher import poll_stats
+from models.metrics import metrics
+from models.search import SearchHit
 
 #################### Async ####################
 
@@ -12,10 +19,11 @@ from models.course import Course
 async def create_bot_category(guild: Guild) -> CategoryChannel:
     """Creates the bot category in the current `guild`"""
 
-    category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
+    category = get_bot_category(guild)
 
     if category is None:
         category = await guild.create_category(CATEGORY_NAME)
+        forget_channel_index(guild)
         print(f"Category '{CATEGORY_NAME}' was created")
     else:
         print(f"Category '{CATEGORY_NAME}' already exists, skipping creation")
@@ -30,13 +38,13 @@ async def create_channel(
 
     channel_name = format_channel_name(channel_name)
 
-    category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
+    category = get_bot_category(guild)
 
     # Bot category didn't exist, create it
     if category is None:
         category = await create_bot_category(guild=guild)
 
-    existing_channel = discord.utils.get(category.channels, name=channel_name)
+    existing_channel = find_channel(guild=guild, channel_name=channel_name)
 
     if existing_channel is None:
 
@@ -54,6 +62,7 @@ async def create_channel(
         existing_channel = await guild.create_text_channel(
             channel_name, category=category, overwrites=overwrites
         )
+        forget_channel_index(guild)
         print(f"Channel '{channel_name}' was created")
     else:
         print(f"Channel '{channel_name}' already exists, skipping creation")
@@ -64,7 +73,7 @@ async def create_channel(
 async def delete_bot_category(guild: Guild):
     """Deletes the bot category and all the channels"""
 
-    category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
+    category = get_bot_category(guild)
 
     if category is not None:
 
@@ -72,44 +81,50 @@ async def delete_bot_category(guild: Guild):
             await channel.delete()
 
         await category.delete()
+        forget_channel_index(guild)
         print(f"Category '{CATEGORY_NAME}' was deleted")
     else:
         print(f"Category '{CATEGORY_NAME}' didn't exist, skipping deletion")
 
 
-async def delete_channel(guild: Guild, channel_name: str) -> TextChannel:
-    """Deletes a channel with `channel_name` in the current `guild` (under the bot category)"""
+async def delete_channel(
+    guild: Guild, channel_name: str, channel_id: int = None
+) -> TextChannel:
+    """Deletes a channel with `channel_name` (or `channel_id`, if known) in the current `guild` (under the bot category)"""
 
     channel_name = format_channel_name(channel_name)
 
-    category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
-
-    if category is None:
+    if get_bot_category(guild) is None:
         print(
             f"Category '{CATEGORY_NAME}' didn't exist, skipping channel '{channel_name}' deletion"
         )
         return
 
-    existing_channel = discord.utils.get(category.channels, name=channel_name)
+    existing_channel = find_channel(
+        guild=guild, channel_name=channel_name, channel_id=channel_id
+    )
 
     if existing_channel is not None:
         await existing_channel.delete()
+        forget_channel_index(guild)
         print(f"Channel '{channel_name}' was deleted")
     else:
         print(f"Channel '{channel_name}' didn't exist, skipping deletion")
 
 
-async def get_channel(guild: Guild, channel_name: str) -> TextChannel:
-    """Returns the channel with `channel_name` inside the bot category"""
+async def get_channel(
+    guild: Guild, channel_name: str, channel_id: int = None
+) -> TextChannel:
+    """Returns the channel with `channel_name` (or `channel_id`, if known) inside the bot category"""
 
     channel_name = format_channel_name(channel_name)
 
-    category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
-
-    if category is None:
+    if get_bot_category(guild) is None:
         raise ValueError("Can't retrieve channel as category didn't exist.")
 
-    existing_channel = discord.utils.get(category.channels, name=channel_name)
+    existing_channel = find_channel(
+        guild=guild, channel_name=channel_name, channel_id=channel_id
+    )
 
     if existing_channel is not None:
         return existing_channel
@@ -117,20 +132,96 @@ async def get_channel(guild: Guild, channel_name: str) -> TextChannel:
         raise ValueError(f"Can't retrieve channel as '{channel_name}' didn't exist.")
 
 
-async def send_announcements_changes(
-    channel: TextChannel, changes: list[dict[str, Announcement | AnnouncementActions]]
-):
-    """Send the messages informing the user of the latest changes in the announcements"""
+#################### Sync ####################
 
-    for change in changes:
-        await channel.send(
-            get_alert_message(
-                announcement=change["announcement"], action=change["action"]
-            )
+
+@dataclass(slots=True)
+class ChannelIndex:
+    """Contains the IDs of the bot category and of its channels in a guild"""
+
+    category_id: int
+    """ The ID of the bot category """
+
+    channel_ids: dict[str, int]
+    """ The IDs of the channels inside the bot category (indexed by the channel name) """
+
+
+# The channel index of each guild (indexed by the guild ID), built when first needed
+# and forgotten whenever the channels of the guild change (see the channel events)
+_channel_indexes: dict[int, ChannelIndex] = dict()
+
+
+def get_channel_index(guild: Guild) -> ChannelIndex | None:
+    """Returns the channel index of the guild (or `None` if the bot category doesn't exist)"""
+
+    index = _channel_indexes.get(guild.id)
+
+    if index is None:
+        category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
+
+        if category is None:
+            return None
+
+        index = ChannelIndex(
+            category_id=category.id,
+            channel_ids={channel.name: channel.id for channel in category.channels},
         )
+        _channel_indexes[guild.id] = index
 
+    return index
 
-#################### Sync ####################
+
+def forget_channel_index(guild: Guild):
+    """Forgets the channel index of the guild, so it is built again when needed"""
+
+    _channel_indexes.pop(guild.id, None)
+
+
+def get_bot_category(guild: Guild) -> CategoryChannel | None:
+    """Returns the bot category (or `None` if it doesn't exist)"""
+
+    index = get_channel_index(guild)
+
+    if index is None:
+        return None
+
+    category = guild.get_channel(index.category_id)
+
+    # The index is outdated (the events should prevent this, but they may have been missed while disconnected)
+    if category is None:
+        forget_channel_index(guild)
+        return discord.utils.get(guild.categories, name=CATEGORY_NAME)
+
+    return category
+
+
+def find_channel(
+    guild: Guild, channel_name: str, channel_id: int = None
+) -> TextChannel | None:
+    """Returns the channel with `channel_name` (already formatted) inside the bot category, or `None` if it doesn't exist (the ID is used first if known, so renamed channels are still found)"""
+
+    if channel_id is not None:
+        channel = guild.get_channel(channel_id)
+
+        if channel is not None:
+            return channel
+
+    index = get_channel_index(guild)
+
+    if index is None or channel_name not in index.channel_ids:
+        return None
+
+    channel = guild.get_channel(index.channel_ids[channel_name])
+
+    # Same as in `get_bot_category`
+    if channel is None:
+        forget_channel_index(guild)
+        category = get_bot_category(guild)
+
+        if category is not None:
+            return discord.utils.get(category.channels, name=channel_name)
+
+    return channel
 
 
 def format_channel_name(channel_name: str) -> str:
@@ -151,18 +242,46 @@ def get_init_message(course: Course) -> str:
     return header + "\n\n" + course_link + "\n\n" + footer
 
 
+def get_update_message(n_changes: int) -> str:
+    """Returns the formatted message informing the user that the announcements were updated"""
+
+    return f"Updated announcements @ {datetime.now().strftime('%H:%M of %d/%m/%Y')} **({n_changes} changes)**"
+
+
+def get_alert_messages(
+    changes: list[dict[str, Announcement | AnnouncementActions]]
+) -> tuple[str, ...]:
+    """Returns the formatted messages informing the user of the latest changes in the announcements (immutable, so they can be shared by every channel)"""
+
+    return tuple(
+        get_alert_message(announcement=change["announcement"], action=change["action"])
+        for change in changes
+    )
+
+
+async def render_alert_messages(
+    changes: list[dict[str, Announcement | AnnouncementActions]]
+) -> tuple[str, ...]:
+    """Same as `get_alert_messages`, but in a worker thread so converting the descriptions to text doesn't block the event loop"""
+
+    return await asyncio.to_thread(get_alert_messages, changes)
+
+
 def get_alert_message(announcement: Announcement, action: AnnouncementActions) -> str:
     """Returns the formatted message for this announcement and action"""
 
     header = f"## **[{action.name} ANNOUNCEMENT] - {announcement.title}**"
 
-    footer = f"-# Published by {announcement.author} @ {announcement.pub_date.strftime('%H:%M of %A (%d/%m/%Y)')}."
+    footer = f"-# Published by {announcement.author} @ {announcement.published_at.strftime('%H:%M of %A (%d/%m/%Y)')}."
 
     # Link doesn't make sense in the deleted action
     if action in (AnnouncementActions.ADDED, AnnouncementActions.UPDATED):
         footer += f" [Click here to see the announcement.]({announcement.link})"
 
-    string = header + "\n\n" + announcement.description + "\n\n" + footer
+    # Only converted here, as most announcements fetched are never displayed
+    description = announcement.text
+
+    string = header + "\n\n" + description + "\n\n" + footer
 
     # Discord has a maximum message length of 2000 chars, so if it is exceeded don't display the description
     if len(string) > 2000:
@@ -175,8 +294,95 @@ def get_alert_message(announcement: Announcement, action: AnnouncementActions) -
             )
 
         string = string.replace(
-            announcement.description,
+            description,
             replacement,
         )
 
     return string
+
+
+def get_search_message(query: str, hits: list[tuple[Course, SearchHit]]) -> str:
+    """Returns the formatted announcements found by a search (as many as fit in a message)"""
+
+    if len(hits) == 0:
+        return f"No announcements found for *{query}*."
+
+    message = f"**Announcements found for *{query}*:**"
+
+    for course, hit in hits:
+        published_at = datetime.fromtimestamp(hit.pub_date).strftime("%d/%m/%Y")
+
+        # The link is between <> so Discord doesn't show a preview of each one
+        line = (
+            f"\n- **[{hit.title}](<{hit.link}>)** *({course.name}, {published_at})*"
+            f"\n> {' '.join(hit.snippet.split())}"
+        )
+
+        # Discord has a maximum message length of 2000 chars
+        if len(message) + len(line) > 2000:
+            break
+
+        message += line
+
+    return message
+
+
+def get_stats_message() -> str:
+    """Returns the formatted summary of the bot metrics (see `MetricsRegistry`)"""
+
+    fetches = metrics.get_histogram("feed_fetch_seconds")
+    cycles = metrics.get_histogram("update_cycle_seconds")
+    deliveries = metrics.get_histogram("alert_delivery_seconds")
+    stages = {
+        stage: metrics.get_histogram("update_stage_seconds", stage=stage).average
+        for stage in ("parse", "diff", "render")
+    }
+
+    responses = metrics.get_total("feed_responses_total")
+    failed = (
+        responses
+        - metrics.get_total("feed_responses_total", status=200)
+        - metrics.get_total("feed_responses_total", status=304)
+    )
+    changes = {
+        action.name.lower(): metrics.get_total(
+            "announcement_changes_total", action=action.name.lower()
+        )
+        for action in AnnouncementActions
+    }
+
+    lines = [
+        "**Bot statistics:**",
+        f"- **Feeds:** {responses:.0f} requests, {failed:.0f} failed, {poll_stats.short_circuited} unchanged, "
+        f"{metrics.get_total('feed_downloaded_bytes_total') / 2**20:.1f} MB downloaded",
+        f"- **Fetch time:** {format_duration(fetches.average)} average, {format_duration(fetches.get_quantile(0.95))} p95",
+        "- **Processing (per feed):** "
+        + ", ".join(
+            f"{stage} {format_duration(duration)}" for stage, duration in stages.items()
+        ),
+        f"- **Automatic updates:** {cycles.count} runs of {format_duration(cycles.average)} average "
+        f"({format_duration(cycles.get_quantile(0.95))} p95), "
+        f"{metrics.get_histogram('update_cycle_changes').average:.1f} changes per run",
+        "- **Changes:** "
+        + ", ".join(f"{n:.0f} {action}" for action, n in changes.items()),
+        f"- **Messages:** {metrics.get_total('messages_sent_total', result='sent'):.0f} sent, "
+        f"{metrics.get_total('messages_sent_total', result='failed'):.0f} failed, "
+        f"Discord answers in {format_duration(metrics.get_histogram('message_send_seconds').average)} average",
+        f"- **Alert delay:** {format_duration(deliveries.average)} average, {format_duration(deliveries.get_quantile(0.95))} p95",
+        f"- **Waiting:** {metrics.get_total('delivery_queue_depth'):.0f} alerts to send, "
+        f"{metrics.get_total('scheduled_retries'):.0f} feeds to retry, "
+        f"{metrics.get_total('tracked_courses'):.0f} courses tracked",
+        f"- **Event loop:** {format_duration(metrics.get_histogram('event_loop_lag_seconds').get_quantile(0.99))} p99 lag, "
+        f"blocked {metrics.get_total('event_loop_stalls_total'):.0f} times",
+    ]
+
+    return "\n".join(lines)
+
+
+def format_duration(seconds: float) -> str:
+    """Returns the duration in a readable unit"""
+
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+
+    return f"{seconds:.1f}s"